@@ -7,11 +7,14 @@ You must implement the necessary permission checks in your own code before
 calling these methods!
 """
 import datetime
+import itertools
 from cms.utils import copy_plugins
 from cms.utils.compat.type_checks import string_types
 from cms.utils.conf import get_cms_setting
 from django.core.exceptions import PermissionDenied, ValidationError
 from cms.utils.i18n import get_language_list
+from cms.utils.bulk_pages import create_page_tree
+from cms.utils.page import SlugAllocator
 
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
@@ -40,6 +43,12 @@ VISIBILITY_ALL = None
 VISIBILITY_USERS = 1
 VISIBILITY_STAFF = 2
 
+# the keys of the page descriptions of bulk_create_pages
+PAGE_FIELDS = ('in_navigation', 'soft_root', 'reverse_id', 'navigation_extenders', 'publication_date',
+               'publication_end_date', 'login_required', 'limit_visibility_in_menu')
+PAGE_TREE_KEYS = PAGE_FIELDS + ('template', 'titles', 'apphook', 'apphook_namespace', 'placeholders', 'children')
+TITLE_KEYS = ('title', 'slug', 'menu_title', 'page_title', 'meta_description', 'redirect', 'overwrite_url')
+
 #===============================================================================
 # Helpers/Internals
 #===============================================================================
@@ -50,17 +59,10 @@ def _generate_valid_slug(source, parent, language):
     Parent is passed so we can make sure the slug is unique for this level in
     the page tree.
     """
-    if parent:
-        qs = Title.objects.filter(language=language, page__parent=parent)
-    else:
-        qs = Title.objects.filter(language=language, page__parent__isnull=True)
-    used = qs.values_list('slug', flat=True)
     baseslug = slugify(source)
-    slug = baseslug
-    i = 1
-    while slug in used:
-        slug = '%s-%s' % (baseslug, i)
-        i += 1
+    suffixes = itertools.count(1)
+    allocator = SlugAllocator(parent, languages=[language], siblings_only=True)
+    slug, path = allocator.allocate(language, baseslug, next_slug=lambda slug: '%s-%s' % (baseslug, next(suffixes)))
     return slug
 
 
@@ -105,6 +107,69 @@ def _verify_plugin_type(plugin_type):
         raise TypeError('plugin_type must be CMSPluginBase subclass or string')
     return plugin_model, plugin_type
 
+def _normalize_page_tree(nodes, site):
+    """
+    Validates the page tree description given to bulk_create_pages and
+    returns it with the page fields and plugin models resolved.
+    """
+    templates = [tpl[0] for tpl in get_cms_setting('TEMPLATES')]
+    languages = get_language_list(site)
+    accepted_limitations = (VISIBILITY_ALL, VISIBILITY_USERS, VISIBILITY_STAFF)
+    menus = None
+    normalized = []
+    for node in nodes:
+        unknown = set(node) - set(PAGE_TREE_KEYS)
+        assert not unknown, 'unknown page keys: %s' % ', '.join(sorted(unknown))
+        assert node.get('template') in templates
+        assert node.get('titles'), 'a page needs at least one title'
+        titles = {}
+        for language, data in node['titles'].items():
+            assert language in languages
+            unknown = set(data) - set(TITLE_KEYS)
+            assert not unknown, 'unknown title keys: %s' % ', '.join(sorted(unknown))
+            assert data.get('title')
+            titles[language] = data
+        page = dict((key, node[key]) for key in PAGE_FIELDS if key in node)
+        page['template'] = node['template']
+        page.setdefault('in_navigation', False)
+        for key in ('publication_date', 'publication_end_date'):
+            if page.get(key):
+                assert isinstance(page[key], datetime.date)
+        if page.get('navigation_extenders'):
+            if menus is None:
+                menus = [menu[0] for menu in menu_pool.get_menus_by_attribute("cms_enabled", True)]
+            assert page['navigation_extenders'] in menus
+        assert page.get('limit_visibility_in_menu', VISIBILITY_ALL) in accepted_limitations
+        if node.get('apphook'):
+            page['application_urls'] = _verify_apphook(node['apphook'], node.get('apphook_namespace'))
+            page['application_namespace'] = node.get('apphook_namespace')
+        placeholders = {}
+        for slot, plugins in node.get('placeholders', {}).items():
+            placeholders[slot] = _normalize_plugin_tree(plugins, languages)
+        normalized.append({
+            'page': page,
+            'titles': titles,
+            'placeholders': placeholders,
+            'children': _normalize_page_tree(node.get('children', ()), site),
+        })
+    return normalized
+
+
+def _normalize_plugin_tree(nodes, languages):
+    normalized = []
+    for node in nodes:
+        plugin_model, plugin_type = _verify_plugin_type(node['plugin_type'])
+        assert node.get('language') in languages
+        normalized.append({
+            'model': plugin_model,
+            'plugin_type': plugin_type,
+            'language': node['language'],
+            'data': node.get('data', {}),
+            'description': node,
+            'children': _normalize_plugin_tree(node.get('children', ()), languages),
+        })
+    return normalized
+
 #===============================================================================
 # Public API 
 #===============================================================================
@@ -251,6 +316,47 @@ def create_title(language, title, page, menu_title=None, slug=None,
     return title
 
 
+def bulk_create_pages(pages, parent=None, site=None, created_by='python-api'):
+    """
+    Create trees of draft pages, with their titles, placeholders and plugins,
+    from a nested description, using batched inserts in one transaction.
+
+    See docs/extending_cms/api_reference.rst for more info
+    """
+    parent_id = parent.pk if parent else None
+    created, plugins = _bulk_create_pages(pages, parent, site, created_by)
+    return [page for page in created if page.parent_id == parent_id]
+
+
+def _bulk_create_pages(pages, parent=None, site=None, created_by='python-api'):
+    """
+    Does the work of bulk_create_pages and returns all the pages created, in
+    the order of their descriptions (depth first), with the plugins created
+    as (description, plugin) pairs.
+    """
+    if created_by and isinstance(created_by, User):
+        user = created_by
+        created_by = created_by.username
+    else:
+        user = None
+
+    # validate site
+    if not site:
+        site = Site.objects.get_current()
+    else:
+        assert isinstance(site, Site)
+
+    # validate parent
+    if parent:
+        assert isinstance(parent, Page)
+        assert parent.publisher_is_draft
+
+    nodes = _normalize_page_tree(pages, site)
+    if not nodes:
+        return [], []
+    return create_page_tree(nodes, site, parent, created_by, user)
+
+
 def add_plugin(placeholder, plugin_type, language, position='last-child',
                target=None, **data):
     """
@@ -4,3 +4,5 @@ class CMSApp(object):
     urls = None
     menus = []
     app_name = None
+    # allow the PageCacheMiddleware to cache the responses of this apphook
+    page_cache = False
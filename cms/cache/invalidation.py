@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred invalidation of the menu, permission and page url caches.
+
+Saving or publishing a single page asks several times for the same caches to
+be invalidated (page and title signals, Page.publish, ...). The invalidations
+are collected during a request, or a deferred_invalidation block, deduplicated
+and applied once when it ends. Outside of both they are applied right away.
+"""
+from contextlib import contextmanager
+import threading
+
+from django.core.signals import request_started, request_finished
+
+# the scopes of the invalidations
+MENUS = 'menus'
+PERMISSIONS = 'permissions'
+PAGE_URLS = 'page_urls'
+
+
+class InvalidationCollector(threading.local):
+    """
+    Buffers the invalidations as (scope, site_id, language) and applies them
+    once deferring ends. An invalidation of every site or language of a scope
+    covers the narrower ones of the same scope.
+    """
+    def __init__(self):
+        self.pending = set()
+        self.in_request = False
+        self.depth = 0
+
+    @property
+    def deferred(self):
+        return self.in_request or self.depth > 0
+
+    def invalidate(self, scope, site_id=None, language=None):
+        self.pending.add((scope, site_id, language))
+        if not self.deferred:
+            self.flush()
+
+    def flush(self, scope=None):
+        """
+        Applies the pending invalidations, only the ones of the given scope if
+        there is one.
+        """
+        if not self.pending:
+            return
+        if scope is None:
+            pending, self.pending = self.pending, set()
+        else:
+            pending = set(item for item in self.pending if item[0] == scope)
+            self.pending -= pending
+        for scope, site_id, language in _coalesce(pending):
+            _apply(scope, site_id, language)
+
+
+def _covers(item, other):
+    # (scope, None, None) covers the whole scope, (scope, site, None) the site
+    scope, site_id, language = item
+    return (scope == other[0] and item != other and
+            site_id in (None, other[1]) and language in (None, other[2]))
+
+
+def _coalesce(pending):
+    return sorted((item for item in pending if not any(_covers(other, item) for other in pending)),
+                  key=lambda item: tuple(str(value) for value in item))
+
+
+def _apply(scope, site_id, language):
+    if scope == MENUS:
+        from menus.menu_pool import menu_pool
+
+        menu_pool.clear(site_id, language)
+    elif scope == PERMISSIONS:
+        from cms.cache.permissions import clear_permission_cache
+
+        clear_permission_cache()
+    elif scope == PAGE_URLS:
+        from cms.cache.page_urls import clear_page_urls
+
+        clear_page_urls(site_id)
+
+
+invalidation_collector = InvalidationCollector()
+
+
+def invalidate_menus(site_id=None, language=None):
+    """
+    Invalidates the cached menus of a site and language, or of every site or
+    language when they are not given.
+    """
+    invalidation_collector.invalidate(MENUS, site_id, language)
+
+
+def invalidate_permissions():
+    invalidation_collector.invalidate(PERMISSIONS)
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Defers the invalidations of the enclosed code to its end, eg for scripts
+    creating or copying many pages::
+
+        with deferred_invalidation():
+            for data in pages:
+                create_page(**data)
+    """
+    invalidation_collector.depth += 1
+    try:
+        yield
+    finally:
+        invalidation_collector.depth -= 1
+        if not invalidation_collector.deferred:
+            invalidation_collector.flush()
+
+
+def _defer_invalidations(**kwargs):
+    invalidation_collector.in_request = True
+
+
+def _flush_invalidations(**kwargs):
+    invalidation_collector.in_request = False
+    if not invalidation_collector.deferred:
+        invalidation_collector.flush()
+
+
+request_started.connect(_defer_invalidations, dispatch_uid="cms.invalidation.defer")
+request_finished.connect(_flush_invalidations, dispatch_uid="cms.invalidation.flush")
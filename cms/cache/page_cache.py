@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Storage of complete page responses, see cms.middleware.cache.
+
+Every entry stores the version of each of its surrogate keys and the menu
+generation of its site at the time it was stored. Purging a surrogate key increments its
+version, which invalidates exactly the entries built from it.
+"""
+import hashlib
+import time
+
+from cms.utils import get_cms_setting
+from cms.utils.surrogates import add_surrogate_keys, get_page_key
+from django.core.cache import cache
+from django.http import HttpResponse
+from menus.menu_pool import menu_pool
+
+
+def _get_duration():
+    return get_cms_setting('PAGE_CACHE')['duration']
+
+
+def get_cache_key(request, site_id, language):
+    parts = [str(site_id), language, request.path]
+    for header in get_cms_setting('PAGE_CACHE')['vary_headers']:
+        parts.append(request.META.get(header, ''))
+    key = hashlib.md5(u'|'.join(parts).encode('utf-8')).hexdigest()
+    return "%s:page_cache:%s" % (get_cms_setting('CACHE_PREFIX'), key)
+
+
+def _get_version_key(key):
+    return "%s:page_cache:version:%s" % (get_cms_setting('CACHE_PREFIX'), key)
+
+
+def _new_version():
+    # versions start from the current time so that an evicted version never
+    # matches the one stored in an older entry
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """
+    Returns a dictionary of surrogate key to its current version.
+    """
+    version_keys = dict((_get_version_key(key), key) for key in keys)
+    found = cache.get_many(list(version_keys.keys()))
+    versions = {}
+    missing = {}
+    for version_key, key in version_keys.items():
+        if version_key in found:
+            versions[key] = found[version_key]
+        else:
+            versions[key] = missing[version_key] = _new_version()
+    if missing:
+        cache.set_many(missing, _get_duration())
+    return versions
+
+
+def purge_page_cache(keys):
+    """
+    Invalidates the cached responses built from any of the given surrogate
+    keys.
+    """
+    for key in set(keys):
+        version_key = _get_version_key(key)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.set(version_key, _new_version(), _get_duration())
+
+
+def allow_page_cache(request, page):
+    """
+    Marks the response to the request as built from the given page, which
+    allows the page cache middleware to store it.
+    """
+    request._cms_page_cache_allowed = True
+    add_surrogate_keys(request, get_page_key(page))
+
+
+def is_page_cache_allowed(request):
+    return getattr(request, '_cms_page_cache_allowed', False)
+
+
+def get_cached_response(request, site_id, language):
+    """
+    Returns the cached response for the request or None if there is none or
+    it is outdated.
+    """
+    entry = cache.get(get_cache_key(request, site_id, language))
+    if entry is None:
+        return None
+    if entry['menu_generation'] != menu_pool.get_generation(site_id):
+        return None
+    if entry['versions'] != get_versions(entry['versions'].keys()):
+        return None
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def set_cached_response(request, site_id, language, response, keys, menu_generation):
+    """
+    Stores the response with the versions of its surrogate keys and the menu
+    generation read before it was rendered.
+    """
+    entry = {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': [(header, value) for header, value in response.items() if header.lower() != 'set-cookie'],
+        'versions': get_versions(keys),
+        'menu_generation': menu_generation,
+    }
+    cache.set(get_cache_key(request, site_id, language), entry, _get_duration())
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Index of page URLs, keyed by page lookup (page id or reverse_id), language
+and site. The entries are built when they are read and missing. Every site
+has a version stored with its entries: changing the paths, reverse ids or
+pages of a site increments it (see invalidate_page_urls), which outdates all
+its entries at once, so that nothing is rebuilt when pages are saved.
+"""
+import re
+import time
+
+from cms.cache.invalidation import PAGE_URLS, invalidation_collector
+from cms.utils import get_cms_setting
+from cms.utils.compat.type_checks import string_types, int_types
+from cms.utils.i18n import force_language
+from cms.utils.page import prefetch_titles
+from django.core.cache import cache
+
+CLEAN_KEY_PATTERN = re.compile(r'[^a-zA-Z0-9_-]')
+
+# modes of a lookup: a page instance always resolves to itself, a page id or
+# reverse_id resolves to the draft or public version of the page.
+ANY, DRAFT, PUBLIC = 'any', 'draft', 'public'
+
+
+def _clean_key(key):
+    return CLEAN_KEY_PATTERN.sub('-', key)
+
+
+def _get_duration():
+    return get_cms_setting('CACHE_DURATIONS')['content']
+
+
+def get_lookup(page_lookup):
+    """
+    Returns the index lookup for the page_lookup argument of the page_url
+    templatetag (a page instance, a page id, a reverse_id or a dict).
+    """
+    from cms.models import Page
+
+    if isinstance(page_lookup, Page):
+        return 'page-%s' % page_lookup.pk
+    if isinstance(page_lookup, string_types):
+        return 'id-%s' % _clean_key(page_lookup)
+    if isinstance(page_lookup, int_types):
+        return 'pk-%s' % page_lookup
+    return 'dict-%s' % _clean_key(str(sorted(page_lookup.items())))
+
+
+def get_cache_key(lookup, language, site_id, mode):
+    return "%s:page_url:%s:%s:%s:%s" % (
+        get_cms_setting('CACHE_PREFIX'), site_id, language, mode, lookup)
+
+
+def get_version_key(site_id):
+    return "%s:page_url_version:%s" % (get_cms_setting('CACHE_PREFIX'), site_id)
+
+
+def _get_mode(lookup, draft):
+    if lookup.startswith('page-'):
+        return ANY
+    return DRAFT if draft else PUBLIC
+
+
+def _get_entries(keys, site_ids):
+    """
+    Returns the URLs of the given entry keys which are up to date, by key,
+    and the current versions of the given sites, with one cache get_many.
+    """
+    # apply the invalidations deferred so far in this request
+    invalidation_collector.flush(PAGE_URLS)
+    version_keys = dict((get_version_key(site_id), site_id) for site_id in site_ids)
+    found = cache.get_many(list(keys) + list(version_keys))
+    versions = dict((site_id, found.get(key)) for key, site_id in version_keys.items())
+    urls = {}
+    for key, site_id in keys.items():
+        entry = found.get(key)
+        if entry is not None and versions[site_id] is not None and entry[0] == versions[site_id]:
+            urls[key] = entry[1]
+    return urls, versions
+
+
+def _set_entries(values, versions):
+    """
+    Stores the given URLs (by entry key, with their site id) under the given
+    versions of their sites, starting the versions which are missing.
+    """
+    data = {}
+    for site_id, version in versions.items():
+        if version is None:
+            # start from the current time, so that a lost version never goes
+            # back to a previous value
+            versions[site_id] = int(time.time() * 1000)
+            data[get_version_key(site_id)] = versions[site_id]
+    for key, (site_id, url) in values.items():
+        data[key] = (versions[site_id], url)
+    cache.set_many(data, _get_duration())
+
+
+def get_page_url_cache(page_lookup, language, site_id, draft=False):
+    """
+    Returns the cached URL for the given page lookup or None.
+    """
+    lookup = get_lookup(page_lookup)
+    key = get_cache_key(lookup, language, site_id, _get_mode(lookup, draft))
+    urls, versions = _get_entries({key: site_id}, [site_id])
+    return urls.get(key)
+
+
+def set_page_url_cache(page_lookup, language, site_id, url, draft=False):
+    lookup = get_lookup(page_lookup)
+    key = get_cache_key(lookup, language, site_id, _get_mode(lookup, draft))
+    _set_entries({key: (site_id, url)}, {site_id: cache.get(get_version_key(site_id))})
+
+
+def get_page_urls(pages, language):
+    """
+    Returns a dictionary of page id to URL for the given pages, using one
+    cache get_many. The missing URLs are built with a single title query and
+    stored in the index.
+    """
+    pages = dict((get_cache_key('page-%s' % page.pk, language, page.site_id, ANY), page) for page in pages)
+    found, versions = _get_entries(dict((key, page.site_id) for key, page in pages.items()),
+                                   set(page.site_id for page in pages.values()))
+    urls = dict((pages.pop(key).pk, url) for key, url in found.items())
+    if pages:
+        values = {}
+        # the URLs are prefixed with the active language, which is usually
+        # the requested one already
+        with force_language(language):
+            for key, page in zip(pages.keys(), prefetch_titles(list(pages.values()), language)):
+                urls[page.pk] = page.get_absolute_url(language)
+                values[key] = (page.site_id, urls[page.pk])
+        _set_entries(values, versions)
+    return urls
+
+
+def clear_page_urls(site_id):
+    """
+    Outdates the index entries of the given site.
+    """
+    try:
+        cache.incr(get_version_key(site_id))
+    except ValueError:
+        # not set yet (or evicted), the entries are outdated already
+        pass
+
+
+def invalidate_page_urls(site_id):
+    """
+    Outdates the index entries of the given site, once the current request or
+    deferred_invalidation block ends (see cms.cache.invalidation).
+    """
+    invalidation_collector.invalidate(PAGE_URLS, site_id)
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from cms.cache.invalidation import PERMISSIONS, invalidation_collector
 from cms.utils import get_cms_setting
 from django.core.cache import cache
 
@@ -27,6 +28,8 @@ def get_permission_cache(user, key):
     """
     Helper for reading values from cache
     """
+    # apply the permission invalidations deferred so far in this request
+    invalidation_collector.flush(PERMISSIONS)
     return cache.get(get_cache_key(user, key), version=get_cache_version())
 
 
@@ -57,3 +60,32 @@ def clear_permission_cache():
     else:
         cache.set(get_cache_version_key(), 2,
                 get_cms_setting('CACHE_DURATIONS')['permissions'])
+
+
+def get_view_restrictions_key(site_id):
+    return "%s:permission:view_restrictions:%s" % (
+        get_cms_setting('CACHE_PREFIX'), site_id)
+
+
+def get_view_restrictions(site_id):
+    """
+    Returns the view restrictions of the given site as a dictionary of
+    tree_id to a list of (lft, rght, level, grant_on) tuples, one for each
+    view permission. An empty dictionary means the site has no restrictions.
+    """
+    restrictions = cache.get(get_view_restrictions_key(site_id))
+    if restrictions is None:
+        from cms.models import PagePermission
+
+        restrictions = {}
+        permissions = PagePermission.objects.filter(can_view=True, page__site=site_id).values_list(
+            'page__tree_id', 'page__lft', 'page__rght', 'page__level', 'grant_on')
+        for tree_id, lft, rght, level, grant_on in permissions:
+            restrictions.setdefault(tree_id, []).append((lft, rght, level, grant_on))
+        cache.set(get_view_restrictions_key(site_id), restrictions,
+                  get_cms_setting('CACHE_DURATIONS')['permissions'])
+    return restrictions
+
+
+def clear_view_restrictions(site_id):
+    cache.delete(get_view_restrictions_key(site_id))
@@ -8,6 +8,9 @@ from cms.management.commands.subcommands.uninstall import UninstallCommand
 from cms.management.commands.subcommands.mptt import FixMPTTCommand
 from cms.management.commands.subcommands.copy_lang import CopyLangCommand
 from cms.management.commands.subcommands.delete_orphaned_plugins import DeleteOrphanedPluginsCommand
+from cms.management.commands.subcommands.search_index import RebuildSearchIndexCommand
+from cms.management.commands.subcommands.import_pages import ImportPagesCommand
+from cms.management.commands.subcommands.export_pages import ExportPagesCommand
 from django.core.management.base import BaseCommand
 from optparse import make_option
 
@@ -31,6 +34,9 @@ class Command(SubcommandsCommand):
         'copy-lang': CopyLangCommand,
         'delete_orphaned_plugins': DeleteOrphanedPluginsCommand,
         'check': CheckInstallation,
+        'rebuild-search-index': RebuildSearchIndexCommand,
+        'import': ImportPagesCommand,
+        'export': ExportPagesCommand,
     }
 
     @property
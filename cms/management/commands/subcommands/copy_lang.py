@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
-from django.conf import settings
+import time
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from cms.api import copy_plugins_to_language
-from cms.models import Title, Page, StaticPlaceholder
-from cms.utils.copy_plugins import copy_plugins_to
+from cms.models import Page
+from cms.utils.copy_lang import (COPY_CHUNK_SIZE, CopyState, copy_language_chunk, copy_static_placeholders,
+                                 get_page_chunks, get_source_pages, rebuild_paths)
 from cms.utils.i18n import get_language_list
 
 
@@ -16,11 +17,7 @@ class CopyLangCommand(BaseCommand):
     def handle(self, *args, **kwargs):
         verbose = 'verbose' in args
         only_empty = 'force-copy' not in args
-        site = [arg.split("=")[1] for arg in args if arg.startswith("site")]
-        if site:
-            site = site.pop()
-        else:
-            site = settings.SITE_ID
+        site = self._get_option(args, 'site', settings.SITE_ID)
 
         #test both langs
         try:
@@ -28,7 +25,7 @@ class CopyLangCommand(BaseCommand):
 
             from_lang = args[0]
             to_lang = args[1]
-            
+
             assert from_lang != to_lang
         except AssertionError:
             raise CommandError("Error: bad arguments -- Usage: manage.py cms copy-lang <lang_from> <lang_to>")
@@ -39,38 +36,49 @@ class CopyLangCommand(BaseCommand):
         except AssertionError:
             raise CommandError("Both languages have to be present in settings.LANGUAGES and settings.CMS_LANGUAGES")
 
-        for page in Page.objects.on_site(site).drafts():
-            # copy title
-            if from_lang in page.get_languages():
-                try:
-                    title = page.get_title_obj(to_lang, fallback=False)
-                except Title.DoesNotExist:
-                    title = page.get_title_obj(from_lang)
-                    if verbose:
-                        self.stdout.write('copying title %s from language %s\n' % (title.title, from_lang))
-                    title.id = None
-                    title.publisher_public_id = None
-                    title.publisher_state = 0
-                    title.language = to_lang
-                    title.save()
-                # copy plugins using API
-                if verbose:
-                    self.stdout.write('copying plugins for %s from %s\n' % (page.get_page_title(from_lang), from_lang))
-                copy_plugins_to_language(page, from_lang, to_lang, only_empty)
-            else:
-                if verbose:
+        try:
+            chunk_size = int(self._get_option(args, 'chunk', COPY_CHUNK_SIZE))
+            assert chunk_size > 0
+        except (AssertionError, ValueError):
+            raise CommandError("The chunk option has to be a positive number")
+
+        page_ids, skipped = get_source_pages(site, from_lang)
+        if verbose:
+            for chunk in get_page_chunks(skipped):
+                for page in Page.objects.filter(pk__in=chunk):
                     self.stdout.write('Skipping page %s, language %s not defined\n' % (page, from_lang))
 
-        for static_placeholder in StaticPlaceholder.objects.all():
-            plugin_list = []
-            for plugin in static_placeholder.draft.get_plugins():
-                if plugin.language == from_lang:
-                    plugin_list.append(plugin)
+        state = CopyState(self._get_option(args, 'state'))
+        if state.done:
+            self.stdout.write(u"Skipping %d pages copied before\n" % len(state.done))
+        chunks = get_page_chunks([pk for pk in page_ids if pk not in state.done], chunk_size)
+        tasks = [(chunk, from_lang, to_lang, only_empty) for chunk in chunks]
 
-            if plugin_list:
-                if verbose:
-                    self.stdout.write("copying plugins from static_placeholder '%s' in '%s' to '%s'\n" % (static_placeholder.name, from_lang,
-                                                                                             to_lang))
-                copy_plugins_to(plugin_list, static_placeholder.draft, to_lang)
+        total = sum(len(chunk) for chunk in chunks)
+        start = time.time()
+        copied = {'pages': 0, 'titles': 0, 'plugins': 0}
+
+        def progress(page_ids, titles, plugins):
+            state.add(page_ids)
+            copied['pages'] += len(page_ids)
+            copied['titles'] += titles
+            copied['plugins'] += plugins
+            elapsed = max(time.time() - start, 0.001)
+            self.stdout.write(u"Copied %d/%d pages, %d titles and %d plugins (%.1f pages/s)\n" % (
+                copied['pages'], total, copied['titles'], copied['plugins'], copied['pages'] / elapsed))
+
+        for task in tasks:
+            progress(task[0], *copy_language_chunk(*task))
+
+        plugins = copy_static_placeholders(from_lang, to_lang, only_empty)
+        if verbose and plugins:
+            self.stdout.write(u"copied %d plugins of the static placeholders from '%s' to '%s'\n" % (
+                plugins, from_lang, to_lang))
+
+        rebuild_paths(page_ids, site)
 
         self.stdout.write(u"all done")
+
+    def _get_option(self, args, name, default=None):
+        values = [arg.split("=", 1)[1] for arg in args if arg.startswith("%s=" % name)]
+        return values[-1] if values else default
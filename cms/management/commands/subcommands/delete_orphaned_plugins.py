@@ -1,50 +1,69 @@
-from django.core.management.base import NoArgsCommand
-from cms.management.commands.subcommands.list import plugin_report
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from cms.plugins.utils import DELETE_CHUNK_SIZE, delete_plugins, get_orphaned_plugins
 from cms.utils.compat.input import raw_input
 
 
-class DeleteOrphanedPluginsCommand(NoArgsCommand):
+class DeleteOrphanedPluginsCommand(BaseCommand):
+    args = '[dry-run] [chunk=<size>]'
     help = "Delete plugins from the CMSPlugins table that should have instances but don't, and ones for which a corresponding plugin model can no longer be found"
 
-    def handle_noargs(self, **options):
+    def handle(self, *args, **options):
         """
-        Obtains a plugin report -
-        cms.management.commands.subcommands.list.plugin_report - and uses it
-        to delete orphaned plugins from the database, i.e. ones that are no
+        Finds the orphaned plugins - cms.plugins.utils.get_orphaned_plugins -
+        and deletes them from the database in chunks, i.e. ones that are no
         longer installed, and ones that have no corresponding saved plugin
         instances (as will happen if a plugin is inserted into a placeholder,
-        but not saved).
+        but not saved). With dry-run the orphaned plugins are only counted.
         """
-        self.stdout.write(u"Obtaining plugin report\n")
-        uninstalled_instances = []
-        unsaved_instances = []
+        dry_run = 'dry-run' in args
+        chunk_size = [arg.split("=", 1)[1] for arg in args if arg.startswith("chunk=")]
+        try:
+            chunk_size = int(chunk_size[-1]) if chunk_size else DELETE_CHUNK_SIZE
+            assert chunk_size > 0
+        except (AssertionError, ValueError):
+            raise CommandError("The chunk option has to be a positive number")
 
-        for plugin in plugin_report():
-            if not plugin["model"]:
-                for instance in plugin["instances"]:
-                    uninstalled_instances.append(instance)
+        self.stdout.write(u"Obtaining plugin report\n")
+        uninstalled = []
+        unsaved = []
+        for plugin_type, plugin_model, plugins in get_orphaned_plugins():
+            count = plugins.count()
+            if count:
+                (unsaved if plugin_model else uninstalled).append((plugin_type, plugins, count))
+        uninstalled_count = sum(count for plugin_type, plugins, count in uninstalled)
+        unsaved_count = sum(count for plugin_type, plugins, count in unsaved)
 
-            for instance in plugin["unsaved_instances"]:
-                unsaved_instances.append(instance)
+        if dry_run:
+            for plugin_type, plugins, count in uninstalled:
+                self.stdout.write(u"    %s: %s uninstalled plugins\n" % (plugin_type, count))
+            for plugin_type, plugins, count in unsaved:
+                self.stdout.write(u"    %s: %s plugins with unsaved instances\n" % (plugin_type, count))
+            self.stdout.write(u"Would delete instances of: \n    %s uninstalled plugins  \n    %s plugins with unsaved instances\n" % (uninstalled_count, unsaved_count))
+            return
 
         if options.get('interactive'):
             confirm = raw_input("""
 You have requested to delete any instances of uninstalled plugins and unsaved plugin instances.
 There are %d uninstalled plugins and %d unsaved_plugins.
 Are you sure you want to do this?
-Type 'yes' to continue, or 'no' to cancel: """ % (len(uninstalled_instances), len(unsaved_instances)))
+Type 'yes' to continue, or 'no' to cancel: """ % (uninstalled_count, unsaved_count))
         else:
             confirm = 'yes'
 
         if confirm == 'yes':
             # delete items whose plugin is uninstalled and items with unsaved instances
             self.stdout.write(u"... deleting any instances of uninstalled plugins and unsaved plugin instances\n")
+            for plugin_type, plugins, count in uninstalled + unsaved:
+                start = time.time()
 
-            for instance in uninstalled_instances:
-                instance.delete()
+                def progress(deleted):
+                    elapsed = max(time.time() - start, 0.001)
+                    self.stdout.write(u"    %s: deleted %d/%d plugins (%.1f plugins/s)\n" % (
+                        plugin_type, deleted, count, deleted / elapsed))
 
-            for instance in unsaved_instances:
-                instance.delete()
+                delete_plugins(plugins, chunk_size, progress)
 
-            self.stdout.write(u"Deleted instances of: \n    %s uninstalled plugins  \n    %s plugins with unsaved instances\n" % (len(uninstalled_instances), len(unsaved_instances)))
+            self.stdout.write(u"Deleted instances of: \n    %s uninstalled plugins  \n    %s plugins with unsaved instances\n" % (uninstalled_count, unsaved_count))
             self.stdout.write(u"all done\n")
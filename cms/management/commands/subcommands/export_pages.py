@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cms.models import Page
+from cms.utils.page_transfer import export_pages
+
+
+class ExportPagesCommand(BaseCommand):
+    args = '<file>'
+    help = u'export the draft pages of a site, or a page and its descendants, to a file (- for stdout)'
+
+    def handle(self, *args, **kwargs):
+        if not args:
+            raise CommandError("Error: bad arguments -- Usage: manage.py cms export <file> [site=<id>] [page=<id>]")
+        site = [arg.split("=")[1] for arg in args if arg.startswith("site=")]
+        site = site.pop() if site else settings.SITE_ID
+        root = [arg.split("=")[1] for arg in args if arg.startswith("page=")]
+
+        pages = Page.objects.drafts().filter(site=site)
+        if root:
+            try:
+                root = pages.get(pk=root.pop())
+            except Page.DoesNotExist:
+                raise CommandError("The page has to be a draft page of the site")
+            pages = pages.filter(tree_id=root.tree_id, lft__gte=root.lft, lft__lte=root.rght)
+
+        if args[0] == '-':
+            count = export_pages(self.stdout, pages)
+            # the export is on stdout
+            getattr(self, 'stderr', sys.stderr).write(u"Exported %d pages\n" % count)
+        else:
+            with open(args[0], 'w') as stream:
+                count = export_pages(stream, pages)
+            self.stdout.write(u"Exported %d pages\n" % count)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from cms.api import bulk_create_pages
+from cms.models import Page
+from cms.utils.page_transfer import IMPORT_CHUNK_SIZE, PageImporter, is_header, iter_records
+
+
+def _parse_dates(nodes):
+    for node in nodes:
+        for key in ('publication_date', 'publication_end_date'):
+            if node.get(key):
+                node[key] = parse_datetime(node[key])
+        _parse_dates(node.get('children', ()))
+    return nodes
+
+
+def _count_pages(nodes):
+    return sum(1 + _count_pages(node.get('children', ())) for node in nodes)
+
+
+class ImportPagesCommand(BaseCommand):
+    args = '<file>'
+    help = u'create draft pages from an export (see cms export) or from a JSON page tree (see cms.api.bulk_create_pages)'
+
+    def handle(self, *args, **kwargs):
+        if not args:
+            raise CommandError("Error: bad arguments -- Usage: manage.py cms import <file> [site=<id>] [parent=<id>] "
+                               "[state=<file>] [chunk=<size>]")
+        site = self._get_option(args, 'site', settings.SITE_ID)
+        parent = self._get_option(args, 'parent')
+
+        try:
+            site = Site.objects.get(pk=site)
+        except Site.DoesNotExist:
+            raise CommandError("Site %s does not exist" % site)
+        if parent:
+            try:
+                parent = Page.objects.drafts().get(pk=parent, site=site)
+            except Page.DoesNotExist:
+                raise CommandError("The parent page has to be a draft page of the site")
+
+        try:
+            with open(args[0]) as stream:
+                if is_header(stream.readline()):
+                    stream.seek(0)
+                    self._import_export(stream, args, site, parent)
+                else:
+                    stream.seek(0)
+                    self._import_tree(stream, site, parent)
+        except IOError as error:
+            raise CommandError("Can't read %s: %s" % (args[0], error))
+
+    def _get_option(self, args, name, default=None):
+        values = [arg.split("=", 1)[1] for arg in args if arg.startswith("%s=" % name)]
+        return values[-1] if values else default
+
+    def _import_tree(self, stream, site, parent):
+        try:
+            nodes = json.load(stream)
+        except ValueError as error:
+            raise CommandError("Invalid JSON: %s" % error)
+        if isinstance(nodes, dict):
+            nodes = [nodes]
+        try:
+            bulk_create_pages(_parse_dates(nodes), parent=parent, site=site, created_by='script')
+        except (AssertionError, TypeError) as error:
+            raise CommandError("Invalid page tree: %s" % error)
+        self.stdout.write(u"Imported %d pages\n" % _count_pages(nodes))
+
+    def _import_export(self, stream, args, site, parent):
+        importer = PageImporter(site, parent, state_path=self._get_option(args, 'state', '%s.state' % args[0]),
+                                chunk_size=int(self._get_option(args, 'chunk', IMPORT_CHUNK_SIZE)))
+        start = time.time()
+
+        def progress(importer):
+            elapsed = max(time.time() - start, 0.001)
+            self.stdout.write(u"Imported %d pages (%.1f pages/s)\n" % (importer.created, importer.created / elapsed))
+
+        try:
+            importer.import_records(iter_records(stream), progress)
+        except (AssertionError, KeyError, TypeError, ValueError) as error:
+            raise CommandError("Import stopped after %d pages, run the same command to resume it: %s" % (
+                importer.created, error))
+        if importer.skipped:
+            self.stdout.write(u"Skipped %d pages imported before\n" % importer.skipped)
+        if importer.unresolved:
+            self.stdout.write(u"%d page links of plugins pointed to pages not in the export and were cleared\n" %
+                              len(importer.unresolved))
+        if importer.dropped:
+            self.stdout.write(u"Left out %d plugins whose required page link pointed to a page not in the "
+                              u"export\n" % importer.dropped)
@@ -2,8 +2,9 @@
 from cms.management.commands.subcommands.base import SubcommandsCommand
 from cms.models import Page
 from cms.models.pluginmodel import CMSPlugin
-from cms.plugin_pool import plugin_pool
+from cms.plugins.utils import get_orphaned_plugins
 from django.core.management.base import NoArgsCommand
+from django.db.models import Count
 
 class ListApphooksCommand(NoArgsCommand):
     
@@ -24,46 +25,47 @@ def plugin_report():
     #     },
     # ]
     plugin_report = []
-    all_plugins = CMSPlugin.objects.order_by("plugin_type")
-    plugin_types = list(set(all_plugins.values_list("plugin_type", flat=True)))
-    plugin_types.sort()
+    for plugin_type, plugin_model, orphaned in get_orphaned_plugins():
+        plugin_report.append({
+            'type': plugin_type,
+            'model': plugin_model,
+            'instances': CMSPlugin.objects.filter(plugin_type=plugin_type),
+            # the instances of uninstalled plugins can't be checked
+            'unsaved_instances': list(orphaned) if plugin_model else [],
+        })
+    return plugin_report
 
-    for plugin_type in plugin_types: 
-        plugin = {}
-        plugin["type"] = plugin_type
-        try:
-            # get all plugins of this type                 
-            plugins = CMSPlugin.objects.filter(plugin_type=plugin_type)
-            plugin["instances"] = plugins
-            # does this plugin have a model? report unsaved instances
-            plugin["model"] = plugin_pool.get_plugin(name=plugin_type).model
-            unsaved_instances = [p for p in plugins if not p.get_plugin_instance()[0]]
-            plugin["unsaved_instances"] = unsaved_instances
-               
-        # catch uninstalled plugins
-        except KeyError:
-            plugin["model"] = None
-            plugin["instances"] = plugins
-            plugin["unsaved_instances"] = []
 
-        plugin_report.append(plugin)
-        
-    return plugin_report
+def plugin_count_report():
+    """
+    Same structure as plugin_report, with the numbers of instances and unsaved
+    instances counted by the database instead of the instances.
+    """
+    counts = dict(CMSPlugin.objects.order_by().values_list('plugin_type').annotate(count=Count('pk')))
+    report = []
+    for plugin_type, plugin_model, orphaned in get_orphaned_plugins():
+        report.append({
+            'type': plugin_type,
+            'model': plugin_model,
+            'instances': counts.get(plugin_type, 0),
+            'unsaved_instances': orphaned.count() if plugin_model else 0,
+        })
+    return report
 
-    
 
 class ListPluginsCommand(NoArgsCommand):
 
     help = 'Lists all plugins in CMSPlugin'
     def handle_noargs(self, **options):
         self.stdout.write(u"==== Plugin report ==== \n\n")
-        self.stdout.write(u"There are %s plugin types in your database \n" % len(plugin_report()))
-        for plugin in plugin_report():   
+        report = plugin_count_report()
+        self.stdout.write(u"There are %s plugin types in your database \n" % len(report))
+        for plugin in report:
             self.stdout.write(u"\n%s \n" % plugin["type"])
 
             plugin_model = plugin["model"]
-            instances = len(plugin["instances"])
-            unsaved_instances = len(plugin["unsaved_instances"])
+            instances = plugin["instances"]
+            unsaved_instances = plugin["unsaved_instances"]
 
             if not plugin_model: 
                 self.stdout.write(self.style.ERROR("  ERROR      : not installed \n"))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import NoArgsCommand
+
+from cms.models import Page
+from cms.utils.search import get_search_backend
+
+
+class RebuildSearchIndexCommand(NoArgsCommand):
+    help = 'Rebuilds the search index of all published pages'
+
+    def handle_noargs(self, **options):
+        backend = get_search_backend()
+        count = 0
+        for page in Page.objects.public().prefetch_related('title_set'):
+            for title in page.title_set.all():
+                if title.published:
+                    backend.update_page(page, title.language)
+                    count += 1
+                else:
+                    backend.remove_page(page, title.language)
+        self.stdout.write(u"Indexed %d pages\n" % count)
@@ -4,20 +4,25 @@ from cms.apphook_pool import apphook_pool
 from cms.models.permissionmodels import (ACCESS_DESCENDANTS,
     ACCESS_PAGE_AND_DESCENDANTS, ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE)
 from cms.models.permissionmodels import PagePermission, GlobalPagePermission
+from cms.models.pagemodel import Page
 from cms.models.titlemodels import Title
 from cms.utils import get_language_from_request
 from cms.utils.conf import get_cms_setting
-from cms.utils.i18n import get_fallback_languages, hide_untranslated
-from cms.utils.page_resolver import get_page_queryset
-from cms.utils.moderator import get_title_queryset, use_draft
+from cms.utils.i18n import hide_untranslated
+from cms.utils.page import prefetch_titles
+from cms.utils.page_resolver import get_page_queryset, get_page_from_request
+from cms.utils.moderator import use_draft
 from cms.utils.plugins import current_site
-from menus.base import Menu, NavigationNode, Modifier
+from menus.base import Menu, NavigationNode, Modifier, NodeIndex, PRE_CUT, BREADCRUMB
 from menus.menu_pool import menu_pool
 
 from django.contrib.sites.models import Site
 from django.db.models.query_utils import Q
 from django.utils.translation import get_language
 
+# the number of pages checked at once for the home page of the breadcrumb
+HOME_CHUNK_SIZE = 10
+
 
 def get_visible_pages(request, pages, site=None):
     """
@@ -219,10 +224,11 @@ def page_to_node(page, home, cut):
 
 
 class CMSMenu(Menu):
-    def get_nodes(self, request):
+    def get_page_queryset(self, request, site, lang):
+        """
+        Returns the pages of the site in the menu, before view permissions.
+        """
         page_queryset = get_page_queryset(request)
-        site = Site.objects.get_current()
-        lang = get_language_from_request(request)
 
         filters = {
             'site': site,
@@ -233,8 +239,12 @@ class CMSMenu(Menu):
 
         if not use_draft(request):
             page_queryset = page_queryset.published(lang)
-        pages = page_queryset.filter(**filters).order_by("tree_id", "lft")
-        ids = {}
+        return page_queryset.filter(**filters).order_by("tree_id", "lft")
+
+    def get_nodes(self, request):
+        site = Site.objects.get_current()
+        lang = get_language_from_request(request)
+        pages = self.get_page_queryset(request, site, lang)
         nodes = []
         first = True
         home_cut = False
@@ -258,33 +268,95 @@ class CMSMenu(Menu):
                 home_children.append(page.pk)
             if (page.pk == home.pk and home.in_navigation) or page.pk != home.pk:
                 first = False
-            ids[page.id] = page
             actual_pages.append(page)
             page.title_cache = {}
 
-        langs = [lang]
-        if not hide_untranslated(lang):
-            langs.extend(get_fallback_languages(lang))
-
-        titles = list(get_title_queryset(request).filter(page__in=ids, language__in=langs))
-        for title in titles: # add the title and slugs and some meta data
-            page = ids[title.page_id]
-            page.title_cache[title.language] = title
+        # add the title and slugs and some meta data
+        prefetch_titles(actual_pages, lang, fallbacks=not hide_untranslated(lang))
 
         for page in actual_pages:
             if page.title_cache:
                 nodes.append(page_to_node(page, home, home_cut))
         return nodes
 
+    def get_home_page(self, request, site, lang, start=0):
+        """
+        Returns the home page of the menu like get_nodes finds it: the first
+        page of the site visible to the user, in tree order (after the first
+        start pages).
+        """
+        pages = self.get_page_queryset(request, site, lang)
+        while True:
+            chunk = list(pages[start:start + HOME_CHUNK_SIZE])
+            if not chunk:
+                return None
+            visible_pages = get_visible_pages(request, chunk, site)
+            for page in chunk:
+                if page.pk in visible_pages:
+                    return page
+            start += len(chunk)
+
+    def get_breadcrumb_nodes(self, request):
+        """
+        Builds the breadcrumb of a CMS page from its ancestors, the page and
+        the home page only, with one query for the home page candidates, one
+        for the path pages and one for their titles. Pages with navigation extenders or apphooks (whose
+        menus may own the requested URL) and pages with an ancestor missing
+        from the menu use the full tree.
+        """
+        page = get_page_from_request(request)
+        if not isinstance(page, Page) or page.navigation_extenders or page.application_urls:
+            return None
+        site = Site.objects.get_current()
+        lang = get_language_from_request(request)
+        queryset = self.get_page_queryset(request, site, lang)
+        # the first pages are the candidates for the home page
+        first_pages = list(queryset[:HOME_CHUNK_SIZE])
+        # the page and its ancestors, without querying the ancestors first
+        path = Q(tree_id=page.tree_id, lft__lte=page.lft, rght__gte=page.rght)
+        pages = list(queryset.filter(path | Q(is_home=True)))
+        visible_pages = get_visible_pages(request, first_pages + pages, site)
+        home = None
+        for menu_page in first_pages:
+            if menu_page.pk in visible_pages:
+                home = menu_page
+                break
+        if home is None and len(first_pages) == HOME_CHUNK_SIZE:
+            home = self.get_home_page(request, site, lang, start=HOME_CHUNK_SIZE)
+        pages = [menu_page for menu_page in pages if menu_page.pk in visible_pages]
+        prefetch_titles(pages, lang, fallbacks=not hide_untranslated(lang))
+        pages = [menu_page for menu_page in pages if menu_page.title_cache]
+        # every ancestor has a level of its own
+        if len([menu_page for menu_page in pages if menu_page.tree_id == page.tree_id
+                and menu_page.lft <= page.lft and menu_page.rght >= page.rght]) != page.level + 1:
+            return None
+        # the home page is cut from its children if it is not in the navigation
+        home_cut = home is not None and not home.in_navigation
+        nodes = []
+        for menu_page in pages:
+            node = page_to_node(menu_page, home, home_cut)
+            if menu_page.pk == page.pk and node.get_absolute_url() != request.path:
+                # the rest of the path is handled by another menu
+                return None
+            nodes.append(node)
+        return nodes
+
 
 menu_pool.register_menu(CMSMenu)
 
 
 class NavExtender(Modifier):
+    phases = (PRE_CUT, BREADCRUMB)
+
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         if post_cut:
             return nodes
-        exts = []
+        return self.modify_indexed(request, nodes, NodeIndex(nodes), namespace, root_id, post_cut, breadcrumb)
+
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
+        exts = set()
+        # the nodes of each extender namespace without parent
+        unassigned = {}
         # rearrange the parent relations
         home = None
         for node in nodes:
@@ -293,26 +365,27 @@ class NavExtender(Modifier):
             extenders = node.attr.get("navigation_extenders", None)
             if extenders:
                 for ext in extenders:
-                    if not ext in exts:
-                        exts.append(ext)
-                    for extnode in nodes:
-                        if extnode.namespace == ext and not extnode.parent_id:# if home has nav extenders but home is not visible
-                            if node.attr.get("is_home", False) and not node.visible:
-                                extnode.parent_id = None
-                                extnode.parent_namespace = None
-                                extnode.parent = None
-                            else:
-                                extnode.parent_id = node.id
-                                extnode.parent_namespace = node.namespace
-                                extnode.parent = node
-                                node.children.append(extnode)
-        removed = []
+                    exts.add(ext)
+                    if ext not in unassigned:
+                        unassigned[ext] = index.by_namespace.get(ext, [])
+                    extnodes = [extnode for extnode in unassigned[ext] if not extnode.parent_id]
+                    for extnode in extnodes:
+                        # if home has nav extenders but home is not visible
+                        if node.attr.get("is_home", False) and not node.visible:
+                            extnode.parent_id = None
+                            extnode.parent_namespace = None
+                            extnode.parent = None
+                        else:
+                            extnode.parent_id = node.id
+                            extnode.parent_namespace = node.namespace
+                            extnode.parent = node
+                            node.children.append(extnode)
+                    unassigned[ext] = extnodes
         # find all not assigned nodes
+        removed = set()
         for menu in menu_pool.menus.items():
             if hasattr(menu[1], 'cms_enabled') and menu[1].cms_enabled and not menu[0] in exts:
-                for node in nodes:
-                    if node.namespace == menu[0]:
-                        removed.append(node)
+                removed.add(menu[0])
         if breadcrumb:
         # if breadcrumb and home not in navigation add node
             if breadcrumb and home and not home.visible:
@@ -321,10 +394,9 @@ class NavExtender(Modifier):
                     home.selected = True
                 else:
                     home.selected = False
-                    # remove all nodes that are nav_extenders and not assigned
-        for node in removed:
-            nodes.remove(node)
-        return nodes
+        # remove all nodes that are nav_extenders and not assigned, the parent
+        # relations changed so a new list is returned in any case
+        return [node for node in nodes if node.namespace not in removed]
 
 
 menu_pool.register_modifier(NavExtender)
@@ -398,21 +470,20 @@ class SoftRootCutter(Modifier):
                 Instruments
     """
 
+    phases = (PRE_CUT, BREADCRUMB)
+
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         # only apply this modifier if we're pre-cut (since what we do is cut)
         if post_cut:
             return nodes
-        selected = None
-        root_nodes = []
-        # find the selected node as well as all the root nodes
-        for node in nodes:
-            if node.selected:
-                selected = node
-            if not node.parent:
-                root_nodes.append(node)
+        return self.modify_indexed(request, nodes, NodeIndex(nodes), namespace, root_id, post_cut, breadcrumb)
 
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
+        selected = index.selected
         # if we found a selected ...
         if selected:
+            # ids of the nodes cut away, removed from the list at the end
+            removed = set()
             # and the selected is a softroot
             if selected.attr.get("soft_root", False):
                 # get it's descendants
@@ -423,22 +494,22 @@ class SoftRootCutter(Modifier):
                 nodes = [selected] + nodes
             else:
                 # if it's not a soft root, walk ancestors (upwards!)
-                nodes = self.find_ancestors_and_remove_children(selected, nodes)
+                nodes = self.find_ancestors_and_remove_children(selected, nodes, removed)
+            nodes = [node for node in nodes if id(node) not in removed]
         return nodes
 
-    def find_and_remove_children(self, node, nodes):
+    def find_and_remove_children(self, node, removed):
         for child in node.children:
             if child.attr.get("soft_root", False):
-                self.remove_children(child, nodes)
-        return nodes
+                self.remove_children(child, removed)
 
-    def remove_children(self, node, nodes):
+    def remove_children(self, node, removed):
         for child in node.children:
-            nodes.remove(child)
-            self.remove_children(child, nodes)
+            removed.add(id(child))
+            self.remove_children(child, removed)
         node.children = []
 
-    def find_ancestors_and_remove_children(self, node, nodes):
+    def find_ancestors_and_remove_children(self, node, nodes, removed):
         """
         Check ancestors of node for soft roots
         """
@@ -448,14 +519,14 @@ class SoftRootCutter(Modifier):
                 node.parent.parent = None
                 nodes = [node.parent] + nodes
             else:
-                nodes = self.find_ancestors_and_remove_children(node.parent, nodes)
+                nodes = self.find_ancestors_and_remove_children(node.parent, nodes, removed)
         else:
             for newnode in nodes:
                 if newnode != node and not newnode.parent:
-                    self.find_and_remove_children(newnode, nodes)
+                    self.find_and_remove_children(newnode, removed)
         for child in node.children:
             if child != node:
-                self.find_and_remove_children(child, nodes)
+                self.find_and_remove_children(child, removed)
         return nodes
 
 
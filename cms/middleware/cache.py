@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Page cache middleware
+"""
+from cms.apphook_pool import apphook_pool
+from cms.cache.page_cache import (allow_page_cache, get_cached_response, is_page_cache_allowed,
+    set_cached_response)
+from cms.utils import get_site_id
+from cms.utils.surrogates import get_surrogate_keys
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import get_language
+from menus.menu_pool import menu_pool
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or request.GET:
+        return False
+    if request.user.is_authenticated():
+        return False
+    toolbar = request.toolbar
+    return not (toolbar.show_toolbar or toolbar.edit_mode or toolbar.build_mode)
+
+
+def _is_cacheable_response(request, response):
+    if request.method != 'GET' or response.status_code != 200:
+        return False
+    if getattr(response, 'streaming', False) or response.cookies:
+        return False
+    if 'private' in response.get('Cache-Control', '') or 'no-cache' in response.get('Cache-Control', ''):
+        return False
+    # responses with a csrf token or messages are specific to the visitor
+    if request.META.get('CSRF_COOKIE_USED', False):
+        return False
+    messages = getattr(request, '_messages', None)
+    if messages is not None and messages.used:
+        return False
+    return True
+
+
+def _check_apphook(request):
+    """
+    Opts in the responses of apphooks with page_cache = True.
+    """
+    page = getattr(request, 'current_page', None)
+    if not page or not page.application_urls or page.login_required:
+        return
+    try:
+        app = apphook_pool.get_apphook(page.application_urls)
+    except ImproperlyConfigured:
+        return
+    if app.page_cache:
+        allow_page_cache(request, page)
+
+
+class PageCacheMiddleware(object):
+    """
+    Caches the complete responses of CMS pages, and of apphooks setting
+    page_cache = True, for anonymous users without the toolbar.
+
+    The entries are keyed by site, language, path and the headers listed in
+    CMS_PAGE_CACHE['vary_headers'], and are purged when the pages and static
+    placeholders they were built from are published or the menus change.
+
+    Must be placed after the ToolbarMiddleware.
+    """
+
+    def process_request(self, request):
+        request._cms_page_cache = _is_cacheable_request(request)
+        if not request._cms_page_cache:
+            return None
+        site_id = get_site_id(None)
+        request._cms_menu_generation = menu_pool.get_generation(site_id)
+        response = get_cached_response(request, site_id, get_language())
+        if response is not None:
+            request._cms_page_cache = False
+        return response
+
+    def process_response(self, request, response):
+        if not getattr(request, '_cms_page_cache', False):
+            return response
+        if not _is_cacheable_response(request, response):
+            return response
+        if not is_page_cache_allowed(request):
+            _check_apphook(request)
+            if not is_page_cache_allowed(request):
+                # not a CMS page
+                return response
+        set_cached_response(request, get_site_id(None), get_language(), response,
+                            get_surrogate_keys(request), request._cms_menu_generation)
+        return response
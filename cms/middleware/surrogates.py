@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Surrogate keys middleware
+"""
+from cms.utils.surrogates import get_surrogate_keys
+
+
+class SurrogateKeyMiddleware(object):
+    """
+    Adds the surrogate keys collected while rendering the response (pages,
+    placeholders, static placeholders, plugin types and menus) to the
+    Surrogate-Key and Cache-Tag headers, so reverse proxies and CDNs can purge
+    the responses when the content changes (see CMS_PURGE_BACKENDS).
+    """
+
+    def process_response(self, request, response):
+        keys = get_surrogate_keys(request)
+        if keys:
+            response['Surrogate-Key'] = ' '.join(keys)
+            response['Cache-Tag'] = ','.join(keys)
+        return response
@@ -4,8 +4,8 @@ Edit Toolbar middleware
 """
 from cms.plugin_pool import plugin_pool
 from cms.toolbar.toolbar import CMSToolbar
+from cms.utils import is_anonymous_request
 from cms.utils.i18n import force_language
-from menus.menu_pool import menu_pool
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 from cms.utils.placeholder import get_toolbar_plugin_struct
@@ -48,16 +48,19 @@ class ToolbarMiddleware(object):
         """
         If we should show the toolbar for this request, put it on
         request.toolbar. Then call the request_hook on the toolbar.
+
+        The toolbar modes of anonymous users without a session cookie aren't
+        read from the session, so that it isn't loaded for them.
         """
+        if is_anonymous_request(request):
+            request._cms_anonymous = True
+            request.toolbar = CMSToolbar(request)
+            return
         if 'edit' in request.GET and not request.session.get('cms_edit', False):
-            if not request.session.get('cms_edit', False):
-                menu_pool.clear()
             request.session['cms_edit'] = True
             if request.session.get('cms_build', False):
                 request.session['cms_build'] = False
         if 'edit_off' in request.GET and request.session.get('cms_edit', True):
-            if request.session.get('cms_edit', True):
-                menu_pool.clear()
             request.session['cms_edit'] = False
             if request.session.get('cms_build', False):
                 request.session['cms_build'] = False
@@ -70,3 +73,13 @@ class ToolbarMiddleware(object):
         if isinstance(response, HttpResponse):
             return response
 
+    def process_response(self, request, response):
+        """
+        Without a session cookie the session of an anonymous request is empty,
+        reading it (eg to get the user) doesn't make the response vary on the
+        cookies unless something was stored in it.
+        """
+        session = getattr(request, 'session', None)
+        if getattr(request, '_cms_anonymous', False) and session is not None and not session.modified:
+            session.accessed = False
+        return response
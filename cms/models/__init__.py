@@ -13,6 +13,7 @@ from .pluginmodel import *
 from .titlemodels import *
 from .placeholderpluginmodel import *
 from .static_placeholder import *
+from .searchmodels import *
 
 import django.core.urlresolvers
 # must be last
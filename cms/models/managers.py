@@ -75,18 +75,38 @@ class PageManager(PublisherManager):
     def get_home(self, site=None):
         return self.get_query_set().get_home(site)
 
+    def with_titles(self, languages=None, fallbacks=True):
+        return self.get_query_set().with_titles(languages, fallbacks)
+
     def search(self, q, language=None, current_site_only=True):
         """Simple search function
 
-        Plugins can define a 'search_fields' tuple similar to ModelAdmin classes
+        Returns the public pages matching q, best matches first, from the
+        search index (see cms.utils.search). Plugins can define a
+        'search_fields' tuple similar to ModelAdmin classes, otherwise their
+        translatable content is indexed.
+        """
+        from cms.utils.search import get_search_backend, order_by_ids
+
+        site = Site.objects.get_current() if current_site_only else None
+        backend = get_search_backend()
+        if not backend.is_indexed():
+            # not indexed yet (see the rebuild-search-index command)
+            return self._search_content(q, language, site)
+        page_ids = backend.search(q, language, site)
+        return order_by_ids(self.get_query_set().public(), page_ids)
+
+    def _search_content(self, q, language=None, site=None):
+        """
+        Searches the titles and the search_fields of the plugins of the
+        public pages for q, without the search index.
         """
         from cms.plugin_pool import plugin_pool
 
         qs = self.get_query_set()
         qs = qs.public()
 
-        if current_site_only:
-            site = Site.objects.get_current()
+        if site:
             qs = qs.filter(site=site)
 
         qt = Q(title_set__title__icontains=q)
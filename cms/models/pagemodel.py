@@ -6,6 +6,8 @@ from django.utils.timezone import now
 from os.path import join
 from cms import constants
 from cms.constants import PUBLISHER_STATE_DEFAULT, PUBLISHER_STATE_PENDING, PUBLISHER_STATE_DIRTY, TEMPLATE_INHERITANCE_MAGIC
+from cms.cache.invalidation import invalidate_menus
+from cms.cache.page_urls import get_page_url_cache, set_page_url_cache
 from cms.exceptions import PublicIsUnmodifiable
 from cms.models.managers import PageManager, PagePermissionsPermissionManager
 from cms.models.metaclasses import PageMetaClass
@@ -25,9 +27,14 @@ from django.db import models
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils.translation import get_language, ugettext_lazy as _
-from menus.menu_pool import menu_pool
 from mptt.models import MPTTModel
 
+# what the menus show of a public page and of its titles
+MENU_PAGE_FIELDS = ('parent_id', 'in_navigation', 'login_required', 'limit_visibility_in_menu', 'soft_root',
+                    'reverse_id', 'navigation_extenders', 'application_urls', 'publication_date',
+                    'publication_end_date')
+MENU_TITLE_FIELDS = ('title', 'menu_title', 'path', 'redirect', 'published')
+
 
 @python_2_unicode_compatible
 class Page(with_metaclass(PageMetaClass, MPTTModel)):
@@ -61,6 +68,9 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
     template = models.CharField(_("template"), max_length=100, choices=template_choices,
                                 help_text=_('The template used to render the content.'),
                                 default=TEMPLATE_INHERITANCE_MAGIC)
+    # The template of the closest ancestor not inheriting its template, kept up
+    # to date on save so that get_template never needs to query the ancestors.
+    resolved_template = models.CharField(max_length=100, editable=False, blank=True, default='')
     site = models.ForeignKey(Site, help_text=_('The site the page is accessible at.'), verbose_name=_("site"),
                              related_name='djangocms_pages')
 
@@ -125,8 +135,18 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
     def get_absolute_url(self, language=None, fallback=True):
         if self.is_home:
             return reverse('pages-root')
+        # use the page url index unless the titles are loaded already
+        use_index = (fallback and self.pk and not hasattr(self, 'title_cache')
+                     and language in (None, get_language()))
+        if use_index:
+            url = get_page_url_cache(self, get_language(), self.site_id)
+            if url:
+                return url
         path = self.get_path(language, fallback) or self.get_slug(language, fallback)
-        return reverse('pages-details-by-slug', kwargs={"slug": path})
+        url = reverse('pages-details-by-slug', kwargs={"slug": path})
+        if use_index:
+            set_page_url_cache(self, get_language(), self.site_id, url)
+        return url
 
     def move_page(self, target, position='first-child'):
         """
@@ -174,9 +194,11 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         """
         Copy all the titles to a new page (which must have a pk).
         :param target: The page where the new titles should be stored
+        :return: The titles of the target page
         """
         from .titlemodels import Title
 
+        copies = []
         old_titles = dict(target.title_set.filter(language=language).values_list('language', 'pk'))
         for title in self.title_set.filter(language=language):
             old_pk = title.pk
@@ -192,6 +214,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
             title.published = published
             title._publisher_keep_state = True
             title.save()
+            copies.append(title)
 
             old_title = Title.objects.get(pk=old_pk)
             old_title.publisher_public = title
@@ -203,6 +226,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
                 self.title_cache[language] = old_title
         if old_titles:
             Title.objects.filter(id__in=old_titles.values()).delete()
+        return copies
 
     def _copy_contents(self, target, language):
         """
@@ -226,6 +250,22 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
             if plugins:
                 copy_plugins_to(plugins, ph)
 
+    def _get_menu_state(self, language, titles=None):
+        """
+        Returns what the menus show of this public page in the given language,
+        None if it isn't saved yet. The titles of the page in the language are
+        read from the database unless given.
+        """
+        from .titlemodels import Title
+
+        if not self.pk:
+            return None
+        if titles is None:
+            titles = Title.objects.filter(page=self, language=language).values_list(*MENU_TITLE_FIELDS)
+        else:
+            titles = [tuple(getattr(title, name) for name in MENU_TITLE_FIELDS) for title in titles]
+        return tuple(getattr(self, name) for name in MENU_PAGE_FIELDS), tuple(titles)
+
     def _copy_attributes(self, target):
         """
         Copy all page data to the target. This excludes parent and other values
@@ -251,127 +291,14 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         Copy a page [ and all its descendants to a new location ]
         Doesn't checks for add page permissions anymore, this is done in PageAdmin.
 
-        Note: public_copy was added in order to enable the creation of a copy
-        for creating the public page during the publish operation as it sets the
-        publisher_is_draft=False.
+        Returns the copy of the page, see cms.utils.copy_pages.
 
         Note for issue #1166: when copying pages there is no need to check for
         conflicting URLs as pages are copied unpublished.
         """
+        from cms.utils.copy_pages import copy_page_tree
 
-        page_copy = None
-
-        pages = [self] + list(self.get_descendants().order_by('-rght'))
-
-        site_reverse_ids = Page.objects.filter(site=site, reverse_id__isnull=False).values_list('reverse_id', flat=True)
-
-        if target:
-            target.old_pk = -1
-            if position == "first-child":
-                tree = [target]
-            elif target.parent_id:
-                tree = [target.parent]
-            else:
-                tree = []
-        else:
-            tree = []
-        if tree:
-            tree[0].old_pk = tree[0].pk
-
-        first = True
-        # loop over all affected pages (self is included in descendants)
-        for page in pages:
-            titles = list(page.title_set.all())
-            # get all current placeholders (->plugins)
-            placeholders = list(page.placeholders.all())
-            origin_id = page.id
-            # create a copy of this page by setting pk = None (=new instance)
-            page.old_pk = page.pk
-            page.pk = None
-            page.level = None
-            page.rght = None
-            page.lft = None
-            page.tree_id = None
-            page.publisher_public_id = None
-            # only set reverse_id on standard copy
-            if page.reverse_id in site_reverse_ids:
-                page.reverse_id = None
-            if first:
-                first = False
-                if tree:
-                    page.parent = tree[0]
-                else:
-                    page.parent = None
-                page.insert_at(target, position)
-            else:
-                count = 1
-                found = False
-                for prnt in tree:
-                    if prnt.old_pk == page.parent_id:
-                        page.parent = prnt
-                        tree = tree[0:count]
-                        found = True
-                        break
-                    count += 1
-                if not found:
-                    page.parent = None
-            tree.append(page)
-            page.site = site
-
-            page.save()
-
-            # copy permissions if necessary
-            if get_cms_setting('PERMISSION') and copy_permissions:
-                from cms.models.permissionmodels import PagePermission
-
-                for permission in PagePermission.objects.filter(page__id=origin_id):
-                    permission.pk = None
-                    permission.page = page
-                    permission.save()
-
-            # copy titles of this page
-            draft_titles = {}
-            public_titles = []
-            for title in titles:
-                if title.publisher_is_draft:
-                    title.pk = None  # setting pk = None creates a new instance
-                    title.page = page
-                    if title.publisher_public_id:
-                        draft_titles[title.publisher_public_id] = title
-                        title.publisher_public = None
-                        # create slug-copy for standard copy
-                    title.published = False
-                    title.slug = page_utils.get_available_slug(title)
-                    title.save()
-                else:
-                    public_titles.append(title)
-            for title in public_titles:
-                draft_title = draft_titles[title.pk]
-                title.pk = None  # setting pk = None creates a new instance
-                title.page = page
-                title.slug = page_utils.get_available_slug(title)
-                title.publisher_public_id = draft_title.pk
-                title.save()
-                draft_title.publisher_public = title
-                draft_title.save()
-
-            # copy the placeholders (and plugins on those placeholders!)
-            for ph in placeholders:
-                plugins = ph.get_plugins_list()
-                try:
-                    ph = page.placeholders.get(slot=ph.slot)
-                except Placeholder.DoesNotExist:
-                    ph.pk = None  # make a new instance
-                    ph.save()
-                    page.placeholders.add(ph)
-                    # update the page copy
-                    page_copy = page
-                if plugins:
-                    copy_plugins_to(plugins, ph)
-
-        # invalidate the menu for this site
-        menu_pool.clear(site_id=site.pk)
-        return page_copy  # return the page_copy or None
+        return copy_page_tree(self, target, site, position, copy_permissions)
 
     def save(self, no_signals=False, commit=True, **kwargs):
         """
@@ -398,6 +325,9 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         if created:
             self.created_by = self.changed_by
 
+        old_resolved_template = self.resolved_template
+        self.resolved_template = self._resolve_template()
+
         if commit:
             if no_signals:  # ugly hack because of mptt
                 if DJANGO_1_5:
@@ -406,6 +336,49 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
                     self.save_base(**kwargs)
             else:
                 super(Page, self).save(**kwargs)
+            if not created and old_resolved_template != self.resolved_template:
+                self._update_descendants_template()
+
+    def _resolve_template(self):
+        """
+        Returns the template this page renders with according to its own and
+        its parent's template, or an empty string if neither defines one.
+        """
+        if self.template and self.template != constants.TEMPLATE_INHERITANCE_MAGIC:
+            return self.template
+        if not self.parent_id:
+            return ''
+        # don't trust a cached parent instance, it could be stale
+        try:
+            return Page.objects.filter(pk=self.parent_id).values_list('resolved_template', flat=True)[0]
+        except IndexError:
+            return ''
+
+    def _update_descendants_template(self):
+        """
+        Propagates the resolved template of this page to the descendants
+        inheriting it, using one UPDATE over the page's tree range.
+        """
+        if not self.pk:
+            return
+        # the tree fields of this instance are stale once other pages of the
+        # tree were created or moved
+        try:
+            tree_id, lft, rght = Page.objects.filter(pk=self.pk).values_list('tree_id', 'lft', 'rght')[0]
+        except IndexError:
+            return
+        if rght - lft <= 1:
+            return
+        descendants = Page.objects.filter(tree_id=tree_id, lft__gt=lft, rght__lt=rght)
+        inheriting = descendants.filter(template=constants.TEMPLATE_INHERITANCE_MAGIC)
+        # skip the subtrees of descendants defining their own template
+        boundary = 0
+        for lft, rght in descendants.exclude(
+                template=constants.TEMPLATE_INHERITANCE_MAGIC).order_by('lft').values_list('lft', 'rght'):
+            if lft > boundary:
+                inheriting = inheriting.exclude(lft__gt=lft, rght__lt=rght)
+                boundary = rght
+        inheriting.update(resolved_template=self.resolved_template)
 
     def save_base(self, *args, **kwargs):
         """Overridden save_base. If an instance is draft, and was changed, mark
@@ -480,6 +453,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
                 public_page = Page(created_by=self.created_by)
             if not self.publication_date:
                 self.publication_date = now()
+            menu_state = public_page._get_menu_state(language)
             self._copy_attributes(public_page)
             # we need to set relate this new public copy to its draft page (self)
             public_page.publisher_public = self
@@ -491,12 +465,16 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
             if not public_page.pk:
                 public_page.save()
                 # The target page now has a pk, so can be used as a target
-            self._copy_titles(public_page, language, published)
+            titles = self._copy_titles(public_page, language, published)
             self._copy_contents(public_page, language)
             #trigger home update
             public_page.save()
-            # invalidate the menu for this site
-            menu_pool.clear(site_id=self.site_id)
+            # tells the receivers of post_publish whether the menus changed,
+            # from the titles just copied
+            self._menu_changed = public_page._get_menu_state(language, titles) != menu_state
+            if self._menu_changed:
+                # invalidate the menu for this site
+                invalidate_menus(self.site_id)
 
             # taken from Publisher - copy_page needs to call self._publisher_save_public(copy) for mptt insertion
             # insert_at() was maybe calling _create_tree_space() method, in this
@@ -542,6 +520,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
                     public_title = Title.objects.get(page=page.publisher_public, language=language)
                     draft_title = Title.objects.get(page=page, language=language)
                     if not public_title.published:
+                        self._menu_changed = True
                         public_title._publisher_keep_state = True
                         public_title.published = True
                         public_title.publisher_state = PUBLISHER_STATE_DEFAULT
@@ -551,6 +530,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
                         draft_title._publisher_keep_state = True
                         draft_title.save()
             elif page.get_publisher_state(language) == PUBLISHER_STATE_PENDING:
+                self._menu_changed = True
                 page.publish(language)
             # fire signal after publishing is done
         import cms.signals as cms_signals
@@ -776,11 +756,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
             if self.template != constants.TEMPLATE_INHERITANCE_MAGIC:
                 template = self.template
             else:
-                try:
-                    template = self.get_ancestors(ascending=True).exclude(
-                        template=constants.TEMPLATE_INHERITANCE_MAGIC).values_list('template', flat=True)[0]
-                except IndexError:
-                    pass
+                template = self.resolved_template
         if not template:
             template = get_cms_setting('TEMPLATES')[0][0]
         self._template_cache = template
@@ -799,15 +775,23 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         return _("default")
 
     def has_view_permission(self, request):
-        from cms.models.permissionmodels import PagePermission, GlobalPagePermission
+        from cms.cache.permissions import get_view_restrictions
+        from cms.models.permissionmodels import GlobalPagePermission
+        from cms.utils.permissions import is_view_restricted
         from cms.utils.plugins import current_site
 
         if not self.publisher_is_draft:
+            if get_cms_setting('PUBLIC_FOR') == 'all' and not get_view_restrictions(self.site_id):
+                # the site has no view restrictions at all
+                return True
             return self.publisher_draft.has_view_permission(request)
             # does any restriction exist?
         # inherited and direct
-        is_restricted = PagePermission.objects.for_page(page=self).filter(can_view=True).exists()
+        is_restricted = is_view_restricted(self)
         if request.user.is_authenticated():
+            if not is_restricted and get_cms_setting('PUBLIC_FOR') == 'all':
+                # nothing to check
+                return True
             site = current_site(request)
             global_perms_q = Q(can_view=True) & Q(
                 Q(sites__in=[site]) | Q(sites__isnull=True)
@@ -3,10 +3,38 @@ from django.db.models import Q
 from django.contrib.sites.models import Site
 from cms.publisher.query import PublisherQuerySet
 from cms.exceptions import NoHomeFound
+from cms.utils.page import prefetch_titles
 from django.utils import timezone
 
 
 class PageQuerySet(PublisherQuerySet):
+    _title_prefetch = None
+
+    def _clone(self, *args, **kwargs):
+        clone = super(PageQuerySet, self)._clone(*args, **kwargs)
+        clone._title_prefetch = self._title_prefetch
+        return clone
+
+    def iterator(self):
+        if not self._title_prefetch:
+            for page in super(PageQuerySet, self).iterator():
+                yield page
+            return
+        languages, fallbacks = self._title_prefetch
+        pages = prefetch_titles(super(PageQuerySet, self).iterator(), languages, fallbacks)
+        for page in pages:
+            yield page
+
+    def with_titles(self, languages=None, fallbacks=True):
+        """
+        Fills the title cache of the returned pages with their titles in the
+        given languages (and fallback languages) using one additional query.
+        Defaults to the current language.
+        """
+        clone = self._clone()
+        clone._title_prefetch = (languages, fallbacks)
+        return clone
+
     def on_site(self, site=None):
         if not site:
             try:
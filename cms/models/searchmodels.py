@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from cms.models.pagemodel import Page
+from cms.utils.compat.dj import python_2_unicode_compatible
+from django.db import models
+
+
+@python_2_unicode_compatible
+class PageSearchTerm(models.Model):
+    """
+    A term of the content of a public page in a language, weighted by its
+    number of occurrences and where it occurs (see cms.utils.search).
+    """
+    page = models.ForeignKey(Page, related_name='search_terms')
+    language = models.CharField(max_length=15, db_index=True)
+    term = models.CharField(max_length=50, db_index=True)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        app_label = 'cms'
+        unique_together = (('page', 'language', 'term'),)
+
+    def __str__(self):
+        return self.term
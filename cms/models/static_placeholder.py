@@ -1,6 +1,8 @@
 import uuid
 from cms.utils.compat.dj import python_2_unicode_compatible
 from cms.utils.copy_plugins import copy_plugins_to
+from cms.utils.purge import purge_keys
+from cms.utils.surrogates import get_static_placeholder_key
 
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
@@ -60,6 +62,7 @@ class StaticPlaceholder(models.Model):
             copy_plugins_to(plugins, self.public)
             self.dirty = False
             self.save()
+            purge_keys([get_static_placeholder_key(self.code)])
             return True
         return False
 
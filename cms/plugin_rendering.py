@@ -6,6 +6,7 @@ from cms.utils.compat.type_checks import string_types
 from cms.utils.conf import get_cms_setting
 from cms.utils.django_load import iterload_objects
 from cms.utils.placeholder import get_placeholder_conf
+from cms.utils.surrogates import add_surrogate_keys, get_page_key
 from django.template import Template, Context
 from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
@@ -108,6 +109,9 @@ def render_placeholder(placeholder, context_to_copy, name_fallback="Placeholder"
         lang = get_language_from_request(request)
         save_language = lang
     plugins = [plugin for plugin in get_plugins(request, placeholder, template, lang=lang)]
+    if page:
+        # the content of page placeholders changes when the page is published
+        add_surrogate_keys(request, get_page_key(page))
 
     # Add extra context as defined in settings, but do not overwrite existing context variables,
     # since settings are general and database/template are specific
@@ -1,6 +1,7 @@
 from cms.plugin_base import CMSPluginBase
 from cms.utils.moderator import get_cmsplugin_queryset
 from cms.utils import get_language_from_request
+from cms.utils.surrogates import add_surrogate_keys, get_page_key
 from cms.plugin_pool import plugin_pool
 from django.utils.translation import ugettext_lazy as _
 from .models import InheritPagePlaceholder
@@ -39,6 +40,9 @@ class InheritPagePlaceholderPlugin(CMSPluginBase):
             from_page = from_page.get_draft_object()
         else:
             from_page = from_page.get_public_object()
+        if request is not None and from_page is not None:
+            # the response shows the content of from_page
+            add_surrogate_keys(request, get_page_key(from_page))
 
         plugins = get_cmsplugin_queryset(request).filter(
             placeholder__page=from_page,
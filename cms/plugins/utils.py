@@ -2,6 +2,8 @@ from collections import defaultdict
 import operator
 from itertools import groupby
 
+from django.db import transaction
+from django.db.models import ForeignKey
 from django.utils.translation import ugettext as _
 
 from cms.exceptions import PluginLimitReached
@@ -9,9 +11,13 @@ from cms.plugin_pool import plugin_pool
 from cms.utils import get_language_from_request, permissions
 from cms.utils.i18n import get_fallback_languages
 from cms.utils.moderator import get_cmsplugin_queryset
+from cms.utils.page import prefetch_titles
 from cms.utils.placeholder import get_placeholder_conf
 from cms.utils.compat.dj import force_unicode
 
+# the number of orphaned plugins deleted per transaction
+DELETE_CHUNK_SIZE = 500
+
 
 def get_plugins(request, placeholder, template, lang=None):
     if not placeholder:
@@ -145,9 +151,24 @@ def build_plugin_tree(plugin_list):
     return root
 
 
+def get_page_link_fields(model):
+    """
+    Returns the names of the foreign keys of the given plugin model pointing
+    to a page (eg: page_link on the link plugin).
+    """
+    from cms.models import Page
+
+    names = []
+    for field in model._meta.fields:
+        if isinstance(field, ForeignKey) and isinstance(field.rel.to, type) and issubclass(field.rel.to, Page):
+            names.append(field.name)
+    return names
+
+
 def downcast_plugins(queryset, placeholders=None, select_placeholder=False):
     plugin_types_map = defaultdict(list)
     plugin_lookup = {}
+    linked_pages = []
 
     # make a map of plugin types, needed later for downcasting
     for plugin in queryset:
@@ -156,13 +177,20 @@ def downcast_plugins(queryset, placeholders=None, select_placeholder=False):
         cls = plugin_pool.get_plugin(plugin_type)
         # get all the plugins of type cls.model
         plugin_qs = cls.model.objects.filter(pk__in=pks)
+        # fetch the linked pages together with the plugins
+        page_fields = get_page_link_fields(cls.model)
+        related = list(page_fields)
         if select_placeholder:
-            plugin_qs = plugin_qs.select_related('placeholder')
+            related.append('placeholder')
+        if related:
+            plugin_qs = plugin_qs.select_related(*related)
 
         # put them in a map so we can replace the base CMSPlugins with their
         # downcasted versions
         for instance in plugin_qs:
             plugin_lookup[instance.pk] = instance
+            for name in page_fields:
+                linked_pages.append(getattr(instance, name))
             # cache the placeholder
             if placeholders:
                 for pl in placeholders:
@@ -175,6 +203,8 @@ def downcast_plugins(queryset, placeholders=None, select_placeholder=False):
             plugin_list.append(plugin_lookup[p.pk])
         else:
             plugin_list.append(p)
+    # and the titles of the linked pages in one query
+    prefetch_titles(linked_pages)
     return plugin_list
 
 
@@ -217,3 +247,90 @@ def has_reached_plugin_limit(placeholder, plugin_type, language, template=None):
                     "This placeholder already has the maximum number (%(limit)s) of allowed %(plugin_name)s plugins.") \
                                          % {'limit': type_limit, 'plugin_name': plugin_name})
     return False
+
+
+def get_unsaved_plugins(plugin_type, model):
+    """
+    Returns the plugins of the given type without an instance of their plugin
+    model, found with an anti-join on the table of the model.
+    """
+    from cms.models import CMSPlugin
+
+    plugins = CMSPlugin.objects.filter(plugin_type=plugin_type)
+    if model is CMSPlugin:
+        # model-less plugins are their own instances
+        return plugins.none()
+    name = _get_parent_link_query_name(model)
+    if name is not None:
+        return plugins.filter(**{'%s__isnull' % name: True})
+    return plugins.exclude(pk__in=model._base_manager.values('pk'))
+
+
+def _get_parent_link_query_name(model):
+    """
+    Returns the name of the reverse relation from CMSPlugin to the given
+    plugin model, or None. The parent link of a model inheriting it through
+    an abstract model is named after the abstract one, the reverse relation
+    after the concrete model.
+    """
+    from cms.models import CMSPlugin
+    from django.db.models.fields import FieldDoesNotExist
+
+    link = model._meta.parents.get(CMSPlugin)
+    if link is None:
+        return None
+    for name in (link.related_query_name(), model.__name__.lower()):
+        try:
+            related = CMSPlugin._meta.get_field_by_name(name)[0]
+        except FieldDoesNotExist:
+            continue
+        if getattr(related, 'model', None) is model:
+            return name
+    return None
+
+
+def get_orphaned_plugins():
+    """
+    Returns (plugin_type, model, plugins) tuples for every plugin type in the
+    database, plugins being the queryset of its orphaned plugins: all of them
+    when the plugin isn't installed anymore (model is None), the ones without
+    an instance of their plugin model otherwise.
+    """
+    from cms.models import CMSPlugin
+
+    orphaned = []
+    plugin_types = CMSPlugin.objects.order_by('plugin_type').values_list('plugin_type', flat=True).distinct()
+    for plugin_type in plugin_types:
+        try:
+            model = plugin_pool.get_plugin(plugin_type).model
+        except KeyError:
+            orphaned.append((plugin_type, None, CMSPlugin.objects.filter(plugin_type=plugin_type)))
+        else:
+            orphaned.append((plugin_type, model, get_unsaved_plugins(plugin_type, model)))
+    return orphaned
+
+
+def delete_plugins(plugins, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    Deletes the plugins of a queryset with their descendants, chunk_size
+    plugins per transaction. The positions of the plugins left are fixed once
+    per placeholder and language in each chunk rather than after every plugin
+    deleted. Calls progress with the number of plugins deleted so far after
+    every chunk, and returns it.
+    """
+    from cms.models import CMSPlugin
+    from cms.signals import deferred_plugin_positions
+
+    deleted = 0
+    last = 0
+    while True:
+        ids = list(plugins.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.commit_on_success():
+            with deferred_plugin_positions():
+                CMSPlugin.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        last = ids[-1]
+        if progress:
+            progress(deleted)
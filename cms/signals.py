@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
+import threading
+
+from cms.constants import PUBLISHER_STATE_DIRTY
 from cms.exceptions import NoHomeFound
 from cms.utils.conf import get_cms_setting
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import signals
 from django.dispatch import Signal
 
-from cms.cache.permissions import clear_user_permission_cache, clear_permission_cache
+from cms.cache.invalidation import invalidate_menus, invalidate_permissions
+from cms.cache.page_urls import invalidate_page_urls
+from cms.cache.permissions import clear_user_permission_cache, clear_view_restrictions
 from cms.models import Page, Title, CMSPlugin, PagePermission, GlobalPagePermission, PageUser, PageUserGroup, PlaceholderReference, Placeholder
 from django.conf import settings
-from menus.menu_pool import menu_pool
+from cms.utils.page import rebuild_title_paths
+from cms.utils.purge import purge_keys
+from cms.utils.search import remove_page_index, update_page_index
+from cms.utils.surrogates import get_page_key, MENUS_KEY
 
 # fired after page location is changed - is moved from one node to other
 page_moved = Signal(providing_args=["instance"])
@@ -21,16 +30,59 @@ application_post_changed = Signal(providing_args=["instance"])
 post_publish = Signal(providing_args=["instance", "language"])
 post_unpublish = Signal(providing_args=["instance", "language"])
 
+# fired once after pages are created in bulk (cms.api.bulk_create_pages),
+# which sends no save signal for them
+pages_bulk_created = Signal(providing_args=["instances"])
+
+
+class PluginPositions(threading.local):
+    """
+    The placeholders and languages whose plugin positions have to be fixed
+    at the end of a deferred_plugin_positions block.
+    """
+    def __init__(self):
+        self.pending = set()
+        self.depth = 0
+
+
+plugin_positions = PluginPositions()
+
+
+@contextmanager
+def deferred_plugin_positions():
+    """
+    Fixes the plugin positions once per placeholder and language at the end
+    of the enclosed code instead of after every plugin deleted, eg when
+    deleting plugins in bulk.
+    """
+    plugin_positions.depth += 1
+    try:
+        yield
+    finally:
+        plugin_positions.depth -= 1
+        if not plugin_positions.depth:
+            pending, plugin_positions.pending = plugin_positions.pending, set()
+            for placeholder_id, language in pending:
+                fix_plugin_positions(placeholder_id, language)
+
+
+def fix_plugin_positions(placeholder_id, language):
+    """
+    Numbers the plugins of a placeholder in a language from 0, in the order
+    of their positions, updating only the plugins whose position changed.
+    """
+    plugins = CMSPlugin.objects.filter(language=language, placeholder=placeholder_id).order_by("position")
+    for last, (pk, position) in enumerate(plugins.values_list('pk', 'position')):
+        if position != last:
+            CMSPlugin.objects.filter(pk=pk).update(position=last)
+
 
 def update_plugin_positions(**kwargs):
     plugin = kwargs['instance']
-    plugins = CMSPlugin.objects.filter(language=plugin.language, placeholder=plugin.placeholder_id).order_by("position")
-    last = 0
-    for p in plugins:
-        if p.position != last:
-            p.position = last
-            p.save()
-        last += 1
+    if plugin_positions.depth:
+        plugin_positions.pending.add((plugin.placeholder_id, plugin.language))
+    else:
+        fix_plugin_positions(plugin.placeholder_id, plugin.language)
 
 
 signals.post_delete.connect(update_plugin_positions, sender=CMSPlugin, dispatch_uid="cms.plugin.update_position")
@@ -84,8 +136,10 @@ signals.post_delete.connect(update_home, sender=Page)
 def update_title_paths(instance, **kwargs):
     """Update child pages paths in case when page was moved.
     """
-    for title in instance.title_set.all():
-        title.save()
+    # the titles of the moved page were saved, which marked the draft ones
+    # as dirty
+    instance.title_set.filter(publisher_is_draft=True).update(publisher_state=PUBLISHER_STATE_DIRTY)
+    rebuild_descendant_paths(instance)
 
 
 page_moved.connect(update_title_paths, sender=Page, dispatch_uid="cms.title.update_path")
@@ -105,6 +159,18 @@ def update_title(title):
                 title.path = (u'%s/%s' % (parent_title.path, slug)).lstrip("/")
 
 
+def rebuild_descendant_paths(page):
+    """
+    Recomputes the title paths of the page and its descendants in one pass,
+    then does once what saving each title did: invalidate the url index and
+    the menus.
+    """
+    if not rebuild_title_paths(page):
+        return
+    invalidate_page_urls(page.site_id)
+    invalidate_menus(page.site_id)
+
+
 def pre_save_title(instance, raw, **kwargs):
     """Save old state to instance and setup path
     """
@@ -118,7 +184,7 @@ def pre_save_title(instance, raw, **kwargs):
         instance.page._publisher_keep_state = True
         instance.page.save(no_signals=True)
     if not instance.page.publisher_is_draft:
-        menu_pool.clear(instance.page.site_id)
+        invalidate_menus(instance.page.site_id)
     if instance.id and not hasattr(instance, "tmp_path"):
         instance.tmp_path = None
         try:
@@ -155,20 +221,11 @@ def post_save_title(instance, raw, created, **kwargs):
     application_changed = False
     prevent_descendants = hasattr(instance, 'tmp_prevent_descendant_update')
     if instance.path != getattr(instance, 'tmp_path', None) and not prevent_descendants:
-        descendant_titles = Title.objects.filter(
-            page__lft__gt=instance.page.lft,
-            page__rght__lt=instance.page.rght,
-            page__tree_id__exact=instance.page.tree_id,
-            language=instance.language,
-            has_url_overwrite=False, # TODO: what if child has no url overwrite?
-        ).order_by('page__tree_id', 'page__parent', 'page__lft')
-
-        for descendant_title in descendant_titles:
-            descendant_title.path = ''  # just reset path
-            descendant_title.tmp_prevent_descendant_update = True
-            descendant_title._publisher_keep_state = True
-            descendant_title.save()
-            # remove temporary attributes
+        if instance.page.rght - instance.page.lft > 1:
+            rebuild_title_paths(instance.page)
+        if not raw:
+            # the urls of the page and its descendants changed
+            invalidate_page_urls(instance.page.site_id)
     if hasattr(instance, 'tmp_path'):
         del instance.tmp_path
     if prevent_descendants:
@@ -178,6 +235,16 @@ def post_save_title(instance, raw, created, **kwargs):
 signals.post_save.connect(post_save_title, sender=Title, dispatch_uid="cms.title.postsave")
 
 
+def post_delete_title(instance, **kwargs):
+    try:
+        invalidate_page_urls(instance.page.site_id)
+    except Page.DoesNotExist:
+        pass
+
+
+signals.post_delete.connect(post_delete_title, sender=Title, dispatch_uid="cms.title.postdelete")
+
+
 def post_save_user(instance, raw, created, **kwargs):
     """Signal called when new user is created, required only when CMS_PERMISSION.
     Assigns creator of the user to PageUserInfo model, so we know who had created
@@ -246,12 +313,12 @@ def post_save_page_moderator(instance, raw, created, **kwargs):
 
 def post_save_page(instance, **kwargs):
     update_home(instance)
-    if instance.old_page is None or instance.old_page.parent_id != instance.parent_id or instance.is_home != instance.old_page.is_home:
-        for page in instance.get_descendants(include_self=True):
-            for title in page.title_set.all().select_related('page'):
-                update_title(title)
-                title._publisher_keep_state = True
-                title.save()
+    if instance.old_page and instance.old_page.reverse_id != instance.reverse_id:
+        invalidate_page_urls(instance.site_id)
+    # new pages have no titles yet
+    if instance.old_page and (instance.old_page.parent_id != instance.parent_id or
+                              instance.is_home != instance.old_page.is_home):
+        rebuild_descendant_paths(instance)
     if (instance.old_page is None and instance.application_urls) or (instance.old_page and (
             instance.old_page.application_urls != instance.application_urls or instance.old_page.application_namespace != instance.application_namespace)):
         if instance.publisher_public_id and instance.publisher_is_draft:
@@ -269,12 +336,16 @@ def update_placeholders(instance, **kwargs):
 
 
 def invalidate_menu_cache(instance, **kwargs):
-    menu_pool.clear(instance.site_id)
+    invalidate_menus(instance.site_id)
 
 
 def delete_placeholders(instance, **kwargs):
     instance.placeholders.all().delete()
 
+
+def delete_page_urls(instance, **kwargs):
+    invalidate_page_urls(instance.site_id)
+
 # tell moderator, there is something happening with this page
 signals.pre_save.connect(pre_save_page, sender=Page, dispatch_uid="cms.page.presave")
 signals.post_save.connect(post_save_page_moderator, sender=Page, dispatch_uid="cms.page.postsave")
@@ -283,6 +354,7 @@ signals.post_save.connect(update_placeholders, sender=Page)
 signals.pre_save.connect(invalidate_menu_cache, sender=Page)
 signals.pre_delete.connect(invalidate_menu_cache, sender=Page)
 signals.pre_delete.connect(delete_placeholders, sender=Page)
+signals.pre_delete.connect(delete_page_urls, sender=Page)
 signals.pre_delete.connect(pre_delete_title, sender=Title)
 
 
@@ -337,7 +409,7 @@ def pre_delete_pagepermission(instance, **kwargs):
 
 def pre_save_globalpagepermission(instance, raw, **kwargs):
     _clear_users_permissions(instance)
-    menu_pool.clear(all=True)
+    invalidate_menus()
 
 
 def pre_delete_globalpagepermission(instance, **kwargs):
@@ -345,7 +417,64 @@ def pre_delete_globalpagepermission(instance, **kwargs):
 
 
 def pre_save_delete_page(instance, **kwargs):
-    clear_permission_cache()
+    invalidate_permissions()
+
+
+def update_view_restrictions(instance, **kwargs):
+    """
+    Drops the view restrictions of the site of the given page or page
+    permission: the restricted tree ranges change when a permission is
+    changed and when pages are added, moved or deleted.
+    """
+    if isinstance(instance, PagePermission):
+        try:
+            instance = instance.page
+        except Page.DoesNotExist:
+            return
+        if instance is None:
+            return
+    clear_view_restrictions(instance.site_id)
+    old_page = getattr(instance, 'old_page', None)
+    if old_page and old_page.site_id != instance.site_id:
+        clear_view_restrictions(old_page.site_id)
+
+
+signals.post_save.connect(update_view_restrictions, sender=Page, dispatch_uid="cms.page.view_restrictions")
+signals.post_delete.connect(update_view_restrictions, sender=Page, dispatch_uid="cms.page.view_restrictions")
+page_moved.connect(update_view_restrictions, sender=Page, dispatch_uid="cms.page.view_restrictions")
+signals.post_save.connect(update_view_restrictions, sender=PagePermission,
+                          dispatch_uid="cms.pagepermission.view_restrictions")
+signals.post_delete.connect(update_view_restrictions, sender=PagePermission,
+                            dispatch_uid="cms.pagepermission.view_restrictions")
+
+
+def purge_page(instance, **kwargs):
+    keys = [get_page_key(instance)]
+    # a publish only changes the menus if what they show of the page changed
+    # (see Page.publish), unpublishing, moving and deleting always do
+    if kwargs.get('signal') is not post_publish or getattr(instance, '_menu_changed', True):
+        keys.append(MENUS_KEY)
+    if kwargs.get('signal') is page_moved:
+        # the urls of the descendants changed too
+        keys.extend(get_page_key(page) for page in instance.get_descendants())
+    purge_keys(keys)
+
+
+post_publish.connect(purge_page, sender=Page, dispatch_uid="cms.page.purge_publish")
+post_unpublish.connect(purge_page, sender=Page, dispatch_uid="cms.page.purge_unpublish")
+page_moved.connect(purge_page, sender=Page, dispatch_uid="cms.page.purge_move")
+signals.post_delete.connect(purge_page, sender=Page, dispatch_uid="cms.page.purge_delete")
+
+
+def update_search_index(instance, language, **kwargs):
+    if kwargs.get('signal') is post_unpublish:
+        remove_page_index(instance, language)
+    else:
+        update_page_index(instance, language)
+
+
+post_publish.connect(update_search_index, sender=Page, dispatch_uid="cms.page.search_publish")
+post_unpublish.connect(update_search_index, sender=Page, dispatch_uid="cms.page.search_unpublish")
 
 
 def post_revision(instances, **kwargs):
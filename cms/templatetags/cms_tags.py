@@ -8,6 +8,7 @@ from classytags.core import Options, Tag
 from classytags.helpers import InclusionTag, AsTag
 from classytags.parser import Parser
 from cms import __version__
+from cms.cache.page_urls import get_page_url_cache, set_page_url_cache
 from cms.exceptions import PlaceholderNotFound
 from cms.models import Page, Placeholder as PlaceholderModel, CMSPlugin, StaticPlaceholder
 from cms.plugin_pool import plugin_pool
@@ -19,6 +20,7 @@ from cms.utils.i18n import force_language
 from cms.utils.moderator import use_draft
 from cms.utils.page_resolver import get_page_queryset
 from cms.utils.placeholder import validate_placeholder_name, get_toolbar_plugin_struct
+from cms.utils.surrogates import add_surrogate_keys, get_page_key, MENUS_KEY
 from django import template
 from django.conf import settings
 from django.contrib.sites.models import Site
@@ -132,13 +134,21 @@ class PageUrl(InclusionTag):
             return {'content': ''}
         if lang is None:
             lang = get_language_from_request(request)
-        cache_key = _get_cache_key('page_url', page_lookup, lang, site_id) + '_type:absolute_url'
-        url = cache.get(cache_key)
+        if page_lookup is None:
+            page_lookup = request.current_page
+            if not page_lookup:
+                return {'content': ''}
+        # the urls of pages change with what the menus show of them (their
+        # paths), responses displaying them are purged with the menus
+        add_surrogate_keys(request, MENUS_KEY)
+        draft = use_draft(request)
+        url = get_page_url_cache(page_lookup, lang, site_id, draft)
         if not url:
             page = _get_page_by_untyped_arg(page_lookup, request, site_id)
             if page:
-                url = page.get_absolute_url(language=lang)
-                cache.set(cache_key, url, get_cms_setting('CACHE_DURATIONS')['content'])
+                with force_language(lang):
+                    url = page.get_absolute_url(language=lang)
+                set_page_url_cache(page_lookup, lang, site_id, url, draft)
         if url:
             return {'content': url}
         return {'content': ''}
@@ -480,6 +490,7 @@ def _show_placeholder_for_page(context, placeholder_name, page_lookup, lang=None
         cached_value = cache.get(cache_key)
         if isinstance(cached_value, dict): # new style
             _restore_sekizai(context, cached_value['sekizai'])
+            add_surrogate_keys(request, *cached_value.get('surrogate_keys', ()))
             return {'content': mark_safe(cached_value['content'])}
         elif isinstance(cached_value, string_types): # old style
             return {'content': mark_safe(cached_value)}
@@ -493,11 +504,15 @@ def _show_placeholder_for_page(context, placeholder_name, page_lookup, lang=None
         if settings.DEBUG:
             raise
         return {'content': ''}
+    # the response shows the content of the page
+    surrogate_keys = [get_page_key(page)]
+    add_surrogate_keys(request, *surrogate_keys)
     watcher = Watcher(context)
     content = render_placeholder(placeholder, context, placeholder_name)
     changes = watcher.get_changes()
     if cache_result:
-        cache.set(cache_key, {'content': content, 'sekizai': changes}, get_cms_setting('CACHE_DURATIONS')['content'])
+        cache.set(cache_key, {'content': content, 'sekizai': changes, 'surrogate_keys': surrogate_keys},
+                  get_cms_setting('CACHE_DURATIONS')['content'])
 
     if content:
         return {'content': mark_safe(content)}
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from cms.models import Page
 from cms.test_utils.util.context_managers import (UserLoginContext,
-    SettingsOverride)
+    SettingsOverride, BudgetContext)
 from django.conf import settings
 from django.contrib.auth.models import User, AnonymousUser, Permission
 from django.contrib.sites.models import Site
@@ -11,6 +11,7 @@ from django.template.context import Context
 from django.test import testcases
 from django.test.client import RequestFactory
 from django.utils.translation import activate
+from functools import wraps
 from menus.menu_pool import menu_pool
 from cms.utils.compat.urls import urljoin, unquote
 import sys
@@ -37,6 +38,25 @@ URL_CMS_TRANSLATION_DELETE = urljoin(URL_CMS_PAGE_CHANGE, "delete-translation/")
 URL_CMS_PAGE_HISTORY = urljoin(URL_CMS_PAGE_CHANGE, "history/%d/")
 URL_CMS_PLUGIN_HISTORY_EDIT = urljoin(URL_CMS_PAGE_HISTORY, "edit-plugin/")
 
+# Budgets of the core code paths, used by assertBudgetGrowth: how many more
+# queries, cache reads and writes and rendered templates a path may cost when
+# the content it involves grows from the small to the large size of
+# BUDGET_SIZES. Fixed costs don't count against them, a path whose cost grows
+# with the number of pages, titles or plugins (N+1 queries) exceeds them.
+BUDGETS = {
+    # anonymous render of a published page with a menu and plugins
+    'page_render': {'queries': 0, 'cache_gets': 0, 'cache_sets': 0},
+    # a cold menu build (show_menu on an empty menu cache)
+    'menu_build': {'queries': 0, 'cache_gets': 0, 'cache_sets': 0},
+    # publishing a page with plugins in a single language
+    'publish': {'queries': 0},
+    # moving a plugin to another placeholder through the admin
+    'plugin_move': {'queries': 0, 'templates': 0},
+}
+
+# the content sizes the budgets are measured at
+BUDGET_SIZES = (2, 10)
+
 
 class _Warning(object):
     def __init__(self, message, category, filename, lineno):
@@ -77,8 +97,23 @@ def _collectWarnings(observeWarning, f, *args, **kwargs):
     return result
 
 
+def budget(name=None, **limits):
+    """
+    Decorator for test methods: the whole test must stay within the given
+    limits, reported under name.
+    """
+    def decorator(func):
+        @wraps(func)
+        def _wrapped(self, *args, **kwargs):
+            with self.assertBudget(name, **limits):
+                return func(self, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
 class BaseCMSTestCase(object):
     counter = 1
+    budgets = BUDGETS
 
     def _fixture_setup(self):
         super(BaseCMSTestCase, self)._fixture_setup()
@@ -232,6 +267,54 @@ class BaseCMSTestCase(object):
             return
         raise self.failureException("ObjectDoesNotExist not raised for filter %s" % filter)
 
+    def assertBudget(self, name=None, func=None, *args, **kwargs):
+        """
+        Asserts that the code run within the context (or func, if given) stays
+        within the limits passed as keyword arguments (queries, cache_gets,
+        cache_sets, templates). The name is used in the failure message.
+        """
+        limits = {}
+        for key in ('queries', 'cache_gets', 'cache_sets', 'templates', 'using'):
+            if key in kwargs:
+                limits[key] = kwargs.pop(key)
+        context = BudgetContext(self, name, **limits)
+        if func is None:
+            return context
+        with context:
+            return func(*args, **kwargs)
+
+    def assertBudgetGrowth(self, name, setup, sizes=BUDGET_SIZES):
+        """
+        Asserts that the cost of a code path doesn't grow with the content
+        more than the named budget from `budgets` allows. setup is called with
+        each of the two content sizes, creates that much content and returns
+        the function running the path, which is measured.
+        """
+        counts = []
+        for size in sizes:
+            func = setup(size)
+            with BudgetContext() as context:
+                func()
+            counts.append(context.get_counts())
+        errors = []
+        for key, limit in sorted(self.budgets[name].items()):
+            small, large = counts[0][key], counts[1][key]
+            if large - small > limit:
+                errors.append("Budget %r exceeded: %s grew from %d to %d between sizes %d and %d, at most %d "
+                              "allowed" % (name, key, small, large, sizes[0], sizes[1], limit))
+        if errors:
+            self.fail('\n'.join(errors))
+        return counts
+
+    def assertMaxQueries(self, num, func=None, *args, **kwargs):
+        return self.assertBudget(None, func, queries=num, *args, **kwargs)
+
+    def assertMaxCacheCalls(self, gets=None, sets=None, func=None, *args, **kwargs):
+        return self.assertBudget(None, func, cache_gets=gets, cache_sets=sets, *args, **kwargs)
+
+    def assertMaxTemplates(self, num, func=None, *args, **kwargs):
+        return self.assertBudget(None, func, templates=num, *args, **kwargs)
+
     def copy_page(self, page, target_page):
         from cms.utils.page import get_available_slug
 
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from contextlib import contextmanager
 from django.conf import settings
+from django.core.cache import cache
 from django.core.signals import request_started
-from django.db import reset_queries
+from django.db import reset_queries, connections, DEFAULT_DB_ALIAS
+from django.test.signals import template_rendered
 from django.template import context
 from django.utils.translation import get_language, activate
 from shutil import rmtree as _rmtree
 from tempfile import template, mkdtemp
+from functools import wraps
 import sys
 from cms.utils.compat.string_io import StringIO
 
@@ -195,6 +198,208 @@ class _AssertNumQueriesContext(object):
         )
 
 
+class QueryCounter(object):
+    """
+    Records the SQL queries executed on a database connection within the
+    context.
+
+    Example:
+
+        with QueryCounter() as counter:
+            # do something
+        counter.count # number of queries executed
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+
+    def __enter__(self):
+        self.old_debug = settings.DEBUG
+        settings.DEBUG = True
+        self.starting_queries = len(self.connection.queries)
+        request_started.disconnect(reset_queries)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        settings.DEBUG = self.old_debug
+        request_started.connect(reset_queries)
+        self.queries = self.connection.queries[self.starting_queries:]
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+class CacheCallCounter(object):
+    """
+    Records the calls made to the default cache within the context. Bulk calls
+    (get_many, set_many, delete_many) count as a single round trip, the calls
+    a backend makes to its own methods aren't counted.
+
+    Example:
+
+        with CacheCallCounter() as counter:
+            # do something
+        counter.gets # number of cache reads
+        counter.sets # number of cache writes
+    """
+    READ_METHODS = ('get', 'get_many', 'has_key')
+    WRITE_METHODS = ('set', 'set_many', 'add', 'delete', 'delete_many', 'incr', 'decr')
+
+    def __init__(self, cache_backend=None):
+        self.cache = cache_backend or cache
+        self.calls = []
+        # the depth of the calls in progress, the backends implement some
+        # methods with others (eg get_many with get)
+        self.depth = 0
+
+    def __enter__(self):
+        self.patched = []
+        for method in self.READ_METHODS + self.WRITE_METHODS:
+            original = getattr(self.cache, method, None)
+            if original is None:
+                continue
+            setattr(self.cache, method, self._wrap(method, original))
+            self.patched.append(method)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for method in self.patched:
+            # remove the instance attribute, exposing the class method again
+            delattr(self.cache, method)
+
+    def _wrap(self, method, original):
+        @wraps(original)
+        def _wrapped(*args, **kwargs):
+            if not self.depth:
+                key = args[0] if args else kwargs.get('key', kwargs.get('keys'))
+                self.calls.append((method, key))
+            self.depth += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.depth -= 1
+        return _wrapped
+
+    @property
+    def gets(self):
+        return len([call for call in self.calls if call[0] in self.READ_METHODS])
+
+    @property
+    def sets(self):
+        return len([call for call in self.calls if call[0] in self.WRITE_METHODS])
+
+
+class TemplateRenderCounter(object):
+    """
+    Records the templates rendered within the context. Relies on the
+    template_rendered signal which is only sent in the test environment.
+    """
+    def __init__(self):
+        self.templates = []
+
+    def __enter__(self):
+        template_rendered.connect(self._on_render)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        template_rendered.disconnect(self._on_render)
+
+    def _on_render(self, sender, template, context, **kwargs):
+        self.templates.append(getattr(template, 'name', None) or '<unknown>')
+
+    @property
+    def count(self):
+        return len(self.templates)
+
+
+class BudgetContext(object):
+    """
+    Asserts upper bounds on the number of queries, cache reads, cache writes
+    and rendered templates within the context. Limits set to None are not
+    checked. Can also be used as a decorator.
+
+    Example:
+
+        with BudgetContext(queries=3, cache_sets=1):
+            # do something
+
+        @BudgetContext(name='menu_build', queries=7)
+        def build_menu():
+            # do something
+    """
+    def __init__(self, test_case=None, name=None, queries=None, cache_gets=None,
+                 cache_sets=None, templates=None, using=DEFAULT_DB_ALIAS):
+        self.test_case = test_case
+        self.name = name
+        self.limits = {
+            'queries': queries,
+            'cache_gets': cache_gets,
+            'cache_sets': cache_sets,
+            'templates': templates,
+        }
+        self.using = using
+
+    def __enter__(self):
+        self.query_counter = QueryCounter(self.using)
+        self.cache_counter = CacheCallCounter()
+        self.template_counter = TemplateRenderCounter()
+        self.query_counter.__enter__()
+        self.cache_counter.__enter__()
+        self.template_counter.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.template_counter.__exit__(exc_type, exc_value, traceback)
+        self.cache_counter.__exit__(exc_type, exc_value, traceback)
+        self.query_counter.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        errors = self.get_errors()
+        if errors:
+            if self.test_case is not None:
+                self.test_case.fail('\n\n'.join(errors))
+            raise AssertionError('\n\n'.join(errors))
+
+    def __call__(self, func):
+        @wraps(func)
+        def _wrapped(*args, **kwargs):
+            with self.__class__(self.test_case, self.name, using=self.using, **self.limits):
+                return func(*args, **kwargs)
+        return _wrapped
+
+    def get_counts(self):
+        return {
+            'queries': self.query_counter.count,
+            'cache_gets': self.cache_counter.gets,
+            'cache_sets': self.cache_counter.sets,
+            'templates': self.template_counter.count,
+        }
+
+    def get_errors(self):
+        prefix = "Budget %r exceeded: " % self.name if self.name else "Budget exceeded: "
+        errors = []
+        checks = (
+            ('queries', self.query_counter.count, 'queries executed',
+             [query['sql'] for query in self.query_counter.queries]),
+            ('cache_gets', self.cache_counter.gets, 'cache reads',
+             ['%s(%r)' % call for call in self.cache_counter.calls
+              if call[0] in CacheCallCounter.READ_METHODS]),
+            ('cache_sets', self.cache_counter.sets, 'cache writes',
+             ['%s(%r)' % call for call in self.cache_counter.calls
+              if call[0] in CacheCallCounter.WRITE_METHODS]),
+            ('templates', self.template_counter.count, 'templates rendered',
+             self.template_counter.templates),
+        )
+        for key, actual, label, details in checks:
+            limit = self.limits[key]
+            if limit is not None and actual > limit:
+                errors.append("%s%d %s, at most %d allowed:\n%s" % (
+                    prefix, actual, label, limit, '\n'.join(details)
+                ))
+        return errors
+
+
 @contextmanager
 def disable_logger(logger):
     old = logger.disabled
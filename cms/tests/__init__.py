@@ -4,6 +4,7 @@
 from cms.tests.admin import *
 from cms.tests.api import *
 from cms.tests.apphooks import *
+from cms.tests.budgets import *
 from cms.tests.docs import *
 from cms.tests.extensions import *
 from cms.tests.forms import *
@@ -15,6 +16,7 @@ from cms.tests.multilingual import *
 from cms.tests.navextender import *
 from cms.tests.nonroot import *
 from cms.tests.page import *
+from cms.tests.page_cache import *
 from cms.tests.permissions import *
 from cms.tests.permmod import *
 from cms.tests.placeholder import *
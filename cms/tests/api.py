@@ -1,7 +1,7 @@
 from __future__ import with_statement
 import sys
 
-from cms.api import _generate_valid_slug, create_page, _verify_plugin_type, assign_user_to_page
+from cms.api import _generate_valid_slug, create_page, _verify_plugin_type, assign_user_to_page, bulk_create_pages
 from cms.apphook_pool import apphook_pool
 from cms.models.pagemodel import Page
 from cms.plugin_base import CMSPluginBase
@@ -193,3 +193,36 @@ class PythonAPITests(TestCase):
         page = create_page(**page_attrs)
         self.assertTrue(page.get_title_obj_attribute('has_url_overwrite'))
         self.assertEqual(page.get_title_obj_attribute('path'), 'test/home')
+
+    def test_bulk_create_pages(self):
+        create_page('home', 'nav_playground.html', 'en', published=True)
+        about, contact = bulk_create_pages([
+            {
+                'template': 'nav_playground.html',
+                'titles': {'en': {'title': 'About'}, 'de': {'title': 'Ueber', 'slug': 'ueber'}},
+                'reverse_id': 'about',
+                'placeholders': {
+                    'body': [{'plugin_type': 'TextPlugin', 'language': 'en', 'data': {'body': 'about us'}}],
+                },
+                'children': [
+                    {'template': 'INHERIT', 'titles': {'en': {'title': 'Team'}}},
+                    {'template': 'INHERIT', 'titles': {'en': {'title': 'Team'}}},
+                ],
+            },
+            {'template': 'nav_playground.html', 'titles': {'en': {'title': 'Contact'}}},
+        ])
+        about = about.reload()
+        self.assertFalse(about.is_home)
+        self.assertEqual(about.get_path('en'), 'about')
+        self.assertEqual(about.get_path('de', fallback=False), 'ueber')
+        self.assertEqual([page.get_path('en') for page in about.get_children()], ['about/team', 'about/team-1'])
+        self.assertEqual(about.get_children()[0].get_template(), 'nav_playground.html')
+        self.assertEqual(contact.reload().get_path('en'), 'contact')
+        plugins = about.placeholders.get(slot='body').get_plugins()
+        self.assertEqual(len(plugins), 1)
+        self.assertEqual(plugins[0].get_plugin_instance()[0].body, 'about us')
+        self.assertEqual(set(about.placeholders.values_list('slot', flat=True)), set(['body', 'right-column']))
+        # the tree values are the ones mptt computes
+        tree = list(Page.objects.order_by('tree_id', 'lft').values_list('pk', 'lft', 'rght', 'level'))
+        Page._tree_manager.rebuild()
+        self.assertEqual(list(Page.objects.order_by('tree_id', 'lft').values_list('pk', 'lft', 'rght', 'level')), tree)
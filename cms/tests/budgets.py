@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from __future__ import with_statement
+from cms.api import create_page, add_plugin
+from cms.models import Page
+from cms.test_utils.testcases import (SettingsOverrideTestCase, budget,
+    URL_CMS_PLUGIN_MOVE)
+from cms.test_utils.util.context_managers import (BudgetContext,
+    CacheCallCounter, QueryCounter, TemplateRenderCounter)
+from django.core.cache import cache
+from django.template import Template
+from django.template.loader import render_to_string
+from menus.menu_pool import menu_pool
+
+
+class BudgetToolsTests(SettingsOverrideTestCase):
+
+    def test_query_counter(self):
+        with QueryCounter() as counter:
+            list(Page.objects.all())
+            list(Page.objects.all())
+        self.assertEqual(counter.count, 2)
+
+    def test_cache_call_counter(self):
+        with CacheCallCounter() as counter:
+            cache.get('cms-budget-test')
+            cache.get_many(['cms-budget-test', 'cms-budget-other'])
+            cache.set('cms-budget-test', 1)
+            cache.delete('cms-budget-test')
+        self.assertEqual(counter.gets, 2)
+        self.assertEqual(counter.sets, 2)
+        # the cache methods are restored on exit
+        self.assertFalse('get' in cache.__dict__)
+
+    def test_template_render_counter(self):
+        with TemplateRenderCounter() as counter:
+            render_to_string('cms/content.html', {'content': 'test'})
+        self.assertEqual(counter.templates, ['cms/content.html'])
+
+    def test_budget_within_limits(self):
+        with self.assertMaxQueries(1):
+            Page.objects.count()
+        self.assertMaxQueries(1, Page.objects.count)
+        with self.assertMaxCacheCalls(gets=1, sets=0):
+            cache.get('cms-budget-test')
+
+    def test_budget_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with BudgetContext(queries=1):
+                Page.objects.count()
+                Page.objects.count()
+        with self.assertRaises(AssertionError):
+            with self.assertMaxTemplates(0):
+                render_to_string('cms/content.html', {'content': 'test'})
+
+    def test_budget_decorator(self):
+        @BudgetContext(queries=0)
+        def no_queries():
+            return 42
+
+        @BudgetContext(name='test', queries=0)
+        def queries():
+            return Page.objects.count()
+
+        self.assertEqual(no_queries(), 42)
+        self.assertRaises(AssertionError, queries)
+
+    @budget(queries=0)
+    def test_budget_test_decorator(self):
+        self.assertEqual(menu_pool.get_menus_by_attribute('cms_enabled', 'missing'), [])
+
+
+class CorePathBudgetTests(SettingsOverrideTestCase):
+    """
+    Regression guards for the core code paths: their cost must not grow with
+    the amount of content more than their named budgets allow.
+    """
+    settings_overrides = {'CMS_PERMISSION': False}
+
+    def _create_pages(self, count, plugins=2):
+        home = create_page('home', 'nav_playground.html', 'en', published=True,
+                           in_navigation=True)
+        parent = home
+        pages = [home]
+        for index in range(count):
+            page = create_page('page %s' % index, 'nav_playground.html', 'en',
+                               parent=parent, published=True, in_navigation=True)
+            body = page.placeholders.get(slot='body')
+            for num in range(plugins):
+                add_plugin(body, 'TextPlugin', 'en', body='text %s' % num)
+            page.publish('en')
+            if index % 3 == 0:
+                parent = page
+            pages.append(page)
+        menu_pool.clear(all=True)
+        return pages
+
+    def test_menu_build_budget(self):
+        def setup(size):
+            self._create_pages(size)
+            context = self.get_context()
+            return lambda: Template("{% load menu_tags %}{% show_menu %}").render(context)
+
+        self.assertBudgetGrowth('menu_build', setup)
+
+    def test_page_render_budget(self):
+        def setup(size):
+            url = self._create_pages(size)[-1].get_public_object().get_absolute_url()
+            return lambda: self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.assertBudgetGrowth('page_render', setup)
+
+    def test_publish_budget(self):
+        def setup(size):
+            page = self._create_pages(3, plugins=size)[-1].reload()
+            add_plugin(page.placeholders.get(slot='body'), 'TextPlugin', 'en', body='new')
+            return lambda: page.publish('en')
+
+        self.assertBudgetGrowth('publish', setup)
+
+    def test_plugin_move_budget(self):
+        def setup(size):
+            page = self._create_pages(1, plugins=size)[-1].reload()
+            plugin = page.placeholders.get(slot='body').get_plugins('en')[0]
+            target = page.placeholders.get(slot='right-column')
+
+            def move():
+                response = self.client.post(URL_CMS_PLUGIN_MOVE, {
+                    'plugin_id': plugin.pk,
+                    'placeholder_id': target.pk,
+                    'plugin_parent': '',
+                })
+                self.assertEqual(response.status_code, 200)
+            return move
+
+        with self.login_user_context(self.get_superuser()):
+            self.assertBudgetGrowth('plugin_move', setup)
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
+import os
+import tempfile
 import uuid
 from django.contrib.sites.models import Site
 from django.core.management import CommandError
@@ -14,6 +16,8 @@ from cms.management.commands import cms
 from cms.management.commands.subcommands.list import plugin_report
 from cms.models.pluginmodel import CMSPlugin
 from cms.models.placeholdermodel import Placeholder
+from cms.plugins.utils import get_unsaved_plugins
+from cms.plugins.link.cms_plugins import LinkPlugin
 from djangocms_text_ckeditor.cms_plugins import TextPlugin
 from cms.utils.compat.string_io import StringIO
 
@@ -34,6 +38,52 @@ class ManagementTestCase(CMSTestCase):
             command.handle("list", "apphooks", interactive=False)
             self.assertEqual(out.getvalue(), "SampleApp\n")
 
+    def test_export_import_pages(self):
+        root = create_page('root', 'nav_playground.html', 'en')
+        child = create_page('child', 'nav_playground.html', 'en', parent=root)
+        add_plugin(child.placeholders.get(slot='body'), TextPlugin, 'en', body='hello')
+        target = create_page('target', 'nav_playground.html', 'en')
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self.addCleanup(lambda: os.path.exists(path + '.state') and os.remove(path + '.state'))
+
+        command = cms.Command()
+        command.stdout = StringIO()
+        command.handle('export', path, 'page=%s' % root.pk)
+        command.handle('import', path, 'parent=%s' % target.pk)
+        copy = target.reload().get_children()[0]
+        # without published pages the last root page created is the home
+        # page, whose path is empty
+        self.assertTrue(target.is_home)
+        self.assertEqual(copy.get_path('en'), 'root')
+        copy_child = copy.get_children()[0]
+        self.assertEqual(copy_child.get_path('en'), 'root/child')
+        plugin = copy_child.placeholders.get(slot='body').get_plugins()[0]
+        self.assertEqual(plugin.get_plugin_instance()[0].body, 'hello')
+
+        # the pages imported before are skipped
+        command.handle('import', path, 'parent=%s' % target.pk)
+        self.assertEqual(Page.objects.drafts().count(), 5)
+
+    def test_import_page_links_of_later_chunks(self):
+        root = create_page('root', 'nav_playground.html', 'en')
+        child = create_page('child', 'nav_playground.html', 'en', parent=root)
+        add_plugin(root.placeholders.get(slot='body'), LinkPlugin, 'en', name='child', page_link=child)
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self.addCleanup(lambda: os.path.exists(path + '.state') and os.remove(path + '.state'))
+
+        command = cms.Command()
+        command.stdout = StringIO()
+        command.handle('export', path, 'page=%s' % root.pk)
+        # the child is created in the second chunk
+        command.handle('import', path, 'chunk=1')
+        copy = Page.objects.drafts().exclude(pk=root.pk).get(title_set__title='root')
+        plugin = copy.placeholders.get(slot='body').get_plugins()[0].get_plugin_instance()[0]
+        self.assertEqual(plugin.page_link, copy.get_children()[0])
+
     def test_uninstall_apphooks_without_apphook(self):
         out = StringIO()
         command = cms.Command()
@@ -208,6 +258,38 @@ class ManagementTestCase(CMSTestCase):
                 len(text_plugins_report["unsaved_instances"]),
                 0)
 
+    def test_delete_orphaned_plugins_in_chunks(self):
+        placeholder = Placeholder.objects.create(slot="test")
+        first = add_plugin(placeholder, TextPlugin, "en", body="first")
+        bogus_plugin = CMSPlugin(placeholder=placeholder, language="en", plugin_type="BogusPlugin", position=1)
+        bogus_plugin.save()
+        instanceless_plugin = CMSPlugin(placeholder=placeholder, language="en", plugin_type="TextPlugin", position=2)
+        instanceless_plugin.save()
+        last = add_plugin(placeholder, TextPlugin, "en", body="last")
+        self.assertEqual(CMSPlugin.objects.get(pk=last.pk).position, 3)
+
+        out = StringIO()
+        command = cms.Command()
+        command.stdout = out
+        command.handle("delete_orphaned_plugins", "dry-run", interactive=False)
+        self.assertTrue("BogusPlugin: 1 uninstalled plugins" in out.getvalue())
+        self.assertTrue("TextPlugin: 1 plugins with unsaved instances" in out.getvalue())
+        self.assertEqual(CMSPlugin.objects.filter(placeholder=placeholder).count(), 4)
+
+        command.handle("delete_orphaned_plugins", "chunk=1", interactive=False)
+        self.assertEqual(
+            list(CMSPlugin.objects.filter(placeholder=placeholder).order_by('position').values_list('pk', 'position')),
+            [(first.pk, 0), (last.pk, 1)])
+
+    def test_unsaved_plugins_of_abstract_based_model(self):
+        # the Text model inherits CMSPlugin through AbstractText
+        placeholder = Placeholder.objects.create(slot="test")
+        add_plugin(placeholder, TextPlugin, "en", body="saved")
+        instanceless_plugin = CMSPlugin(placeholder=placeholder, language="en", plugin_type="TextPlugin", position=1)
+        instanceless_plugin.save()
+        self.assertEqual(list(get_unsaved_plugins("TextPlugin", TextPlugin.model).values_list('pk', flat=True)),
+                         [instanceless_plugin.pk])
+
     def test_uninstall_plugins_without_plugin(self):
         out = StringIO()
         command = cms.Command()
@@ -377,6 +459,25 @@ class PageFixtureManagementTestCase(NavextendersFixture, CMSTestCase):
         # we have an existing plugin in one placeholder, so we have one more
         self.assertEqual(CMSPlugin.objects.filter(language='de').count(), number_start_plugins+1)
 
+    def test_copy_filled_static_placeholder(self):
+        """
+        Static placeholders having plugins in the target language are skipped
+        too, unless the command is called with *force-copy*
+        """
+        # the static placeholders were copied to "de" by setUp
+        static_placeholder = StaticPlaceholder.objects.all()[0]
+        plugins = CMSPlugin.objects.filter(placeholder=static_placeholder.draft)
+        self.assertEqual(plugins.filter(language='de').count(), 1)
+
+        out = StringIO()
+        command = cms.Command()
+        command.stdout = out
+        command.handle("copy-lang", "en", "de")
+        self.assertEqual(plugins.filter(language='de').count(), 1)
+
+        command.handle("copy-lang", "en", "de", "force-copy")
+        self.assertEqual(plugins.filter(language='de').count(), 2)
+
     def test_copy_from_non_existing_lang(self):
         """
         If an existing title in the target language has plugins in a placeholder
@@ -445,3 +546,29 @@ class PageFixtureManagementTestCase(NavextendersFixture, CMSTestCase):
             command.handle("copy-lang", "it", "fr")
 
         self.assertEqual(str(command_error.exception), 'Both languages have to be present in settings.LANGUAGES and settings.CMS_LANGUAGES')
+
+    def test_copy_langs_in_chunks(self):
+        site = 1
+        number_start_plugins = CMSPlugin.objects.all().count()
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(path)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        out = StringIO()
+        command = cms.Command()
+        command.stdout = out
+        command.handle("copy-lang", "en", "de", "chunk=1", "state=%s" % path)
+        pages = Page.objects.on_site(site).drafts()
+        self.assertTrue("Copied %d/%d pages" % (pages.count(), pages.count()) in out.getvalue())
+        self.assertEqual(CMSPlugin.objects.filter(language='de').count(), number_start_plugins)
+        for page in pages:
+            self.assertEqual(page.get_path('de', fallback=False), page.get_path('en'))
+            for plugin in CMSPlugin.objects.filter(placeholder__page=page, language='de', parent__isnull=False):
+                self.assertEqual(plugin.parent.language, 'de')
+
+        # the pages copied before are skipped, even with force-copy
+        page_plugins = CMSPlugin.objects.filter(language='de', placeholder__page__isnull=False)
+        number_page_plugins = page_plugins.count()
+        command.handle("copy-lang", "en", "de", "force-copy", "state=%s" % path)
+        self.assertEqual(page_plugins.count(), number_page_plugins)
@@ -4,6 +4,7 @@ import copy
 from cms.test_utils.util.fuzzy_int import FuzzyInt
 from django.db import connection
 from cms.api import create_page
+from cms.cache.invalidation import deferred_invalidation, invalidate_menus
 from cms.menu import CMSMenu, get_visible_pages
 from cms.models import Page
 from cms.models.permissionmodels import GlobalPagePermission, PagePermission
@@ -20,9 +21,11 @@ from django.contrib.auth.models import AnonymousUser, User, Permission, Group
 from django.contrib.sites.models import Site
 from django.template import Template, TemplateSyntaxError
 from django.utils.translation import activate
-from menus.base import NavigationNode
+from menus.base import NavigationNode, Modifier, POST_CUT
 from menus.menu_pool import menu_pool, _build_nodes_inner_for_one_menu
 from menus.models import CacheKey
+from menus.modifiers import Marker
+from menus.templatetags.menu_tags import flatten
 from menus.utils import mark_descendants, find_selected, cut_levels
 
 
@@ -175,6 +178,115 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
         self.assertEqual(nodes[1].sibling, True)
         self.assertEqual(nodes[1].selected, False)
 
+    def test_show_menu_fragment_cache(self):
+        tpl = Template("{% load menu_tags %}{% show_menu %}")
+        with SettingsOverride(CMS_MENU_FRAGMENT_CACHE=True):
+            context = self.get_context()
+            output = tpl.render(context)
+            self.assertTrue('children' in context)
+            # the cached output is used, the nodes are not loaded again
+            context = self.get_context()
+            build_nodes = menu_pool._build_nodes
+            menu_pool._build_nodes = None
+            try:
+                self.assertEqual(tpl.render(context), output)
+            finally:
+                menu_pool._build_nodes = build_nodes
+            self.assertFalse('children' in context)
+            # another selected node renders another menu
+            context = self.get_context(self.get_page(4).get_absolute_url())
+            self.assertNotEqual(tpl.render(context), output)
+            self.assertTrue('children' in context)
+            # clearing the menus invalidates the output
+            menu_pool.clear(settings.SITE_ID)
+            context = self.get_context()
+            self.assertEqual(tpl.render(context), output)
+            self.assertTrue('children' in context)
+        context = self.get_context()
+        tpl.render(context)
+        self.assertTrue('children' in context)
+
+    def test_get_nodes_request_memo(self):
+        request = self.get_request()
+        calls = []
+        build_nodes = menu_pool._build_nodes
+
+        def _build_nodes(request, site_id):
+            calls.append(site_id)
+            return build_nodes(request, site_id)
+
+        menu_pool._build_nodes = _build_nodes
+        try:
+            nodes = menu_pool.get_nodes(request)
+            # changes to the returned nodes do not leak into the memo
+            nodes[0].children = []
+            nodes[0].selected = False
+            other_nodes = menu_pool.get_nodes(request)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual([node.id for node in other_nodes], [node.id for node in nodes])
+            self.assertTrue(other_nodes[0].selected)
+            self.assertTrue(other_nodes[0].children)
+            self.assertTrue(other_nodes[0].children[0].parent is other_nodes[0])
+            menu_pool.get_nodes(request, breadcrumb=True)
+            self.assertEqual(len(calls), 2)
+            menu_pool.get_nodes(self.get_request())
+            self.assertEqual(len(calls), 3)
+        finally:
+            del menu_pool._build_nodes
+
+    def test_draft_menu_cache(self):
+        create_page("draft only", "nav_playground.html", "en", parent=self.get_page(1).publisher_draft)
+        menu_pool.get_nodes(self.get_request())
+        public_keys = list(CacheKey.objects.values_list('key', flat=True))
+        superuser = self.get_superuser()
+        with self.login_user_context(superuser):
+            # entering edit mode does not clear the cached menus
+            self.client.get(self.get_pages_root() + '?edit')
+            self.assertTrue(set(public_keys) <= set(CacheKey.objects.values_list('key', flat=True)))
+            request = self.get_request()
+            request.user = superuser
+            request.session = {'cms_edit': True}
+            draft_titles = [node.title for node in flatten(menu_pool.get_nodes(request))]
+            request = self.get_request()
+            request.user = superuser
+            request.session = {'cms_edit': False}
+            public_titles = [node.title for node in flatten(menu_pool.get_nodes(request))]
+        self.assertTrue("draft only" in draft_titles)
+        self.assertFalse("draft only" in public_titles)
+        self.assertEqual(CacheKey.objects.filter(key__endswith='_draft').count(), 1)
+
+    def test_deferred_invalidation(self):
+        menu_pool.get_nodes(self.get_request())
+        generation = menu_pool.get_generation()
+        with deferred_invalidation():
+            page = self.get_page(1).publisher_draft
+            page.reverse_id = 'deferred'
+            page.save()
+            page.publish('en')
+            invalidate_menus()
+            # nothing is cleared until the end of the block
+            self.assertEqual(CacheKey.objects.count(), 1)
+        self.assertEqual(CacheKey.objects.count(), 0)
+        # the invalidations were coalesced into one clear of the menus
+        self.assertEqual(menu_pool.get_generation(), generation + 1)
+        menu_pool.get_nodes(self.get_request())
+        with deferred_invalidation():
+            invalidate_menus(settings.SITE_ID)
+            # reading the menus applies the pending invalidations first
+            menu_pool.get_generation()
+            self.assertEqual(CacheKey.objects.count(), 0)
+
+    def test_site_generations(self):
+        generation = menu_pool.get_generation(1)
+        menu_pool.clear(site_id=2)
+        # the menus of other sites don't outdate the ones of the site
+        self.assertEqual(menu_pool.get_generation(1), generation)
+        menu_pool.clear(site_id=1)
+        self.assertNotEqual(menu_pool.get_generation(1), generation)
+        generation = menu_pool.get_generation(1)
+        menu_pool.clear(all=True)
+        self.assertNotEqual(menu_pool.get_generation(1), generation)
+
     def test_show_menu_num_queries(self):
         context = self.get_context()
         # test standard show_menu
@@ -365,6 +477,37 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
         self.assertEqual(isinstance(nodes[0], NavigationNode), True)
         self.assertEqual(nodes[1].get_absolute_url(), page2.get_absolute_url())
 
+    def test_breadcrumb_nodes(self):
+        page3 = self.get_page(3)
+        request = self.get_request(page3.get_absolute_url())
+        nodes = CMSMenu().get_breadcrumb_nodes(request)
+        self.assertEqual([node.id for node in nodes], [self.get_page(1).pk, self.get_page(2).pk, page3.pk])
+        nodes = menu_pool.get_breadcrumb_nodes(request)
+        self.assertEqual([node.selected for node in nodes], [False, False, True])
+        # urls not of a page use the nodes of all menus
+        request = self.get_request(page3.get_absolute_url() + 'other/')
+        self.assertEqual(CMSMenu().get_breadcrumb_nodes(request), None)
+
+    def test_breadcrumb_nodes_home_cut(self):
+        page1 = self.get_page(1)
+        page1.in_navigation = False
+        page1.save()
+        page3 = self.get_page(3)
+        request = self.get_request(page3.get_absolute_url())
+        # the same home page as the full menu, cut from its children
+        parents = dict((node.id, node.parent_id) for node in CMSMenu().get_nodes(request))
+        nodes = CMSMenu().get_breadcrumb_nodes(request)
+        self.assertEqual([node.parent_id for node in nodes], [parents[node.id] for node in nodes])
+
+    def test_breadcrumb_nodes_after_menu(self):
+        page3 = self.get_page(3)
+        request = self.get_request(page3.get_absolute_url())
+        menu_pool.get_nodes(request)
+        # the nodes of the menu rendered before are reused
+        with self.assertNumQueries(0):
+            nodes = menu_pool.get_breadcrumb_nodes(request)
+        self.assertEqual([node.id for node in nodes if node.selected], [page3.pk])
+
     def test_language_chooser(self):
         # test simple language chooser with default args
         lang_settings = copy.deepcopy(get_cms_setting('LANGUAGES'))
@@ -538,12 +681,30 @@ class MenuTests(BaseMenuTest):
 
     def test_build_nodes_inner_for_circular_menu(self):
         '''
-        TODO: 
-            To properly handle this test we need to have a circular dependency 
-            detection system.
-            Go nuts implementing it :)
+            Tests a menu tree with a parent cycle
+            
+            node5
+             node4
+            
+            node1 -> node2 -> node3 -> node1
+                      node6
         '''
-        pass
+        node1 = NavigationNode('Test1', '/test1/', 1, 3)
+        node2 = NavigationNode('Test2', '/test2/', 2, 1)
+        node3 = NavigationNode('Test3', '/test3/', 3, 2)
+        node4 = NavigationNode('Test4', '/test4/', 4, 5)
+        node5 = NavigationNode('Test5', '/test5/', 5, None)
+        node6 = NavigationNode('Test6', '/test6/', 6, 2)
+
+        menu_class_name = 'Test'
+        nodes = [node1, node2, node3, node4, node5, node6]
+
+        final_list = _build_nodes_inner_for_one_menu(nodes, menu_class_name)
+        self.assertEqual(final_list, [node5, node4])
+        self.assertEqual(node5.children, [node4])
+        for node in (node1, node2, node3, node6):
+            self.assertEqual(node.parent, None)
+            self.assertEqual(node.children, [])
 
     def test_build_nodes_inner_for_broken_menu(self):
         '''
@@ -597,6 +758,68 @@ class MenuTests(BaseMenuTest):
         selected = find_selected([])
         self.assertEqual(selected, None)
 
+    def test_mark_selected(self):
+        nodes = [
+            NavigationNode('root', '/', 1),
+            NavigationNode('a', '/a/', 2, 1),
+            NavigationNode('a-dup', '/a/', 3, 1),
+            NavigationNode('ab', '/a/b/', 4, 2),
+            NavigationNode('ext', '/a/b/c', 5, 4),
+        ]
+        for path, selected in (('/a/b/x/', 'ab'), ('/a/', 'a'), ('/a/b/cd/', 'ext'), ('/z/', 'root')):
+            menu_pool._mark_selected(self.get_request(path), nodes)
+            self.assertEqual([node.title for node in nodes if node.selected], [selected])
+        tree = _build_nodes_inner_for_one_menu(nodes[:1], "test")
+        menu_pool._mark_selected(self.get_request('/a/'), tree)
+        self.assertTrue(tree[0].selected)
+        tree = _build_nodes_inner_for_one_menu([NavigationNode('a', '/a/', 1)], "test")
+        menu_pool._mark_selected(self.get_request('/b/'), tree)
+        self.assertFalse(tree[0].selected)
+
+    def test_modifier_phases(self):
+        calls = []
+
+        class PostCutModifier(Modifier):
+            phases = (POST_CUT,)
+
+            def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
+                calls.append((self, post_cut))
+                return nodes
+
+        old_modifiers = menu_pool.modifiers
+        menu_pool.modifiers = [PostCutModifier]
+        try:
+            tree, nodes = self._get_nodes()
+            self.assertEqual(calls, [])
+            request = self.get_request('/')
+            menu_pool.apply_modifiers(tree, request, post_cut=True)
+            menu_pool.apply_modifiers(tree, request, post_cut=True)
+        finally:
+            menu_pool.modifiers = old_modifiers
+        self.assertEqual([post_cut for modifier, post_cut in calls], [True, True])
+        # modifier instances are reused
+        self.assertTrue(calls[0][0] is calls[1][0])
+
+    def test_modifier_changing_nodes_in_place(self):
+        class SelectThird(Modifier):
+            def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
+                for node in nodes:
+                    node.selected = node.id == 3
+                return nodes
+
+        old_modifiers = menu_pool.modifiers
+        menu_pool.modifiers = [SelectThird, Marker]
+        try:
+            tree, nodes = self._get_nodes('/1/')
+        finally:
+            menu_pool.modifiers = old_modifiers
+        node1, node2, node3, node4, node5 = nodes
+        self.assertTrue(node3.selected)
+        self.assertTrue(node4.sibling)
+        self.assertTrue(node2.ancestor)
+        self.assertTrue(node1.ancestor)
+        self.assertFalse(node5.sibling)
+
     def test_utils_cut_levels(self):
         tree_nodes, flat_nodes = self._get_nodes()
         self.assertEqual(cut_levels(tree_nodes, 1), [flat_nodes[1]])
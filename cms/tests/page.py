@@ -20,6 +20,7 @@ from cms.models import Page, Title
 from cms.models.placeholdermodel import Placeholder
 from cms.models.pluginmodel import CMSPlugin
 from cms.plugins.link.cms_plugins import LinkPlugin
+from cms.plugins.utils import downcast_plugins
 from djangocms_text_ckeditor.cms_plugins import TextPlugin
 from djangocms_text_ckeditor.models import Text
 from cms.sitemaps import CMSSitemap
@@ -28,7 +29,7 @@ from cms.test_utils.testcases import (CMSTestCase, URL_CMS_PAGE, URL_CMS_PAGE_AD
 from cms.test_utils.util.context_managers import (LanguageOverride, SettingsOverride, UserLoginContext)
 from cms.utils import get_cms_setting
 from cms.utils.page_resolver import get_page_from_request, is_valid_url
-from cms.utils.page import is_valid_page_slug, get_available_slug
+from cms.utils.page import is_valid_page_slug, get_available_slug, prefetch_titles, SlugAllocator
 
 
 class PageMigrationTestCase(CMSTestCase):
@@ -131,6 +132,18 @@ class PagesTestCase(CMSTestCase):
         new_slug = get_available_slug(page1.get_title_obj('en'), 'test-copy')
         self.assertTrue(new_slug, 'test-copy-11')
 
+    def test_slug_allocator(self):
+        parent = create_page('parent', 'nav_playground.html', 'en')
+        for slug in ('about', 'about-copy', 'about-copy-2'):
+            create_page(slug, 'nav_playground.html', 'en', slug=slug, parent=parent)
+        parent = self.reload_page(parent)
+        site = parent.site
+        with self.assertNumQueries(2):
+            allocator = SlugAllocator(parent, site)
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate('en', 'about')[0], 'about-copy-3')
+            self.assertEqual(allocator.allocate('en', 'contact')[0], 'contact')
+
     def test_slug_collisions_api_1(self):
         """ Checks for slug collisions on sibling pages - uses API to create pages
         """
@@ -335,6 +348,69 @@ class PagesTestCase(CMSTestCase):
 
         self.assertEqual(Page.objects.drafts().count() - count, 3)
 
+    def test_copy_page_tree(self):
+        create_page("home", "nav_playground.html", "en", published=True)
+        page_a = create_page("page_a", "nav_playground.html", "en")
+        page_a_a = create_page("page_a_a", "nav_playground.html", "en", parent=page_a)
+        create_page("page_a_a_a", "nav_playground.html", "en", parent=page_a_a)
+        create_page("page_a_b", "nav_playground.html", "en", parent=page_a)
+        add_plugin(page_a_a.placeholders.get(slot='body'), 'TextPlugin', 'en', body='copied')
+        page_b = create_page("page_b", "nav_playground.html", "en")
+        create_page("page_a", "nav_playground.html", "en", parent=page_b)
+        page_a = self.reload_page(page_a)
+
+        copy = page_a.copy_page(self.reload_page(page_b), page_a.site, 'last-child')
+
+        self.assertEqual(copy.parent_id, page_b.pk)
+        self.assertEqual(self.reload_page(page_b).get_descendants().count(), 5)
+        # the copy is one level deeper than its source
+        source_tree = [(page.level - page_a.level, page.get_title())
+                       for page in page_a.get_descendants(include_self=True)]
+        copy = self.reload_page(copy)
+        copy_tree = [(page.level - copy.level, page.get_title()) for page in copy.get_descendants(include_self=True)]
+        self.assertEqual(copy_tree, source_tree)
+        paths = Title.objects.filter(page__in=self.reload_page(copy).get_descendants(include_self=True)).values_list(
+            'path', flat=True)
+        self.assertEqual(sorted(paths), ['page_b/page_a-copy', 'page_b/page_a-copy/page_a_a',
+                                         'page_b/page_a-copy/page_a_a/page_a_a_a', 'page_b/page_a-copy/page_a_b'])
+        self.assertFalse(Title.objects.filter(page=copy, published=True).exists())
+        copy_a_a = Page.objects.get(title_set__path='page_b/page_a-copy/page_a_a')
+        self.assertEqual(copy_a_a.placeholders.count(), page_a_a.placeholders.count())
+        self.assertEqual(CMSPlugin.objects.filter(placeholder__page=copy_a_a).count(), 1)
+        # the source tree is untouched
+        self.assertEqual(self.reload_page(page_a).get_descendants().count(), 3)
+
+    def test_copy_page_tree_url_overwrite(self):
+        create_page("home", "nav_playground.html", "en", published=True)
+        page_a = create_page("page_a", "nav_playground.html", "en", overwrite_url="special/url")
+        create_page("child", "nav_playground.html", "en", parent=page_a)
+        page_b = create_page("page_b", "nav_playground.html", "en")
+
+        copy = self.reload_page(page_a).copy_page(self.reload_page(page_b), page_a.site, 'last-child')
+
+        # the copies don't take the overwritten url of their source
+        title = copy.get_title_obj('en')
+        self.assertFalse(title.has_url_overwrite)
+        paths = Title.objects.filter(page__in=self.reload_page(copy).get_descendants(include_self=True)).values_list(
+            'path', flat=True)
+        self.assertEqual(sorted(paths), ['page_b/page_a', 'page_b/page_a/child'])
+
+    def test_title_paths_after_move_and_slug_change(self):
+        create_page("home", "nav_playground.html", "en", published=True)
+        page_a = create_page("a", "nav_playground.html", "en")
+        child = create_page("child", "nav_playground.html", "en", parent=page_a)
+        grandchild = create_page("grandchild", "nav_playground.html", "en", parent=child)
+        page_b = create_page("b", "nav_playground.html", "en")
+
+        self.reload_page(page_a).move_page(self.reload_page(page_b))
+        paths = Title.objects.filter(page__in=[page_a, child, grandchild]).values_list('path', flat=True)
+        self.assertEqual(sorted(paths), ['b/a', 'b/a/child', 'b/a/child/grandchild'])
+
+        title = child.get_title_obj('en')
+        title.slug = 'kid'
+        title.save()
+        self.assertEqual(Title.objects.get(page=grandchild).path, 'b/a/kid/grandchild')
+
     def test_language_change(self):
         superuser = self.get_superuser()
         with self.login_user_context(superuser):
@@ -514,7 +590,8 @@ class PagesTestCase(CMSTestCase):
 
         # kill template cache
         delattr(grand_child, '_template_cache')
-        with self.assertNumQueries(1):
+        # the resolved template is stored on the page
+        with self.assertNumQueries(0):
             self.assertEqual(child.template, constants.TEMPLATE_INHERITANCE_MAGIC)
             self.assertEqual(parent.get_template_name(), grand_child.get_template_name())
 
@@ -527,6 +604,34 @@ class PagesTestCase(CMSTestCase):
         self.assertEqual(parent.template, constants.TEMPLATE_INHERITANCE_MAGIC)
         self.assertEqual(parent.get_template(), get_cms_setting('TEMPLATES')[0][0])
         self.assertEqual(parent.get_template_name(), get_cms_setting('TEMPLATES')[0][1])
+        grand_child = grand_child.reload()
+        self.assertEqual(grand_child.get_template(), get_cms_setting('TEMPLATES')[0][0])
+
+    def test_templates_propagation(self):
+        """
+        Changing or moving a page updates the template of the descendants
+        inheriting it, but not of those defining their own.
+        """
+        parent = create_page("parent", "nav_playground.html", "en")
+        child = create_page("child", constants.TEMPLATE_INHERITANCE_MAGIC, "en", parent=parent)
+        grand_child = create_page("grand child", constants.TEMPLATE_INHERITANCE_MAGIC, "en", parent=child)
+        own = create_page("own", "col_two.html", "en", parent=child)
+        own_child = create_page("own child", constants.TEMPLATE_INHERITANCE_MAGIC, "en", parent=own)
+        self.assertEqual(grand_child.get_template(), "nav_playground.html")
+        self.assertEqual(own_child.get_template(), "col_two.html")
+
+        parent.template = "col_three.html"
+        parent.save()
+        self.assertEqual(child.reload().get_template(), "col_three.html")
+        self.assertEqual(grand_child.reload().get_template(), "col_three.html")
+        self.assertEqual(own.reload().get_template(), "col_two.html")
+        self.assertEqual(own_child.reload().get_template(), "col_two.html")
+
+        other = create_page("other", "simple.html", "en")
+        child.reload().move_page(other)
+        self.assertEqual(child.reload().get_template(), "simple.html")
+        self.assertEqual(grand_child.reload().get_template(), "simple.html")
+        self.assertEqual(own_child.reload().get_template(), "col_two.html")
 
     def test_delete_with_plugins(self):
         """
@@ -820,6 +925,56 @@ class PagesTestCase(CMSTestCase):
                         self.assertIn('text-%d-%d' % (i, j), content)
                         self.assertIn('link-%d-%d' % (i, j), content)
 
+    def test_with_titles(self):
+        home = create_page('home', 'nav_playground.html', 'en')
+        for i in range(3):
+            create_page('page-%d' % i, 'nav_playground.html', 'en', parent=home)
+        with self.assertNumQueries(2):
+            pages = list(Page.objects.drafts().with_titles('en'))
+            self.assertEqual([page.get_title('en') for page in pages],
+                             ['home', 'page-0', 'page-1', 'page-2'])
+        # chaining keeps the prefetch
+        with self.assertNumQueries(2):
+            page = Page.objects.with_titles('en').filter(pk=home.pk).get()
+            self.assertEqual(page.get_slug('en'), 'home')
+
+    def test_prefetch_titles_fallbacks(self):
+        page = create_page('english', 'nav_playground.html', 'en')
+        api.create_title('de', 'deutsch', page)
+        pages = list(Page.objects.drafts())
+        with self.assertNumQueries(1):
+            prefetch_titles(pages, 'fr')
+        with self.assertNumQueries(0):
+            self.assertEqual(sorted(pages[0].title_cache.keys()), ['de', 'en'])
+            self.assertEqual(pages[0].get_title('fr'), 'english')
+        pages = list(Page.objects.drafts())
+        prefetch_titles(pages, 'fr', fallbacks=False)
+        self.assertEqual(pages[0].title_cache, {})
+
+    def test_prefetch_titles_fallbacks_of_each_site(self):
+        site3 = Site.objects.create(domain="sample3.com", name="sample3.com", pk=3)
+        english = create_page('english', 'nav_playground.html', 'en')
+        dutch = create_page('dutch', 'nav_playground.html', 'nl', site=site3)
+        pages = [Page.objects.get(pk=english.pk), Page.objects.get(pk=dutch.pk)]
+        with self.assertNumQueries(1):
+            prefetch_titles(pages, 'de')
+        self.assertEqual(list(pages[0].title_cache.keys()), ['en'])
+        self.assertEqual(list(pages[1].title_cache.keys()), ['nl'])
+
+    def test_plugin_page_link_titles(self):
+        target = create_page('target', 'nav_playground.html', 'en', published=True)
+        page = create_page('home', 'nav_playground.html', 'en', published=True)
+        placeholder = page.placeholders.get(slot='body')
+        for i in range(3):
+            add_plugin(placeholder, LinkPlugin, 'en', name='link-%d' % i, page_link=target)
+        with self.assertNumQueries(3):
+            # plugin types, link plugins with their pages, page titles
+            plugins = downcast_plugins(placeholder.get_plugins('en'))
+        for plugin in plugins:
+            self.assertIn('en', plugin.page_link.title_cache)
+        self.assertEqual([plugin.link() for plugin in plugins],
+                         [target.get_absolute_url()] * 3)
+
 
 class PageAdminTestBase(CMSTestCase):
     """
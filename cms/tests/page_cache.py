@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import with_statement
+from cms.api import create_page, add_plugin
+from cms.cache.page_cache import get_versions, purge_page_cache
+from cms.test_utils.testcases import SettingsOverrideTestCase
+from cms.test_utils.util.context_managers import QueryCounter
+from cms.utils.purge import BasePurgeBackend, purge_dispatcher
+from django.conf import settings
+from django.core.cache import cache
+from menus.menu_pool import menu_pool
+
+
+class PageCacheMiddlewareTests(SettingsOverrideTestCase):
+    settings_overrides = {
+        'MIDDLEWARE_CLASSES': list(settings.MIDDLEWARE_CLASSES) + ['cms.middleware.cache.PageCacheMiddleware'],
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.page = create_page('home', 'nav_playground.html', 'en', published=True)
+        self.body = self.page.placeholders.get(slot='body')
+        add_plugin(self.body, 'TextPlugin', 'en', body='first version')
+        self.page.publish('en')
+
+    def test_anonymous_hit(self):
+        response = self.client.get('/en/')
+        self.assertContains(response, 'first version')
+        with self.assertNumQueries(0):
+            response = self.client.get('/en/')
+        self.assertContains(response, 'first version')
+
+    def test_purge_on_publish(self):
+        self.client.get('/en/')
+        add_plugin(self.body, 'TextPlugin', 'en', body='second version')
+        self.page.publish('en')
+        self.assertContains(self.client.get('/en/'), 'second version')
+
+    def test_purge_on_menu_clear(self):
+        self.client.get('/en/')
+        generation = menu_pool.get_generation()
+        menu_pool.clear(all=True)
+        self.assertNotEqual(menu_pool.get_generation(), generation)
+        with QueryCounter() as counter:
+            self.client.get('/en/')
+        self.assertTrue(counter.count > 0)
+
+    def test_not_cached(self):
+        self.client.get('/en/')
+        # query strings and authenticated users are never served from the cache
+        with QueryCounter() as counter:
+            self.client.get('/en/?page=2')
+        self.assertTrue(counter.count > 0)
+        with self.login_user_context(self.get_superuser()):
+            with QueryCounter() as counter:
+                self.client.get('/en/')
+            self.assertTrue(counter.count > 0)
+
+    def test_versions(self):
+        versions = get_versions(['page-1', 'static-footer'])
+        self.assertEqual(get_versions(['page-1', 'static-footer']), versions)
+        purge_page_cache(['page-1'])
+        new_versions = get_versions(['page-1', 'static-footer'])
+        self.assertNotEqual(new_versions['page-1'], versions['page-1'])
+        self.assertEqual(new_versions['static-footer'], versions['static-footer'])
+
+
+class RecordingPurgeBackend(BasePurgeBackend):
+    purged = []
+
+    def purge(self, keys):
+        self.purged.append(keys)
+
+
+class SurrogateKeyTests(SettingsOverrideTestCase):
+    settings_overrides = {
+        'MIDDLEWARE_CLASSES': list(settings.MIDDLEWARE_CLASSES) + ['cms.middleware.surrogates.SurrogateKeyMiddleware'],
+        'CMS_PURGE_BACKENDS': ['cms.tests.page_cache.RecordingPurgeBackend'],
+    }
+
+    def setUp(self):
+        self.page = create_page('home', 'nav_playground.html', 'en', published=True)
+        self.body = self.page.placeholders.get(slot='body')
+        add_plugin(self.body, 'TextPlugin', 'en', body='text')
+        self.page.publish('en')
+        # only the purges of the tests
+        RecordingPurgeBackend.purged = []
+
+    def test_headers(self):
+        response = self.client.get('/en/')
+        keys = response['Surrogate-Key'].split()
+        for key in ('page-%s' % self.page.pk, 'menus'):
+            self.assertIn(key, keys)
+        # only the keys which are purged
+        self.assertFalse([key for key in keys if key.startswith(('placeholder-', 'plugin-'))])
+        self.assertEqual(response['Cache-Tag'], ','.join(keys))
+
+    def test_purge_on_publish(self):
+        # the content changed, not the menus
+        self.page.publish('en')
+        self.assertEqual(RecordingPurgeBackend.purged, [['page-%s' % self.page.pk]])
+
+        title = self.page.title_set.get(language='en')
+        title.menu_title = 'start'
+        title.save()
+        RecordingPurgeBackend.purged = []
+        self.page.publish('en')
+        self.assertEqual(RecordingPurgeBackend.purged, [['menus', 'page-%s' % self.page.pk]])
+
+    def test_batching(self):
+        purge_dispatcher.deferred = True
+        try:
+            purge_dispatcher.purge(['page-2', 'page-1'])
+            purge_dispatcher.purge(['page-1'])
+            self.assertEqual(RecordingPurgeBackend.purged, [])
+        finally:
+            purge_dispatcher.deferred = False
+        purge_dispatcher.flush()
+        self.assertEqual(RecordingPurgeBackend.purged, [['page-1', 'page-2']])
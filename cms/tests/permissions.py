@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
+from __future__ import with_statement
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.sites.models import Site
-from cms.models import Page
+from cms.models import Page, PagePermission, ACCESS_CHOICES
 from cms.api import create_page, assign_user_to_page
 from cms.cache.permissions import (get_permission_cache, set_permission_cache,
                                    clear_user_permission_cache)
 from cms.test_utils.testcases import SettingsOverrideTestCase
+from cms.utils.permissions import is_view_restricted
 
 
 class PermissionCacheTests(SettingsOverrideTestCase):
@@ -66,3 +69,31 @@ class PermissionCacheTests(SettingsOverrideTestCase):
         self.home_page.save()
         cached_permissions = get_permission_cache(self.user_normal, "can_change")
         self.assertIsNone(cached_permissions)
+
+    def test_view_restrictions(self):
+        """
+        Test the cached view restrictions match the page permissions
+        """
+        child = create_page("child", "nav_playground.html", "en",
+                            created_by=self.user_super, parent=self.home_page)
+        grand_child = create_page("grand child", "nav_playground.html", "en",
+                                  created_by=self.user_super, parent=child)
+        create_page("great grand child", "nav_playground.html", "en",
+                    created_by=self.user_super, parent=grand_child)
+        request = self.get_request()
+        request.user = AnonymousUser()
+        child = child.reload()
+        with self.assertNumQueries(1):
+            self.assertTrue(child.has_view_permission(request))
+        with self.assertNumQueries(0):
+            self.assertTrue(child.has_view_permission(request))
+
+        for grant_on, name in ACCESS_CHOICES:
+            permission = assign_user_to_page(child, self.user_normal,
+                                             grant_on=grant_on, can_view=True)
+            for page in Page.objects.drafts():
+                restricted = PagePermission.objects.for_page(page).filter(can_view=True).exists()
+                self.assertEqual(is_view_restricted(page), restricted)
+                self.assertEqual(page.has_view_permission(request), not restricted)
+            permission.delete()
+        self.assertTrue(grand_child.reload().has_view_permission(request))
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
 from cms.api import create_page, publish_page, add_plugin, create_page_user, assign_user_to_page
+from cms.cache.permissions import clear_view_restrictions
 from cms.constants import PUBLISHER_STATE_PENDING
 from cms.management.commands.subcommands.moderator import log
 from cms.models import Page, CMSPlugin, Title
@@ -832,7 +833,15 @@ class ViewPermissionTests(PermissionTestsBase):
         page = Page()
         page.pk = 1
         fake_mptt_attrs(page)
+        clear_view_restrictions(page.site_id)
         with self.assertNumQueries(1):
+            """
+            The query is:
+            The view restrictions of the site, cached
+            """
+            page.has_view_permission(request)
+        # the cached view restrictions replace the PagePermission query
+        with self.assertNumQueries(0):
             page.has_view_permission(request)
 
     def test_public_for_all(self):
@@ -856,14 +865,18 @@ class ViewPermissionTests(PermissionTestsBase):
         page.level = 0
         page.tree_id = 1
         fake_mptt_attrs(page)
-        with self.assertNumQueries(3):
+        clear_view_restrictions(page.site_id)
+        with self.assertNumQueries(1):
             """
-            The queries are:
-            The current Site
-            PagePermission query for affected pages
-            GlobalpagePermission query for user
+            The query is:
+            The view restrictions of the site, cached. Without any, the
+            current Site and the GlobalpagePermission of the user aren't
+            needed.
             """
             page.has_view_permission(request)
+        # the cached view restrictions replace the PagePermission query
+        with self.assertNumQueries(0):
+            page.has_view_permission(request)
 
     def test_unauthed(self):
         request = self.get_request()
@@ -883,12 +896,16 @@ class ViewPermissionTests(PermissionTestsBase):
         page.level = 0
         page.tree_id = 1
         fake_mptt_attrs(page)
+        clear_view_restrictions(page.site_id)
         with self.assertNumQueries(1):
             """
             The query is:
-            PagePermission query for affected pages
+            The view restrictions of the site (instead of the PagePermission
+            query for affected pages), cached
             """
             page.has_view_permission(request)
+        with self.assertNumQueries(0):
+            page.has_view_permission(request)
 
     def test_authed_basic_perm(self):
         with SettingsOverride(CMS_PUBLIC_FOR='staff'):
@@ -915,11 +932,13 @@ class ViewPermissionTests(PermissionTestsBase):
             page.level = 0
             page.tree_id = 1
             fake_mptt_attrs(page)
+            clear_view_restrictions(page.site_id)
             with self.assertNumQueries(5):
                 """
                 The queries are:
+                The view restrictions of the site (instead of the
+                PagePermission query for affected pages), cached
                 The site
-                PagePermission query for affected pages
                 GlobalpagePermission query for user
                 Generic django permission lookup
                 content type lookup by permission lookup
@@ -956,7 +975,15 @@ class ViewPermissionTests(PermissionTestsBase):
         page.level = 0
         page.tree_id = 1
         fake_mptt_attrs(page)
+        clear_view_restrictions(page.site_id)
         with self.assertNumQueries(1):
+            """
+            The query is:
+            The view restrictions of the site (instead of the PagePermission
+            query for affected pages), cached
+            """
+            page.has_view_permission(request)
+        with self.assertNumQueries(0):
             page.has_view_permission(request)
 
     def test_page_permissions(self):
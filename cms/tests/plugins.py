@@ -7,7 +7,7 @@ from cms import api
 from cms.api import create_page, publish_page, add_plugin
 from cms.constants import PLUGIN_MOVE_ACTION, PLUGIN_COPY_ACTION
 from cms.exceptions import PluginAlreadyRegistered, PluginNotRegistered
-from cms.models import Page, Placeholder
+from cms.models import Page, PageSearchTerm, Placeholder
 from cms.models.pluginmodel import CMSPlugin, PluginModelBase
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
@@ -29,6 +29,7 @@ from cms.test_utils.testcases import CMSTestCase, URL_CMS_PAGE, URL_CMS_PLUGIN_M
 from cms.sitemaps.cms_sitemap import CMSSitemap
 from cms.test_utils.util.context_managers import SettingsOverride
 from cms.utils.copy_plugins import copy_plugins_to
+from cms.utils.search import DatabaseSearchBackend
 from django import http
 from django.utils import timezone
 from django.conf import settings
@@ -718,6 +719,29 @@ class PluginsTestCase(PluginsTestBaseCase):
         self.assertEqual(pages.count(), 0)
         self.assertEqual(Page.objects.search("hello").count(),1)
 
+    def test_search_pages_ranking(self):
+        page1 = create_page("hello world", "nav_playground.html", "en", published=True)
+        page2 = create_page("page", "nav_playground.html", "en")
+        add_plugin(page2.placeholders.get(slot='body'), "TextPlugin", "en", body="<p>Hello there</p>")
+        page2.publish('en')
+        page1 = Page.objects.get(pk=page1.pk)
+        page2 = Page.objects.get(pk=page2.pk)
+        self.assertEqual([page.pk for page in Page.objects.search("hello")],
+                         [page1.publisher_public_id, page2.publisher_public_id])
+        self.assertEqual([page.pk for page in Page.objects.search("hello wor")], [page1.publisher_public_id])
+        self.assertEqual(Page.objects.search("<p>").count(), 0)
+        self.assertEqual(Page.objects.search("hello", language="de").count(), 0)
+        page1.unpublish('en')
+        self.assertEqual([page.pk for page in Page.objects.search("hello")], [page2.publisher_public_id])
+
+    def test_search_pages_without_index(self):
+        page = create_page("hello world", "nav_playground.html", "en", published=True)
+        PageSearchTerm.objects.all().delete()
+        DatabaseSearchBackend._indexed = False
+        # the pages published before the index existed are still found
+        self.assertEqual([found.pk for found in Page.objects.search("ello")],
+                         [Page.objects.get(pk=page.pk).publisher_public_id])
+
     def test_empty_plugin_is_not_ignored(self):
         page = create_page("page", "nav_playground.html", "en")
 
@@ -2,6 +2,7 @@
 from __future__ import with_statement
 from cms import plugin_rendering
 from cms.api import create_page, add_plugin
+from cms.cache.page_urls import get_page_urls
 from cms.models.placeholdermodel import Placeholder
 from cms.models.pluginmodel import CMSPlugin
 from cms.plugin_rendering import render_plugins, PluginContext, render_placeholder_toolbar
@@ -274,6 +275,27 @@ class RenderingTestCase(SettingsOverrideTestCase):
         output = self.render(template, self.test_page, {'test_page': self.test_page2})
         self.assertEqual(output, self.test_page2.get_absolute_url())
 
+    def test_page_url_slug_change(self):
+        template = u'{%% load cms_tags %%}{%% page_url "%s" %%}' % self.test_page2.reverse_id
+        self.assertEqual(self.render(template, self.test_page), self.test_page2.get_absolute_url())
+        draft = self.test_page2.publisher_draft
+        title = draft.get_title_obj('en')
+        title.slug = 'renamed'
+        title.save()
+        draft.publish('en')
+        output = self.render(template, self.test_page)
+        self.assertEqual(output, self.reload(self.test_page2).get_absolute_url())
+        self.assertTrue(output.endswith('/renamed/'))
+
+    def test_get_page_urls(self):
+        pages = [self.test_page, self.test_page2, self.test_page3]
+        get_page_urls(pages, 'en')
+        pages = [self.reload(page) for page in pages]
+        with self.assertNumQueries(0):
+            with self.assertMaxCacheCalls(gets=1, sets=0):
+                urls = get_page_urls(pages, 'en')
+        self.assertEqual(urls, dict((page.pk, page.get_absolute_url('en')) for page in pages))
+
     def test_page_attribute(self):
         """
         Tests the {% page_attribute %} templatetag, using current page, lookup by pk/dict/reverse_id and passing a Page object.
@@ -16,7 +16,7 @@ from cms.test_utils.util.context_managers import SettingsOverride
 from django.contrib.auth.models import AnonymousUser, User, Permission
 from django.test import TestCase
 from django.test.client import RequestFactory
-from django.utils.functional import lazy
+from django.utils.functional import lazy, SimpleLazyObject
 from django.core.urlresolvers import reverse
 from cms.test_utils.project.placeholderapp.models import (Example1, MultilingualExample1)
 from cms.test_utils.project.placeholderapp.views import detail_view, detail_view_multi
@@ -90,6 +90,19 @@ class ToolbarTests(ToolbarTestBase):
         items = toolbar.get_left_items() + toolbar.get_right_items()
         self.assertEqual(len(items), 0)
 
+    def test_user_of_other_authentication_middleware(self):
+        staff = self.get_staff()
+        request = RequestFactory().get('/')
+        request.session = {}
+        # eg set from a token by a middleware, on a request without session
+        # cookie
+        request.user = SimpleLazyObject(lambda: staff)
+        request.LANGUAGE_CODE = 'en'
+        request.current_page = None
+        ToolbarMiddleware().process_request(request)
+        self.assertEqual(request.user.pk, staff.pk)
+        self.assertTrue(request.toolbar.is_staff)
+
     def test_no_page_staff(self):
         request = self.get_page_request(None, self.get_staff(), '/')
         toolbar = CMSToolbar(request)
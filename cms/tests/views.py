@@ -2,8 +2,9 @@ from __future__ import with_statement
 import sys
 import re
 
+from django.conf import settings
 from django.contrib.auth.models import Permission
-from cms.api import create_page
+from cms.api import create_page, add_plugin
 from cms.apphook_pool import apphook_pool
 from cms.models import PagePermission
 from cms.test_utils.testcases import SettingsOverrideTestCase
@@ -151,3 +152,52 @@ class ViewTests(SettingsOverrideTestCase):
         PagePermission.objects.create(can_change=True, user=user, page=page)
         response = self.client.get("/en/?edit")
         self.assertContains(response, "cms_toolbar-item_switch", 4, 200)
+
+    def test_anonymous_request_without_session(self):
+        create_page("page", "nav_playground.html", "en", published=True)
+        response = self.client.get("/en/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse('Cookie' in response.get('Vary', ''))
+        self.assertFalse(settings.SESSION_COOKIE_NAME in response.cookies)
+        # the edit mode of anonymous users is stored in the session
+        response = self.client.get("/en/?edit")
+        self.assertTrue('Cookie' in response.get('Vary', ''))
+
+
+class ConditionalGetTests(SettingsOverrideTestCase):
+    urls = 'cms.test_utils.project.urls'
+
+    settings_overrides = {'CMS_CONDITIONAL_GET': {'enabled': True}}
+
+    def setUp(self):
+        clear_url_caches()
+        self.page = create_page("page", "nav_playground.html", "en", published=True)
+
+    def test_not_modified(self):
+        response = self.client.get('/en/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response = self.client.get('/en/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get('/en/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_by_publish(self):
+        etag = self.client.get('/en/')['ETag']
+        add_plugin(self.page.placeholders.get(slot='body'), 'TextPlugin', 'en', body='new')
+        self.page.publish('en')
+        response = self.client.get('/en/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rules(self):
+        with SettingsOverride(CMS_CONDITIONAL_GET={'enabled': False}):
+            self.assertFalse(self.client.get('/en/').has_header('ETag'))
+        superuser = self.get_superuser()
+        with self.login_user_context(superuser):
+            self.assertFalse(self.client.get('/en/').has_header('ETag'))
+            with SettingsOverride(CMS_CONDITIONAL_GET={'enabled': True, 'authenticated': True,
+                                                       'toolbar': True}):
+                self.assertTrue(self.client.get('/en/').has_header('ETag'))
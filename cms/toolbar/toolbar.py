@@ -3,7 +3,7 @@ from cms.constants import LEFT
 from cms.models import UserSettings, Placeholder
 from cms.toolbar.items import Menu, ToolbarAPIMixin, ButtonList
 from cms.toolbar_pool import toolbar_pool
-from cms.utils import get_language_from_request
+from cms.utils import get_language_from_request, is_anonymous_request
 from cms.utils.i18n import force_language
 
 from django.contrib.auth.forms import AuthenticationForm
@@ -38,11 +38,17 @@ class CMSToolbar(ToolbarAPIMixin):
         self.menus = {}
         self.request = request
         self.login_form = CMSToolbarLoginForm(request=request)
-        self.is_staff = self.request.user.is_staff
-        self.edit_mode = self.is_staff and self.request.session.get('cms_edit', False)
-        self.build_mode = self.is_staff and self.request.session.get('cms_build', False)
+        if is_anonymous_request(request):
+            # no toolbar, and no need to load the session
+            session = {}
+            self.is_staff = False
+        else:
+            session = self.request.session
+            self.is_staff = self.request.user.is_staff
+        self.edit_mode = self.is_staff and session.get('cms_edit', False)
+        self.build_mode = self.is_staff and session.get('cms_build', False)
         self.use_draft = self.is_staff and self.edit_mode or self.build_mode
-        self.show_toolbar = self.is_staff or self.request.session.get('cms_edit', False)
+        self.show_toolbar = self.is_staff or session.get('cms_edit', False)
         if settings.USE_I18N:
             self.language = get_language_from_request(request)
         else:
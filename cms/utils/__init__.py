@@ -65,6 +65,29 @@ def get_language_from_request(request, current_page=None):
 
     return language
 
+
+# the query parameters switching the toolbar modes, they store the mode in the
+# session
+TOOLBAR_MODE_PARAMETERS = ('edit', 'edit_off', 'build')
+
+
+def is_anonymous_request(request):
+    """
+    Returns True for requests of anonymous users without a session cookie,
+    which can't be in edit or build mode, so that their toolbar modes aren't
+    read from the session.
+
+    The session of such a request is empty: ToolbarMiddleware keeps it from
+    adding ``Vary: Cookie`` to the response when nothing was stored in it.
+    """
+    if settings.SESSION_COOKIE_NAME in getattr(request, 'COOKIES', {}):
+        return False
+    if any(parameter in getattr(request, 'GET', {}) for parameter in TOOLBAR_MODE_PARAMETERS):
+        return False
+    user = getattr(request, 'user', None)
+    return user is None or not user.is_authenticated()
+
+
 default_storage = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 
 
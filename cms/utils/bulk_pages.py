@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Creation of page trees in bulk (see cms.api.bulk_create_pages).
+
+The tree positions, slugs, paths, placeholders and plugin trees of all the
+pages are computed in memory, then written with batched inserts in a single
+transaction. bulk_create doesn't return primary keys, so the ones of the rows
+referenced by other rows are reserved in the database beforehand and the rows
+are inserted with them. What the signals of every page and title save did is
+done once at the end.
+"""
+from collections import defaultdict
+import itertools
+
+from cms import constants
+from cms.cache.invalidation import deferred_invalidation, invalidate_menus, invalidate_permissions
+from cms.cache.page_urls import invalidate_page_urls
+from cms.cache.permissions import clear_view_restrictions
+from cms.utils.page import SlugAllocator
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.template.defaultfilters import slugify
+
+# the maximum number of rows inserted per query
+BULK_BATCH_SIZE = 500
+
+def _lock_and_get_max(model, column):
+    """
+    Locks the table of the model against concurrent writes until the end of
+    the transaction and returns the highest value of the column, as committed.
+
+    PostgreSQL takes a SHARE ROW EXCLUSIVE lock on the table, MySQL a locking
+    read of the highest row and SQLite the write lock of the database (with an
+    UPDATE changing nothing). Until the transaction commits, the rows saved
+    concurrently in the table wait (and on SQLite all writes); reads don't.
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    column = qn(column)
+    cursor = connection.cursor()
+    query = 'SELECT MAX(%s) FROM %s' % (column, table)
+    if connection.vendor == 'postgresql':
+        cursor.execute('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE' % table)
+    elif connection.vendor == 'mysql':
+        # a locking read: the inserts after the highest row wait for the end
+        # of the transaction and it reads the latest committed value
+        query += ' FOR UPDATE'
+    elif connection.vendor == 'sqlite':
+        # any write takes the lock of the whole database
+        cursor.execute('UPDATE %s SET %s = %s WHERE 1 = 0' % (table, column, column))
+    cursor.execute(query)
+    return cursor.fetchone()[0] or 0
+
+
+def reserve_ids(model, count):
+    """
+    Reserves count primary keys of the model in the database and returns an
+    iterator over them. Must be called in a transaction.
+
+    On PostgreSQL the keys are taken from the sequence of the table: they are
+    never handed out again, to the rows saved concurrently, to another bulk
+    insert or to a run resumed after a failure. On the other databases the
+    table is locked until the end of the transaction and the keys follow the
+    highest one, the auto increment counters move past them with the insert.
+    """
+    if not count:
+        return iter(())
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                       [model._meta.db_table, model._meta.pk.column, count])
+        return iter([row[0] for row in cursor.fetchall()])
+    return itertools.count(_lock_and_get_max(model, model._meta.pk.column) + 1)
+
+
+def reserve_tree_ids(model, count):
+    """
+    Reserves count tree ids of the (mptt) model and returns an iterator over
+    them. Must be called in a transaction: the table is locked until its end,
+    when the trees are committed (see _lock_and_get_max), so concurrent bulk
+    inserts reserve the tree ids following them.
+
+    The tree ids follow the highest one, like the ones mptt gives to new
+    trees. mptt reads the highest tree id without any lock: a root node saved
+    while the table gets locked can take one of the reserved tree ids, as it
+    can take the tree id of another root node saved at the same time.
+    """
+    if not count:
+        return iter(())
+    return itertools.count(_lock_and_get_max(model, 'tree_id') + 1)
+
+
+def bulk_insert(model, objs):
+    """
+    Inserts the given instances, primary keys included, in batches. Unlike
+    bulk_create it also inserts instances of models with a parent model
+    (plugins), in their own table only: the parent rows must exist.
+    """
+    if not objs:
+        return
+    using = router.db_for_write(model)
+    fields = model._meta.local_fields
+    ops = connections[using].ops
+    batch_size = BULK_BATCH_SIZE
+    if hasattr(ops, 'bulk_batch_size'):
+        batch_size = max(1, min(batch_size, ops.bulk_batch_size(fields, objs)))
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields, using=using)
+
+
+def create_tree_space(model, size, target, tree_id):
+    """
+    Shifts the nodes of the (mptt) model's tree after the target tree value
+    by size, like mptt does to insert a node: the space left after target
+    takes size / 2 nodes.
+    """
+    nodes = model._default_manager.filter(tree_id=tree_id)
+    nodes.filter(lft__gt=target).update(lft=F('lft') + size)
+    nodes.filter(rght__gt=target).update(rght=F('rght') + size)
+
+
+def reset_sequences(models):
+    """
+    Moves the sequences of the models' primary keys past the keys inserted
+    explicitly, on the databases whose keys aren't reserved from the sequence
+    (see reserve_ids).
+    """
+    for using, group in _group_by_database(models).items():
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            # the keys were taken from the sequences, resetting them to the
+            # highest committed key could hand them out again
+            continue
+        statements = connection.ops.sequence_reset_sql(no_style(), group)
+        if statements:
+            cursor = connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def _group_by_database(models):
+    groups = defaultdict(list)
+    for model in models:
+        groups[router.db_for_write(model)].append(model)
+    return groups
+
+
+def _count_nodes(nodes):
+    return sum(1 + _count_nodes(node['children']) for node in nodes)
+
+
+def _get_slug(allocator, language, data):
+    """
+    Returns the slug and path of a new title and reserves them for its
+    siblings. A given slug is used as is, like cms.api.create_page does, the
+    ones made from the title are numbered when they are taken.
+    """
+    if data.get('slug'):
+        slug = data['slug']
+        path = allocator.get_path(language, slug)
+    else:
+        base = slugify(data['title'])
+        suffixes = itertools.count(1)
+        slug, path = allocator.allocate(language, base, next_slug=lambda slug: '%s-%s' % (base, next(suffixes)))
+    allocator.reserve(language, slug, path)
+    return slug, path
+
+
+def create_page_tree(nodes, site, parent=None, created_by='python-api', user=None):
+    """
+    Creates the pages described by nodes (validated by
+    cms.api.bulk_create_pages) as the last children of parent, or as root
+    pages, on the given site. Returns all the created pages, in the order of
+    their descriptions (depth first), and the created plugins as pairs of
+    their description (as given to bulk_create_pages) and CMSPlugin.
+    """
+    from cms.models import CMSPlugin, Page, PageModeratorState, Placeholder, Title
+    from cms.signals import application_post_changed, pages_bulk_created, update_home
+    from cms.utils.plugins import get_placeholders
+
+    with deferred_invalidation():
+        with transaction.commit_on_success():
+            if parent is not None:
+                # fresh tree values, the given instance may be outdated
+                parent = Page.objects.get(pk=parent.pk)
+
+            # the pages in tree order, with their tree values
+            entries = []
+            page_ids = reserve_ids(Page, _count_nodes(nodes))
+
+            def add_pages(nodes, parent_page, tree_id, lft, level):
+                for node in nodes:
+                    page = Page(id=next(page_ids), site_id=site.pk, tree_id=tree_id, lft=lft, level=level,
+                                created_by=created_by, changed_by=created_by, languages=','.join(node['titles']),
+                                **node['page'])
+                    page.parent_id = parent_page.pk if parent_page else None
+                    if page.template and page.template != constants.TEMPLATE_INHERITANCE_MAGIC:
+                        page.resolved_template = page.template
+                    else:
+                        page.resolved_template = parent_page.resolved_template if parent_page else ''
+                    entries.append((page, node))
+                    page.rght = lft = add_pages(node['children'], page, tree_id, lft + 1, level + 1)
+                    lft += 1
+                return lft
+
+            if parent is None:
+                tree_ids = reserve_tree_ids(Page, len(nodes))
+                for node in nodes:
+                    add_pages([node], None, next(tree_ids), 1, 0)
+            else:
+                # the pages are inserted after the last child of the parent
+                lft = parent.rght
+                end = add_pages(nodes, parent, parent.tree_id, lft, parent.level + 1)
+                create_tree_space(Page, end - lft, lft - 1, parent.tree_id)
+            top_pages = [page for page, node in entries if page.parent_id == (parent.pk if parent else None)]
+            bulk_insert(Page, [page for page, node in entries])
+
+            # titles, the parents come first
+            parents = dict((page.pk, page) for page, node in entries)
+            paths = {}
+            allocators = {}
+            titles = []
+            top_allocator = SlugAllocator(parent, site, languages=set(
+                language for page in top_pages for language in page.languages.split(',')))
+            top_page_ids = set(page.pk for page in top_pages)
+            for page, node in entries:
+                if page.pk in top_page_ids:
+                    allocator = top_allocator
+                else:
+                    if page.parent_id not in allocators:
+                        allocators[page.parent_id] = SlugAllocator(
+                            parents[page.parent_id], parent_paths=paths[page.parent_id])
+                    allocator = allocators[page.parent_id]
+                paths[page.pk] = {}
+                for language, data in node['titles'].items():
+                    slug, path = _get_slug(allocator, language, data)
+                    title = Title(page_id=page.pk, language=language, title=data['title'],
+                                  slug=slug, path=path, menu_title=data.get('menu_title'),
+                                  page_title=data.get('page_title'), redirect=data.get('redirect'),
+                                  meta_description=data.get('meta_description'),
+                                  publisher_state=constants.PUBLISHER_STATE_DIRTY)
+                    if data.get('overwrite_url'):
+                        title.has_url_overwrite = True
+                        title.path = data['overwrite_url'].strip(' /')
+                    paths[page.pk][language] = title.path
+                    titles.append(title)
+            Title.objects.bulk_create(titles)
+
+            # placeholders: the ones of the template and the ones with plugins
+            placeholders = []
+            page_placeholders = []
+            plugins = []
+            created_plugins = []
+            plugin_instances = defaultdict(list)
+            template_slots = {}
+
+            def add_plugins(nodes, placeholder, parent_plugin, tree_id, lft, level):
+                for position, node in enumerate(nodes):
+                    plugin = CMSPlugin(id=next(plugin_ids), placeholder_id=placeholder.pk, language=node['language'],
+                                       plugin_type=node['plugin_type'], position=position,
+                                       tree_id=tree_id or next(plugin_tree_ids), lft=lft, level=level)
+                    plugin.parent_id = parent_plugin.pk if parent_plugin else None
+                    plugins.append(plugin)
+                    created_plugins.append((node['description'], plugin))
+                    end = add_plugins(node['children'], placeholder, plugin, plugin.tree_id, lft + 1, level + 1)
+                    plugin.rght = end
+                    if node['model'] is not CMSPlugin:
+                        instance = node['model'](**node['data'])
+                        setattr(instance, node['model']._meta.pk.attname, plugin.pk)
+                        plugin_instances[node['model']].append(instance)
+                    # the root plugins are trees of their own
+                    lft = end + 1 if parent_plugin else 1
+                return lft
+
+            page_slots = []
+            for page, node in entries:
+                template = page.get_template()
+                if template not in template_slots:
+                    template_slots[template] = get_placeholders(template)
+                slots = list(template_slots[template])
+                for slot in node['placeholders']:
+                    if slot not in slots:
+                        slots.append(slot)
+                page_slots.append((page, node, slots))
+            plugin_nodes = [plugin for page, node in entries for roots in node['placeholders'].values()
+                            for plugin in roots]
+            placeholder_ids = reserve_ids(Placeholder, sum(len(slots) for page, node, slots in page_slots))
+            plugin_ids = reserve_ids(CMSPlugin, _count_nodes(plugin_nodes))
+            plugin_tree_ids = reserve_tree_ids(CMSPlugin, len(plugin_nodes))
+            for page, node, slots in page_slots:
+                for slot in slots:
+                    placeholder = Placeholder(id=next(placeholder_ids), slot=slot)
+                    placeholders.append(placeholder)
+                    page_placeholders.append(Page.placeholders.through(page_id=page.pk, placeholder_id=placeholder.pk))
+                    add_plugins(node['placeholders'].get(slot, ()), placeholder, None, None, 1, 0)
+            bulk_insert(Placeholder, placeholders)
+            Page.placeholders.through.objects.bulk_create(page_placeholders)
+            bulk_insert(CMSPlugin, plugins)
+            for model, instances in plugin_instances.items():
+                bulk_insert(model, instances)
+
+            PageModeratorState.objects.bulk_create([
+                PageModeratorState(page_id=page.pk, user=user, action=PageModeratorState.ACTION_ADD)
+                for page, node in entries
+            ])
+            reset_sequences([Page, Placeholder, CMSPlugin])
+
+            pages = [page for page, node in entries]
+            for page in pages:
+                page._state.adding = False
+                page._state.db = router.db_for_write(Page)
+            # what the signals of every page and title save did
+            if parent is None:
+                update_home(top_pages[0])
+        invalidate_page_urls(site.pk)
+        clear_view_restrictions(site.pk)
+        invalidate_permissions()
+        invalidate_menus(site.pk)
+        apphooked = [page for page in pages if page.application_urls]
+        if apphooked:
+            application_post_changed.send(sender=Page, instance=apphooked[0])
+        pages_bulk_created.send(sender=Page, instances=pages)
+    return pages, created_plugins
@@ -52,6 +52,9 @@ DEFAULTS = {
     'UNIHANDECODE_DECODERS': ['ja', 'zh', 'kr', 'vn', 'diacritic'],
     'UNIHANDECODE_DEFAULT_DECODER': 'diacritic',
     'MAX_PAGE_PUBLISH_REVERSIONS': 25,
+    'PURGE_BACKENDS': ['cms.utils.purge.LoggingPurgeBackend'],
+    'MENU_FRAGMENT_CACHE': False,
+    'SEARCH_BACKEND': 'cms.utils.search.DatabaseSearchBackend',
 }
 
 
@@ -198,6 +201,26 @@ def get_languages():
     return _ensure_languages_settings(languages)
 
 
+def get_conditional_get():
+    conf = {
+        'enabled': False,
+        'toolbar': False,
+        'edit_mode': False,
+        'authenticated': False,
+    }
+    conf.update(getattr(settings, 'CMS_CONDITIONAL_GET', {}))
+    return conf
+
+
+def get_page_cache():
+    conf = {
+        'duration': 60 * 10,
+        'vary_headers': [],
+    }
+    conf.update(getattr(settings, 'CMS_PAGE_CACHE', {}))
+    return conf
+
+
 def get_unihandecode_host():
     host = getattr(settings, 'CMS_UNIHANDECODE_HOST', None)
     if not host:
@@ -210,6 +233,8 @@ def get_unihandecode_host():
 
 COMPLEX = {
     'CACHE_DURATIONS': get_cache_durations,
+    'CONDITIONAL_GET': get_conditional_get,
+    'PAGE_CACHE': get_page_cache,
     'MEDIA_ROOT': get_media_root,
     'MEDIA_URL': get_media_url,
     # complex because not prefixed by CMS_
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Copy of the content of a site from one language to another (see the cms
+copy-lang command).
+
+The draft pages are processed in chunks, each one in its own transaction:
+the missing titles are created with one insert and the plugin trees are
+copied with batched inserts, keeping their structure. The primary keys and
+tree ids of the copied plugins are reserved in the database by each chunk,
+in its transaction, right before the inserts (see reserve_ids): the site can
+be edited while chunks are copied, and an interrupted copy can be resumed. The paths of the new titles are computed once all chunks are done,
+over whole page trees.
+"""
+from collections import defaultdict
+import json
+import os
+
+from cms import constants
+from cms.utils.bulk_pages import bulk_insert, reserve_ids, reserve_tree_ids, reset_sequences
+from django.db import transaction
+
+# the number of pages copied per chunk
+COPY_CHUNK_SIZE = 200
+
+
+def _overrides(model, name):
+    from cms.models import CMSPlugin
+
+    return getattr(model, name) != getattr(CMSPlugin, name)
+
+
+def get_page_chunks(page_ids, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Splits the page ids in chunks of chunk_size pages.
+    """
+    return [page_ids[start:start + chunk_size] for start in range(0, len(page_ids), chunk_size)]
+
+
+def get_source_pages(site, language):
+    """
+    Returns the ids of the draft pages of the site having the given language,
+    in tree order, and the ids of the other ones.
+    """
+    from cms.models import Page
+
+    page_ids = []
+    skipped = []
+    for pk, languages in Page.objects.on_site(site).drafts().order_by('tree_id', 'lft').values_list(
+            'pk', 'languages'):
+        if language in (languages or '').split(','):
+            page_ids.append(pk)
+        else:
+            skipped.append(pk)
+    return page_ids, skipped
+
+
+def copy_plugin_trees(plugins, language=None, placeholder_ids=None):
+    """
+    Copies whole plugin trees (CMSPlugin instances ordered by tree_id and lft)
+    to the given language (their own by default) and returns the number of
+    plugins copied. The copies go to the placeholders mapped from the ones of
+    the plugins by placeholder_ids, to the same placeholders by default. Must
+    be called in a transaction, the primary keys and tree ids of the copies
+    are reserved until its end.
+
+    Like copy_plugins_to, the plugins' copy_relations and post_copy are
+    called, only for the plugin models which implement them.
+    """
+    from cms.models import CMSPlugin
+    from cms.plugin_pool import plugin_pool
+    from cms.plugins.utils import downcast_plugins
+
+    plugin_types = set(plugin.__name__ for plugin in plugin_pool.get_all_plugins())
+    downcasted = dict((plugin.pk, plugin) for plugin in downcast_plugins(
+        [plugin for plugin in plugins if plugin.plugin_type in plugin_types]))
+    copies = {}
+    tree_ids = {}
+    instances = defaultdict(list)
+    ziplists = defaultdict(list)
+    ids = reserve_ids(CMSPlugin, len(plugins))
+    new_tree_ids = reserve_tree_ids(CMSPlugin, len([plugin for plugin in plugins if not plugin.parent_id]))
+    for plugin in plugins:
+        old = downcasted.get(plugin.pk, plugin)
+        if plugin.tree_id not in tree_ids:
+            tree_ids[plugin.tree_id] = next(new_tree_ids)
+        placeholder_id = placeholder_ids[plugin.placeholder_id] if placeholder_ids else plugin.placeholder_id
+        new = CMSPlugin(id=next(ids), placeholder_id=placeholder_id, language=language or plugin.language,
+                        plugin_type=plugin.plugin_type, position=plugin.position, tree_id=tree_ids[plugin.tree_id],
+                        lft=plugin.lft, rght=plugin.rght, level=plugin.level, creation_date=plugin.creation_date)
+        new.parent_id = copies[plugin.parent_id].pk if plugin.parent_id else None
+        copies[plugin.pk] = new
+        model = old.__class__
+        if model is not CMSPlugin:
+            instance = model(**dict((field.attname, getattr(old, field.attname)) for field in model._meta.fields))
+            for field in CMSPlugin._meta.local_fields:
+                setattr(instance, field.attname, getattr(new, field.attname))
+            setattr(instance, model._meta.pk.attname, new.pk)
+            instances[model].append((instance, old))
+        ziplists[plugin.placeholder_id].append((new, old))
+
+    bulk_insert(CMSPlugin, list(copies.values()))
+    reset_sequences([CMSPlugin])
+    for model, pairs in instances.items():
+        bulk_insert(model, [instance for instance, old in pairs])
+    for model, pairs in instances.items():
+        if _overrides(model, 'copy_relations'):
+            for instance, old in pairs:
+                instance.copy_relations(old)
+    for model, pairs in instances.items():
+        if _overrides(model, 'post_copy'):
+            for instance, old in pairs:
+                instance.post_copy(old, ziplists[old.placeholder_id])
+    return len(copies)
+
+
+def _get_plugins(placeholder_ids, from_language, to_language, only_empty):
+    """
+    Returns the plugins of the placeholders to copy, in tree order. With
+    only_empty the placeholders having plugins in to_language are left out.
+    """
+    from cms.models import CMSPlugin
+
+    plugins = CMSPlugin.objects.filter(placeholder__in=placeholder_ids, language=from_language)
+    if only_empty:
+        filled = CMSPlugin.objects.filter(placeholder__in=placeholder_ids, language=to_language)
+        plugins = plugins.exclude(placeholder__in=list(filled.values_list('placeholder_id', flat=True).distinct()))
+    return list(plugins.order_by('tree_id', 'lft'))
+
+
+def copy_titles(page_ids, from_language, to_language):
+    """
+    Creates the titles in to_language of the given pages from the ones in
+    from_language, where they don't exist yet, and adds the language to the
+    pages. The paths are the ones of the copied titles, see rebuild_paths.
+    Returns the ids of the pages which got a title.
+    """
+    from cms.models import Page, Title
+
+    existing = set(Title.objects.filter(page__in=page_ids, language=to_language).values_list('page_id', flat=True))
+    titles = []
+    for title in Title.objects.filter(page__in=page_ids, language=from_language).exclude(page__in=existing):
+        data = dict((field.attname, getattr(title, field.attname)) for field in Title._meta.local_fields)
+        data.update(id=None, language=to_language, publisher_public_id=None,
+                    publisher_state=constants.PUBLISHER_STATE_DIRTY)
+        titles.append(Title(**data))
+    Title.objects.bulk_create(titles)
+    created = [title.page_id for title in titles]
+
+    # the languages of the pages, the updates are grouped by value
+    updates = defaultdict(list)
+    for pk, languages in Page.objects.filter(pk__in=created).values_list('pk', 'languages'):
+        languages = languages.split(',') if languages else []
+        if to_language not in languages:
+            updates[','.join(languages + [to_language])].append(pk)
+    for languages, pks in updates.items():
+        Page.objects.filter(pk__in=pks).update(languages=languages)
+    return created
+
+
+def copy_language_chunk(page_ids, from_language, to_language, only_empty):
+    """
+    Copies the titles and plugins of a chunk of pages in one transaction and
+    returns the number of titles and plugins created.
+    """
+    from cms.models import Page
+
+    with transaction.commit_on_success():
+        titled = copy_titles(page_ids, from_language, to_language)
+        placeholder_ids = list(Page.placeholders.through.objects.filter(page__in=page_ids).values_list(
+            'placeholder_id', flat=True))
+        copied = copy_plugin_trees(_get_plugins(placeholder_ids, from_language, to_language, only_empty),
+                                   to_language)
+    return len(titled), copied
+
+
+def copy_static_placeholders(from_language, to_language, only_empty):
+    """
+    Copies the plugins of the draft static placeholders, in one transaction,
+    and returns their number. Like for pages, with only_empty the static
+    placeholders having plugins in to_language are left out.
+    """
+    from cms.models import StaticPlaceholder
+
+    with transaction.commit_on_success():
+        placeholder_ids = list(StaticPlaceholder.objects.values_list('draft_id', flat=True))
+        return copy_plugin_trees(_get_plugins(placeholder_ids, from_language, to_language, only_empty),
+                                 to_language)
+
+
+class CopyState(object):
+    """
+    The ids of the pages already copied, saved to a file after every chunk so
+    an interrupted copy given the same file resumes with the pages left.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as handle:
+                self.done = set(json.load(handle)['pages'])
+
+    def add(self, page_ids):
+        self.done.update(page_ids)
+        if not self.path:
+            return
+        path = '%s.tmp' % self.path
+        with open(path, 'w') as handle:
+            json.dump({'pages': sorted(self.done)}, handle)
+        os.rename(path, self.path)
+
+
+def rebuild_paths(page_ids, site):
+    """
+    Recomputes the title paths of the page trees containing the given pages,
+    once all their titles exist, and invalidates their url index entries.
+    """
+    from cms.cache.invalidation import invalidate_menus
+    from cms.cache.page_urls import invalidate_page_urls
+    from cms.models import Page
+    from cms.utils.page import rebuild_title_paths
+
+    tree_ids = set()
+    for chunk in get_page_chunks(list(page_ids), 500):
+        tree_ids.update(Page.objects.filter(pk__in=chunk).values_list('tree_id', flat=True))
+    for root in Page.objects.drafts().filter(site=site, level=0, tree_id__in=list(tree_ids)):
+        rebuild_title_paths(root)
+    invalidate_page_urls(site)
+    invalidate_menus(site)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Copy of a page and its descendants (see Page.copy_page).
+
+The tree space is allocated once, the slugs and paths are computed in memory
+and pages, titles, permissions and placeholder relations are inserted in
+batches, one per tree level for the pages, in a single transaction.
+Placeholders are inserted one by one since their primary keys are needed,
+the plugin trees are copied with batched inserts (see
+cms.utils.copy_lang.copy_plugin_trees). The copies don't keep the overwritten
+urls of the titles, their paths follow their slugs.
+"""
+from collections import defaultdict
+
+from cms import constants
+from cms.cache.invalidation import deferred_invalidation, invalidate_menus, invalidate_permissions
+from cms.cache.page_urls import invalidate_page_urls
+from cms.cache.permissions import clear_view_restrictions
+from cms.utils.bulk_pages import create_tree_space
+from cms.utils.conf import get_cms_setting
+from cms.utils.copy_lang import copy_plugin_trees
+from cms.utils.page import SlugAllocator, build_path, get_path_in_language
+from django.db import transaction
+
+
+def _clone(instance, **values):
+    """
+    Returns an unsaved copy of a model instance with the given field values
+    (by attname).
+    """
+    data = dict((field.attname, getattr(instance, field.attname)) for field in instance._meta.local_fields)
+    data[instance._meta.pk.attname] = None
+    data.update(values)
+    return instance.__class__(**data)
+
+
+def copy_page_tree(page, target, site, position='first-child', copy_permissions=True):
+    """
+    Copies the page and its descendants to the given position relatively to
+    target (as a root page if there is no target) on the given site, and
+    returns the copy of the page. The copies are unpublished.
+    """
+    from cms.models import (CMSPlugin, Page, PageModeratorState, PagePermission, Placeholder, Title)
+    from cms.signals import update_home
+    from cms.utils.permissions import get_current_user
+    from cms.utils.plugins import get_placeholders
+
+    sources = [page] + list(page.get_descendants().order_by('lft'))
+    source_ids = [source.pk for source in sources]
+    site_reverse_ids = set(Page.objects.filter(site=site, reverse_id__isnull=False).values_list(
+        'reverse_id', flat=True))
+    user = get_current_user()
+    user_name = user.username if user else 'script'
+
+    with deferred_invalidation():
+        with transaction.commit_on_success():
+            # the root copy gets its place (and the tree space for the whole
+            # copy) from mptt, the descendants keep their offsets to it
+            root = _clone(page, site_id=site.pk, publisher_public_id=None, is_home=False,
+                          lft=None, rght=None, level=None, tree_id=None)
+            Page._tree_manager.insert_node(root, target, position)
+            size = page.rght - page.lft - 1
+            if size:
+                create_tree_space(Page, size, root.lft, root.tree_id)
+                root.rght += size
+            root.resolved_template = root._resolve_template()
+
+            copies = {}
+            levels = defaultdict(list)
+            for source in sources:
+                levels[source.level].append(source)
+            for level in sorted(levels):
+                batch = []
+                for source in levels[level]:
+                    if source is page:
+                        copy = root
+                    else:
+                        parent = copies[source.parent_id]
+                        copy = _clone(
+                            source, site_id=site.pk, publisher_public_id=None, is_home=False, parent_id=parent.pk,
+                            tree_id=root.tree_id, lft=root.lft + source.lft - page.lft,
+                            rght=root.lft + source.rght - page.lft, level=root.level + source.level - page.level)
+                        if copy.template and copy.template != constants.TEMPLATE_INHERITANCE_MAGIC:
+                            copy.resolved_template = copy.template
+                        else:
+                            copy.resolved_template = parent.resolved_template
+                    if copy.reverse_id in site_reverse_ids:
+                        copy.reverse_id = None
+                    copy.changed_by = copy.created_by = user_name
+                    copies[source.pk] = copy
+                    batch.append(copy)
+                Page.objects.bulk_create(batch)
+                # bulk_create doesn't set the primary keys, the copies are
+                # found by their position in the tree
+                pks = dict(Page.objects.filter(
+                    tree_id=root.tree_id, lft__gte=root.lft, lft__lte=root.rght, level=batch[0].level,
+                ).values_list('lft', 'pk'))
+                for copy in batch:
+                    copy.pk = pks[copy.lft]
+
+            # titles, the sources are sorted by lft so parents come first. An
+            # overwritten url would give the copy the url of its source
+            source_titles = defaultdict(list)
+            for title in Title.objects.filter(page__in=source_ids):
+                source_titles[title.page_id].append(title)
+            allocator = SlugAllocator(root.parent, site)
+            paths = {}
+            titles = []
+            for source in sources:
+                copy = copies[source.pk]
+                paths[copy.pk] = {}
+                for title in source_titles[source.pk]:
+                    if source is page:
+                        slug, path = allocator.allocate(title.language, title.slug)
+                    else:
+                        slug = title.slug
+                        path = build_path(get_path_in_language(paths[copy.parent_id], title.language), slug)
+                    paths[copy.pk][title.language] = path
+                    titles.append(_clone(
+                        title, page_id=copy.pk, slug=slug, path=path, has_url_overwrite=False, published=False,
+                        publisher_public_id=None,
+                        publisher_state=constants.PUBLISHER_STATE_DIRTY if title.publisher_is_draft else title.publisher_state))
+            Title.objects.bulk_create(titles)
+
+            if get_cms_setting('PERMISSION') and copy_permissions:
+                PagePermission.objects.bulk_create([
+                    _clone(permission, page_id=copies[permission.page_id].pk)
+                    for permission in PagePermission.objects.filter(page__in=source_ids)
+                ])
+            PageModeratorState.objects.bulk_create([
+                PageModeratorState(page_id=copy.pk, user=user if user and user.pk else None,
+                                   action=PageModeratorState.ACTION_ADD)
+                for copy in copies.values()
+            ])
+
+            # placeholders: the ones of the sources and the missing ones of
+            # the templates (see Page.rescan_placeholders)
+            relations = Page.placeholders.through.objects.filter(page__in=source_ids).select_related('placeholder')
+            source_placeholders = defaultdict(list)
+            for relation in relations:
+                source_placeholders[relation.page_id].append(relation.placeholder)
+            template_slots = {}
+            page_placeholders = []
+            placeholder_ids = {}
+            for source in sources:
+                copy = copies[source.pk]
+                template = copy.get_template()
+                if template not in template_slots:
+                    template_slots[template] = get_placeholders(template)
+                slots = set()
+                for placeholder in source_placeholders[source.pk]:
+                    new_placeholder = _clone(placeholder)
+                    new_placeholder.save()
+                    page_placeholders.append(Page.placeholders.through(page_id=copy.pk, placeholder_id=new_placeholder.pk))
+                    placeholder_ids[placeholder.pk] = new_placeholder.pk
+                    slots.add(placeholder.slot)
+                for slot in template_slots[template]:
+                    if slot not in slots:
+                        new_placeholder = Placeholder.objects.create(slot=slot)
+                        page_placeholders.append(Page.placeholders.through(page_id=copy.pk, placeholder_id=new_placeholder.pk))
+            Page.placeholders.through.objects.bulk_create(page_placeholders)
+            plugins = CMSPlugin.objects.filter(placeholder__in=list(placeholder_ids)).order_by('tree_id', 'lft')
+            copy_plugin_trees(list(plugins), placeholder_ids=placeholder_ids)
+
+            # what the signals of every page and title save did
+            if root.parent_id is None:
+                update_home(root)
+                if root.is_home:
+                    # the path of the home page is empty, saving its titles
+                    # updates the paths of the descendants
+                    for title in root.title_set.all():
+                        title.save()
+            invalidate_page_urls(site.pk)
+            clear_view_restrictions(site.pk)
+            invalidate_permissions()
+            invalidate_menus(site.pk)
+    return root
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from cms.models import PageModeratorState, CMSPlugin, Title
+from cms.utils import is_anonymous_request
 
 
 def page_changed(page, old_page=None, force_moderation_action=None):
@@ -25,7 +26,7 @@ def page_changed(page, old_page=None, force_moderation_action=None):
 
 
 def use_draft(request):
-    if request:
+    if request and not is_anonymous_request(request):
         is_staff = request.user.is_authenticated() and request.user.is_staff
         edit_mode = is_staff and request.session.get('cms_edit', False)
         build_mode = is_staff and request.session.get('cms_build', False)
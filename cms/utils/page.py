@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
+from cms.exceptions import LanguageError
+from cms.utils.compat.type_checks import string_types
+from cms.utils.compat import DJANGO_1_5
+from cms.utils.i18n import get_fallback_languages
 from django.conf import settings
+from django.db import connection, transaction
 from django.db.models import Q
+from django.utils.translation import get_language
 import re
 
 APPEND_TO_SLUG = "-copy"
 COPY_SLUG_REGEX = re.compile(r'^.*-copy(?:-(\d+)*)?$')
+# the number of titles updated per query by rebuild_title_paths
+PATH_UPDATE_BATCH_SIZE = 100
 
 
 def is_valid_page_slug(page, parent, lang, slug, site, path=None):
@@ -52,37 +60,266 @@ def get_available_slug(title, new_slug=None):
 
     Returns: slug
     """
-    rewrite_slug = False
-    slug = new_slug or title.slug
-    # We need the full path for the title to check for conflicting urls
-    title.slug = slug
-    title.update_path()
-    path = title.path
-    # This checks for conflicting slugs/overwrite_url, for both published and unpublished pages
-    # This is a simpler check than in page_resolver.is_valid_url which
-    # takes into account actually page URL
-    if not is_valid_page_slug(title.page, title.page.parent, title.language, slug, title.page.site, path):
-        # add nice copy attribute, first is -copy, then -copy-2, -copy-3, ....
-        match = COPY_SLUG_REGEX.match(slug)
-        if match:
-            try:
-                next = int(match.groups()[0]) + 1
-                slug = "-".join(slug.split('-')[:-1]) + "-%d" % next
-            except TypeError as e:
-                slug += "-2"
+    page = title.page
+    allocator = SlugAllocator(page.parent, page.site, exclude=page, languages=[title.language])
+    title.slug, path = allocator.allocate(title.language, new_slug or title.slug, title.has_url_overwrite)
+    if not title.has_url_overwrite:
+        title.path = path
+    return title.slug
+
+
+def get_next_slug(slug):
+    """
+    Returns the slug to try after the given one when it is taken: first
+    -copy, then -copy-2, -copy-3, ...
+    """
+    match = COPY_SLUG_REGEX.match(slug)
+    if match:
+        try:
+            next = int(match.groups()[0]) + 1
+            return "-".join(slug.split('-')[:-1]) + "-%d" % next
+        except TypeError:
+            return slug + "-2"
+    return slug + APPEND_TO_SLUG
+
+
+class SlugAllocator(object):
+    """
+    Finds free slugs among the children of a parent page (the root pages if
+    there is none), with the rules of is_valid_page_slug. The slugs and paths
+    taken on the site, and the paths of the parent, are loaded once, the
+    following slugs are then tried in memory::
+
+        allocator = SlugAllocator(parent, site, exclude=page)
+        for title in page.title_set.all():
+            slug, path = allocator.allocate(title.language, title.slug)
+    """
+    def __init__(self, parent, site=None, exclude=None, languages=None, parent_paths=None, siblings_only=False):
+        """
+        The parent paths, by language, are given for a parent being created:
+        nothing is loaded then, it has no children yet.
+
+        With siblings_only, only the slugs of the children of parent are
+        taken, like cms.api.create_page always did: the root pages aren't
+        siblings of the children of the home page and paths aren't checked.
+        """
+        from cms.models import Title
+
+        self.slugs = {}
+        self.paths = {}
+        self.is_root = parent is None
+        if parent_paths is not None:
+            self.parent_paths = parent_paths
+            return
+        titles = Title.objects.all()
+        if site is not None:
+            titles = titles.filter(page__site=site)
+        if settings.USE_I18N and languages is not None:
+            titles = titles.filter(language__in=list(languages))
+        if parent is None:
+            titles = titles.filter(page__parent__isnull=True)
+        elif parent.is_home and not siblings_only:
+            titles = titles.filter(Q(page__parent=parent) | Q(page__parent__isnull=True))
         else:
-            slug += APPEND_TO_SLUG
-        return get_available_slug(title, slug)
-    else:
-        return slug
+            titles = titles.filter(page__parent=parent)
+        if exclude is not None and exclude.pk:
+            titles = titles.exclude(page=exclude).exclude(page__publisher_public=exclude)
+        for language, slug, path in titles.values_list('language', 'slug', 'path'):
+            self.reserve(language, slug, None if siblings_only else path)
+        if parent is None:
+            self.parent_paths = {}
+        else:
+            self.parent_paths = dict(Title.objects.filter(page=parent).values_list('language', 'path'))
+
+    def _get_key(self, language):
+        # without i18n the slugs of all languages conflict
+        return language if settings.USE_I18N else None
+
+    def get_path(self, language, slug):
+        """
+        Returns the path of a title with the given slug under the parent.
+        """
+        if self.is_root:
+            return slug
+        return build_path(get_path_in_language(self.parent_paths, language), slug)
+
+    def is_available(self, language, slug, path=None):
+        key = self._get_key(language)
+        if slug in self.slugs.get(key, ()):
+            return False
+        return not path or path not in self.paths.get(key, ())
+
+    def reserve(self, language, slug, path=None):
+        """
+        Marks a slug (and its path) as taken, eg by a sibling created next.
+        """
+        key = self._get_key(language)
+        self.slugs.setdefault(key, set()).add(slug)
+        if path:
+            self.paths.setdefault(key, set()).add(path)
+
+    def allocate(self, language, slug, has_url_overwrite=False, next_slug=get_next_slug):
+        """
+        Returns the first available slug among slug and the ones next_slug
+        derives from it (-copy, -copy-2, ... by default) and its path. The
+        path of titles with an overwritten url doesn't depend on the slug and
+        isn't checked.
+        """
+        while True:
+            path = self.get_path(language, slug)
+            if self.is_available(language, slug, None if has_url_overwrite else path):
+                return slug, path
+            slug = next_slug(slug)
 
 
 def check_title_slugs(page):
     """Checks page title slugs for duplicity if required, used after page move/
     cut/paste.
     """
+    allocator = SlugAllocator(page.parent, page.site, exclude=page)
     for title in page.title_set.all():
         old_slug, old_path = title.slug, title.path
-        title.slug = get_available_slug(title)
+        title.slug, path = allocator.allocate(title.language, title.slug, title.has_url_overwrite)
+        if not title.has_url_overwrite and not page.is_home:
+            title.path = path
         if title.slug != old_slug or title.path != old_path:
             title.save()
+
+
+def get_path_in_language(paths, language):
+    """
+    Returns the path in the given language from a dictionary of language to
+    path, or in the first fallback language available like
+    TitleManager.get_title, or None.
+    """
+    if language in paths:
+        return paths[language]
+    try:
+        fallbacks = get_fallback_languages(language)
+    except LanguageError:
+        return None
+    for fallback in fallbacks:
+        if fallback in paths:
+            return paths[fallback]
+    return None
+
+
+def build_path(parent_path, slug):
+    """
+    Returns the path of a title given the path of its parent title (None for
+    root pages), see cms.signals.update_title.
+    """
+    if parent_path is None:
+        return slug
+    return (u'%s/%s' % (parent_path, slug)).lstrip('/')
+
+
+def _update_title_paths(paths):
+    """
+    Writes the given title paths (a dictionary of title id to path) with
+    UPDATE ... CASE queries, without loading or saving the titles.
+    """
+    from cms.models import Title
+
+    qn = connection.ops.quote_name
+    items = sorted(paths.items())
+    cursor = connection.cursor()
+    for start in range(0, len(items), PATH_UPDATE_BATCH_SIZE):
+        batch = items[start:start + PATH_UPDATE_BATCH_SIZE]
+        query = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            qn(Title._meta.db_table), qn('path'), qn('id'), ' '.join(['WHEN %s THEN %s'] * len(batch)),
+            qn('id'), ', '.join(['%s'] * len(batch)))
+        params = [value for item in batch for value in item] + [pk for pk, path in batch]
+        cursor.execute(query, params)
+    if DJANGO_1_5:
+        transaction.commit_unless_managed()
+
+
+def rebuild_title_paths(page):
+    """
+    Recomputes the paths of the titles of the page and its descendants, in
+    every language, in one top-down pass over the tree with the parent paths
+    kept in memory. Only the changed paths are written, in batches, and no
+    signals are sent.
+
+    Returns the number of titles whose path changed.
+    """
+    from cms.models import Page, Title
+
+    # the tree position of the given instance may be outdated (eg after a move)
+    tree_id, lft, rght, parent_id = Page.objects.filter(pk=page.pk).values_list(
+        'tree_id', 'lft', 'rght', 'parent_id')[0]
+    pages = Page.objects.filter(tree_id=tree_id, lft__gte=lft, lft__lte=rght).order_by('lft').values_list(
+        'pk', 'parent_id', 'is_home')
+    titles = {}
+    for values in Title.objects.filter(page__tree_id=tree_id, page__lft__gte=lft, page__lft__lte=rght).values_list(
+            'pk', 'page', 'language', 'slug', 'path', 'has_url_overwrite'):
+        titles.setdefault(values[1], []).append(values)
+    # dictionaries of language to path by page id
+    paths = {}
+    if parent_id:
+        paths[parent_id] = dict(Title.objects.filter(page=parent_id).values_list('language', 'path'))
+    changed = {}
+    for page_id, parent_id, is_home in pages:
+        page_paths = paths[page_id] = {}
+        for pk, title_page_id, language, slug, path, has_url_overwrite in titles.get(page_id, ()):
+            if is_home:
+                new_path = ''
+            elif has_url_overwrite:
+                new_path = path
+            elif parent_id:
+                new_path = build_path(get_path_in_language(paths.get(parent_id, {}), language), slug)
+            else:
+                new_path = slug
+            page_paths[language] = new_path
+            if new_path != path:
+                changed[pk] = new_path
+    if changed:
+        _update_title_paths(changed)
+    return len(changed)
+
+
+def prefetch_titles(pages, languages=None, fallbacks=True):
+    """
+    Fills the title cache of all given pages with their titles in the given
+    languages (and the fallback languages of their site if `fallbacks` is
+    True), using a single query. Defaults to the current language.
+
+    Returns the pages as a list.
+    """
+    from cms.models import Title
+
+    pages = [page for page in pages if page is not None]
+    if not pages:
+        return pages
+    if not languages:
+        languages = [get_language()]
+    elif isinstance(languages, string_types):
+        languages = [languages]
+    languages = list(languages)
+    # the languages of the pages of every site, the fallbacks depend on it
+    site_languages = {}
+    for site_id in set(page.site_id for page in pages):
+        site_languages[site_id] = list(languages)
+        if not fallbacks:
+            continue
+        for language in languages:
+            try:
+                fallback_languages = get_fallback_languages(language, site_id)
+            except LanguageError:
+                continue
+            for fallback in fallback_languages:
+                if not fallback in site_languages[site_id]:
+                    site_languages[site_id].append(fallback)
+    page_lookup = {}
+    for page in pages:
+        if not hasattr(page, 'title_cache'):
+            page.title_cache = {}
+        page_lookup.setdefault(page.pk, []).append(page)
+    all_languages = set(language for site_id in site_languages for language in site_languages[site_id])
+    titles = Title.objects.filter(page__in=list(page_lookup.keys()), language__in=list(all_languages))
+    for title in titles:
+        for page in page_lookup[title.page_id]:
+            if title.language in site_languages[page.site_id] and not title.language in page.title_cache:
+                page.title_cache[title.language] = title
+    return pages
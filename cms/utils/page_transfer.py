@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+Export and import of page trees in a line-delimited JSON format, to move
+content between installations (see the cms export and cms import commands).
+
+The first line is a header, then every line is the record of a draft page,
+in tree order: its page options, its titles by language and its placeholders
+with their (downcasted) plugin trees, the fields of every plugin serialized
+like dumpdata does for its plugin model. The ids of the pages and of their
+parents are kept so that the records can be imported in chunks, the parents
+being created before their children.
+"""
+import json
+import os
+
+from cms import constants
+from cms.utils.compat.dj import force_unicode
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+FORMAT = 'django-cms-pages'
+VERSION = 1
+
+# the number of pages loaded per query on export, and created per batch on
+# import
+EXPORT_CHUNK_SIZE = 200
+IMPORT_CHUNK_SIZE = 500
+
+# the page options of the records (see cms.api.bulk_create_pages)
+PAGE_FIELDS = ('template', 'in_navigation', 'soft_root', 'reverse_id', 'navigation_extenders', 'publication_date',
+               'publication_end_date', 'login_required', 'limit_visibility_in_menu')
+TITLE_FIELDS = ('title', 'slug', 'menu_title', 'page_title', 'meta_description', 'redirect')
+DATE_FIELDS = ('publication_date', 'publication_end_date')
+
+
+def _dump(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def get_header():
+    return {'format': FORMAT, 'version': VERSION}
+
+
+def is_header(line):
+    """
+    Tells whether a line is the header of an export.
+    """
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get('format') == FORMAT
+
+
+def _iter_chunks(pages, chunk_size):
+    """
+    Iterates over the pages in tree order, loading chunk_size pages per query
+    from the position of the last page of the previous chunk.
+    """
+    pages = pages.order_by('tree_id', 'lft')
+    last = None
+    while True:
+        chunk = pages
+        if last is not None:
+            chunk = chunk.filter(Q(tree_id__gt=last.tree_id) | Q(tree_id=last.tree_id, lft__gt=last.lft))
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def _serialize_plugin(plugin):
+    from cms.models import CMSPlugin
+
+    data = {}
+    if plugin.__class__ is not CMSPlugin:
+        data = serializers.serialize('python', [plugin])[0]['fields']
+    return {
+        'id': plugin.pk,
+        'plugin_type': plugin.plugin_type,
+        'language': plugin.language,
+        'data': data,
+        'children': [],
+    }
+
+
+def _get_plugin_trees(placeholder_ids):
+    """
+    Returns the serialized plugin trees of the given placeholders, by
+    placeholder id, with one query per plugin type.
+    """
+    from cms.models import CMSPlugin
+    from cms.plugin_pool import plugin_pool
+    from cms.plugins.utils import downcast_plugins
+
+    plugin_types = [plugin.__name__ for plugin in plugin_pool.get_all_plugins()]
+    plugins = CMSPlugin.objects.filter(
+        placeholder__in=placeholder_ids, plugin_type__in=plugin_types).order_by('tree_id', 'lft')
+    trees = {}
+    nodes = {}
+    for plugin in downcast_plugins(plugins):
+        node = nodes[plugin.pk] = _serialize_plugin(plugin)
+        if plugin.parent_id in nodes:
+            nodes[plugin.parent_id]['children'].append(node)
+        elif not plugin.parent_id:
+            trees.setdefault(plugin.placeholder_id, []).append((plugin.position, plugin.tree_id, node))
+    return dict((placeholder_id, [node for position, tree_id, node in sorted(roots, key=lambda root: root[:2])])
+                for placeholder_id, roots in trees.items())
+
+
+def iter_page_records(pages, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the records of the given draft pages, in tree order. The pages,
+    titles, placeholders and plugins are loaded chunk by chunk so the memory
+    used doesn't depend on the number of pages.
+    """
+    from cms.models import Page, Title
+
+    for chunk in _iter_chunks(pages, chunk_size):
+        page_ids = [page.pk for page in chunk]
+        titles = {}
+        for title in Title.objects.filter(page__in=page_ids):
+            data = dict((name, getattr(title, name)) for name in TITLE_FIELDS)
+            if title.has_url_overwrite:
+                data['overwrite_url'] = title.path
+            titles.setdefault(title.page_id, {})[title.language] = data
+        relations = Page.placeholders.through.objects.filter(page__in=page_ids).select_related('placeholder')
+        slots = {}
+        for relation in relations:
+            slots.setdefault(relation.page_id, []).append(relation.placeholder)
+        plugin_trees = _get_plugin_trees([relation.placeholder_id for relation in relations])
+        for page in chunk:
+            record = {
+                'id': page.pk,
+                'parent': page.parent_id,
+                'page': dict((name, getattr(page, name)) for name in PAGE_FIELDS),
+                'titles': titles.get(page.pk, {}),
+                'placeholders': {},
+            }
+            if page.application_urls:
+                record['page']['apphook'] = page.application_urls
+                record['page']['apphook_namespace'] = page.application_namespace
+            for placeholder in slots.get(page.pk, ()):
+                if placeholder.pk in plugin_trees:
+                    record['placeholders'][placeholder.slot] = plugin_trees[placeholder.pk]
+            yield record
+
+
+def export_pages(stream, pages, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes the header and the records of the given draft pages to the stream
+    and returns the number of pages written.
+    """
+    stream.write(_dump(get_header()) + '\n')
+    count = 0
+    for record in iter_page_records(pages, chunk_size):
+        stream.write(_dump(record) + '\n')
+        count += 1
+    return count
+
+
+def _to_plugin_node(node, page_ids, links, deferred, parent=None):
+    """
+    Returns the description of a plugin for bulk_create_pages, with the
+    links to exported pages pointing to the imported ones. The links to pages
+    not imported yet are left empty and added to links, by id of the returned
+    description, as (field name, page id in the export) pairs.
+
+    A plugin with such a link that can't be empty isn't described: it is added
+    to deferred, with the description of its parent, and None is returned.
+    """
+    from cms.plugin_pool import plugin_pool
+    from cms.plugins.utils import get_page_link_fields
+
+    plugin_model = plugin_pool.get_plugin(node['plugin_type']).model
+    data = {}
+    pending = []
+    if node['data']:
+        label = '%s.%s' % (plugin_model._meta.app_label, plugin_model._meta.object_name.lower())
+        deserialized = next(serializers.deserialize('python', [{'model': label, 'pk': None, 'fields': node['data']}]))
+        for field in plugin_model._meta.local_fields:
+            if field is not plugin_model._meta.pk:
+                data[field.attname] = getattr(deserialized.object, field.attname)
+        for name in get_page_link_fields(plugin_model):
+            field = plugin_model._meta.get_field(name)
+            old_id = data.get(field.attname)
+            if old_id is None:
+                continue
+            if force_unicode(old_id) in page_ids:
+                data[field.attname] = page_ids[force_unicode(old_id)]
+                continue
+            # never keep an id of the exporting database
+            if not field.null:
+                deferred.append((parent, node))
+                return None
+            data[field.attname] = None
+            pending.append((field.name, force_unicode(old_id)))
+    description = {
+        'plugin_type': node['plugin_type'],
+        'language': node['language'],
+        'data': data,
+        'children': [],
+    }
+    for child in node['children']:
+        child = _to_plugin_node(child, page_ids, links, deferred, description)
+        if child is not None:
+            description['children'].append(child)
+    if pending:
+        links[id(description)] = pending
+    return description
+
+
+def _to_page_node(record, page_ids, links, deferred):
+    """
+    Returns the description of the page of a record for bulk_create_pages.
+    The plugins left out (see _to_plugin_node) are added to deferred as
+    (slot, description of the parent plugin, plugin node) tuples.
+    """
+    page = dict(record['page'])
+    for name in DATE_FIELDS:
+        if page.get(name):
+            page[name] = parse_datetime(page[name])
+    if not page.get('template'):
+        page['template'] = constants.TEMPLATE_INHERITANCE_MAGIC
+    page['titles'] = record['titles']
+    page['placeholders'] = {}
+    for slot, nodes in record['placeholders'].items():
+        left_out = []
+        plugins = [_to_plugin_node(node, page_ids, links, left_out) for node in nodes]
+        page['placeholders'][slot] = [plugin for plugin in plugins if plugin is not None]
+        deferred.extend((slot, parent, node) for parent, node in left_out)
+    page['children'] = []
+    return page
+
+
+def _get_field_name(model, name):
+    # the states of previous versions stored the attnames of the fields
+    for field in model._meta.fields:
+        if name in (field.name, field.attname):
+            return field.name
+    return name
+
+
+class PageImporter(object):
+    """
+    Creates the pages of an export in chunks, with bulk_create_pages. The ids
+    of the pages created, by id in the export, can be saved to a state file
+    after every batch: an interrupted import given the same state file
+    resumes after the last pages created.
+
+    The links of plugins to pages created in a later chunk are left empty
+    and saved with the state, they are set once all chunks are imported. The
+    plugins whose link to such a page can't be empty are saved with the state
+    too, and created once all chunks are imported, as the last plugins of
+    their placeholder or parent plugin.
+    """
+    def __init__(self, site, parent=None, state_path=None, chunk_size=IMPORT_CHUNK_SIZE, created_by='script'):
+        self.site = site
+        self.parent = parent
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        self.created_by = created_by
+        # the ids of the imported pages by id in the export (as strings, like
+        # json stores them)
+        self.page_ids = {}
+        # the page links to set, as [plugin type, field name, plugin id, page
+        # id in the export] lists
+        self.links = []
+        # the plugins to create once all chunks are imported, as [page id in
+        # the export, slot, parent plugin id, plugin node] lists
+        self.deferred = []
+        # the links left empty, their pages not being in the export
+        self.unresolved = []
+        # the number of plugins left out, their required page link pointing
+        # to a page not in the export
+        self.dropped = 0
+        self.created = 0
+        self.skipped = 0
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as handle:
+                state = json.load(handle)
+            self.page_ids = state['pages']
+            self.links = state.get('links', [])
+            self.deferred = state.get('deferred', [])
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        path = '%s.tmp' % self.state_path
+        with open(path, 'w') as handle:
+            json.dump({'pages': self.page_ids, 'links': self.links, 'deferred': self.deferred}, handle)
+        os.rename(path, self.state_path)
+
+    def import_records(self, records, progress=None):
+        """
+        Imports the records (an iterable of dictionaries), calling progress
+        with the importer after every chunk, then creates the plugins left
+        out and sets the page links left empty. Returns the number of pages
+        created.
+        """
+        chunk = []
+        for record in records:
+            if force_unicode(record['id']) in self.page_ids:
+                self.skipped += 1
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+                if progress:
+                    progress(self)
+        if chunk:
+            self._import_chunk(chunk)
+            if progress:
+                progress(self)
+        self.create_deferred_plugins()
+        self.resolve_links()
+        return self.created
+
+    def _import_chunk(self, records):
+        """
+        Groups the records in trees, the ones whose parent isn't in the chunk
+        at the top, and creates the trees of each parent with one call of
+        bulk_create_pages.
+        """
+        from cms.api import _bulk_create_pages
+        from cms.models import Page
+
+        # the nodes and the export ids of the records
+        nodes = {}
+        export_ids = {}
+        links = {}
+        deferred = []
+        groups = []
+        by_parent = {}
+        for record in records:
+            export_id = force_unicode(record['id'])
+            left_out = []
+            node = nodes[export_id] = _to_page_node(record, self.page_ids, links, left_out)
+            deferred.extend((export_id, slot, parent, plugin) for slot, parent, plugin in left_out)
+            export_ids[id(node)] = export_id
+            parent_id = force_unicode(record['parent']) if record['parent'] else None
+            if parent_id in nodes:
+                nodes[parent_id]['children'].append(node)
+                continue
+            # the pages whose parent wasn't exported are created at the top
+            parent = self.page_ids.get(parent_id)
+            if parent not in by_parent:
+                by_parent[parent] = []
+                groups.append(parent)
+            by_parent[parent].append(node)
+        parents = Page.objects.in_bulk([parent for parent in groups if parent])
+        for parent in groups:
+            pages, plugins = _bulk_create_pages(by_parent[parent], parent=parents[parent] if parent else self.parent,
+                                                site=self.site, created_by=self.created_by)
+            created = set()
+            for node, page in zip(_iter_tree(by_parent[parent]), pages):
+                self.page_ids[export_ids[id(node)]] = page.pk
+                created.add(export_ids[id(node)])
+            plugin_ids = {}
+            for description, plugin in plugins:
+                plugin_ids[id(description)] = plugin.pk
+                for name, page_id in links.get(id(description), ()):
+                    self.links.append([plugin.plugin_type, name, plugin.pk, page_id])
+            for export_id, slot, parent_plugin, plugin in deferred:
+                if export_id in created:
+                    self.deferred.append([export_id, slot, plugin_ids[id(parent_plugin)] if parent_plugin else None,
+                                          plugin])
+            self.created += len(pages)
+            self.save_state()
+
+    def create_deferred_plugins(self):
+        """
+        Creates the plugins left out of the chunks, now that the pages they
+        link to are imported. The ones linking to a page which isn't in the
+        export are left out and counted in dropped.
+        """
+        from cms.models import CMSPlugin, Page
+
+        for export_id, slot, parent_id, node in self.deferred:
+            links = {}
+            left_out = []
+            description = _to_plugin_node(node, self.page_ids, links, left_out)
+            self.dropped += sum(_count_plugin_nodes([plugin]) for parent, plugin in left_out)
+            if description is None:
+                continue
+            placeholder = Page.objects.get(pk=self.page_ids[export_id]).placeholders.get(slot=slot)
+            parent = CMSPlugin.objects.get(pk=parent_id) if parent_id else None
+            self._add_plugin_tree(description, placeholder, parent, links)
+        self.deferred = []
+        self.save_state()
+
+    def _add_plugin_tree(self, description, placeholder, parent, links):
+        from cms.api import add_plugin
+        from cms.models import CMSPlugin
+
+        plugin = add_plugin(placeholder, description['plugin_type'], description['language'], target=parent,
+                            **description['data'])
+        for name, page_id in links.get(id(description), ()):
+            self.links.append([plugin.plugin_type, name, plugin.pk, page_id])
+        for child in description['children']:
+            # fresh tree values, adding the previous children changed them
+            self._add_plugin_tree(child, placeholder, CMSPlugin.objects.get(pk=plugin.pk), links)
+
+    def resolve_links(self):
+        """
+        Sets the page links left empty to the imported pages, with one update
+        per plugin model, field and page. The links to pages which aren't
+        imported stay empty and are kept in unresolved.
+        """
+        from cms.plugin_pool import plugin_pool
+
+        updates = {}
+        self.unresolved = []
+        for link in self.links:
+            plugin_type, name, plugin_id, page_id = link
+            if page_id in self.page_ids:
+                updates.setdefault((plugin_type, name, self.page_ids[page_id]), []).append(plugin_id)
+            else:
+                self.unresolved.append(link)
+        for (plugin_type, name, page_id), plugin_ids in updates.items():
+            model = plugin_pool.get_plugin(plugin_type).model
+            name = _get_field_name(model, name)
+            for start in range(0, len(plugin_ids), self.chunk_size):
+                model._base_manager.filter(pk__in=plugin_ids[start:start + self.chunk_size]).update(
+                    **{name: page_id})
+        self.links = list(self.unresolved)
+        self.save_state()
+
+
+def _count_plugins(placeholders):
+    return sum(_count_plugin_nodes(nodes) for nodes in placeholders.values())
+
+
+def _count_plugin_nodes(nodes):
+    return sum(1 + _count_plugin_nodes(node['children']) for node in nodes)
+
+
+def _iter_tree(nodes):
+    for node in nodes:
+        yield node
+        for child in _iter_tree(node['children']):
+            yield child
+
+
+def iter_records(stream):
+    """
+    Yields the page records of an export read from the stream, after
+    checking its header.
+    """
+    header = stream.readline()
+    if not is_header(header):
+        raise ValueError("Not a page export")
+    if json.loads(header)['version'] > VERSION:
+        raise ValueError("Unsupported export version %s" % json.loads(header)['version'])
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
@@ -131,6 +131,30 @@ def get_any_page_view_permissions(request, page):
     return PagePermission.objects.for_page(page=page).filter(can_view=True)
 
 
+def is_view_restricted(page):
+    """
+    Returns True if a view permission applies to the given draft page (same
+    rules as PagePermission.objects.for_page), using the cached view
+    restrictions of the page's site instead of querying the permissions.
+    """
+    from cms.cache.permissions import get_view_restrictions
+    from cms.models import (ACCESS_PAGE, ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN,
+        ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS)
+
+    restrictions = get_view_restrictions(page.site_id).get(page.tree_id, ())
+    for lft, rght, level, grant_on in restrictions:
+        if lft == page.lft:
+            # a permission on the page itself
+            if grant_on in (ACCESS_PAGE, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS):
+                return True
+        if lft <= page.lft and rght >= page.rght:
+            if grant_on in (ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS):
+                return True
+            if level == page.level - 1 and grant_on in (ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN):
+                return True
+    return False
+
+
 def get_user_permission_level(user):
     """
     Returns highest user level from the page/permission hierarchy on which
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Purging of cached responses by surrogate key, see cms.utils.surrogates.
+"""
+from logging import getLogger
+import threading
+
+from cms.cache.page_cache import purge_page_cache
+from cms.utils.conf import get_cms_setting
+from cms.utils.django_load import iterload_objects
+from django.core.signals import request_started, request_finished
+
+logger = getLogger('cms.purge')
+
+
+class BasePurgeBackend(object):
+    """
+    Purges the responses tagged with the given surrogate keys from a reverse
+    proxy or CDN.
+    """
+    def purge(self, keys):
+        raise NotImplementedError
+
+
+class LoggingPurgeBackend(BasePurgeBackend):
+    """
+    Only logs the keys, to be replaced by a backend talking to your proxy.
+    """
+    def purge(self, keys):
+        logger.info("Purging surrogate keys: %s", " ".join(keys))
+
+
+class PurgeDispatcher(threading.local):
+    """
+    Sends the surrogate keys to purge to the backends listed in
+    CMS_PURGE_BACKENDS. During a request the keys are collected and sent
+    once, deduplicated, when it finishes. Outside of requests they are sent
+    right away.
+    """
+    def __init__(self):
+        self.pending = set()
+        self.deferred = False
+
+    def purge(self, keys):
+        self.pending.update(keys)
+        if not self.deferred:
+            self.flush()
+
+    def flush(self):
+        keys = sorted(self.pending)
+        self.pending = set()
+        if not keys:
+            return
+        for backend in iterload_objects(get_cms_setting('PURGE_BACKENDS')):
+            try:
+                backend().purge(keys)
+            except Exception:
+                # never break the request because the proxy is unavailable
+                logger.exception("Purge backend %r failed", backend)
+
+
+purge_dispatcher = PurgeDispatcher()
+
+
+def purge_keys(keys):
+    """
+    Purges the responses tagged with the given surrogate keys, from the page
+    cache and from the purge backends.
+    """
+    purge_page_cache(keys)
+    purge_dispatcher.purge(keys)
+
+
+def _defer_purges(**kwargs):
+    purge_dispatcher.deferred = True
+
+
+def _flush_purges(**kwargs):
+    purge_dispatcher.deferred = False
+    purge_dispatcher.flush()
+
+
+request_started.connect(_defer_purges, dispatch_uid="cms.purge.defer")
+request_finished.connect(_flush_purges, dispatch_uid="cms.purge.flush")
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Search index of the public pages, fed when pages are published and queried
+by Page.objects.search.
+
+The backend is configured with CMS_SEARCH_BACKEND. The default one stores the
+weighted terms of every page and language in the PageSearchTerm table, so a
+search is a few indexed lookups instead of a scan of all titles and plugins.
+"""
+from collections import defaultdict
+import re
+
+from cms.utils.compat.dj import force_unicode
+from cms.utils.conf import get_cms_setting
+from cms.utils.django_load import load_object
+from django.db import connection
+from django.utils.html import strip_tags
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# the weights of the content of a page
+TITLE_WEIGHT = 10
+PAGE_TITLE_WEIGHT = 5
+DESCRIPTION_WEIGHT = 2
+PLUGIN_WEIGHT = 1
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 50
+# the number of terms of a query used
+MAX_QUERY_TERMS = 10
+
+
+def tokenize(text):
+    """
+    Returns the lower case terms of the given text, HTML tags excluded.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(strip_tags(force_unicode(text)).lower()):
+        if len(term) >= MIN_TERM_LENGTH:
+            terms.append(term[:MAX_TERM_LENGTH])
+    return terms
+
+
+def _get_field_value(instance, field):
+    # search_fields can follow relations, eg 'snippet__html'
+    for name in field.split('__'):
+        instance = getattr(instance, name, None)
+        if instance is None:
+            return None
+    return instance
+
+
+def get_plugin_texts(plugin):
+    """
+    Returns the searchable texts of a (downcasted) plugin: its search_fields
+    if it has some, otherwise its translatable content.
+    """
+    fields = getattr(plugin, 'search_fields', None)
+    if fields:
+        values = [_get_field_value(plugin, field) for field in fields]
+    else:
+        values = plugin.get_translatable_content().values()
+    return [force_unicode(value) for value in values if value]
+
+
+def get_page_content(page, language):
+    """
+    Returns the searchable content of a page in a language, as a list of
+    (text, weight).
+    """
+    from cms.models import CMSPlugin, Title
+    from cms.plugin_pool import plugin_pool
+    from cms.plugins.utils import downcast_plugins
+
+    content = []
+    for title in Title.objects.filter(page=page, language=language):
+        content.append((title.title, TITLE_WEIGHT))
+        for text in (title.page_title, title.menu_title):
+            if text:
+                content.append((text, PAGE_TITLE_WEIGHT))
+        if title.meta_description:
+            content.append((title.meta_description, DESCRIPTION_WEIGHT))
+    plugin_types = [plugin.__name__ for plugin in plugin_pool.get_all_plugins()]
+    plugins = CMSPlugin.objects.filter(placeholder__page=page, language=language, plugin_type__in=plugin_types)
+    for plugin in downcast_plugins(plugins):
+        for text in get_plugin_texts(plugin):
+            content.append((text, PLUGIN_WEIGHT))
+    return content
+
+
+class BaseSearchBackend(object):
+    """
+    Indexes the public pages and searches them.
+    """
+    def update_page(self, page, language):
+        """
+        Indexes the content of the given public page in the given language.
+        """
+        raise NotImplementedError
+
+    def remove_page(self, page, language=None):
+        """
+        Removes the given page from the index, in one or all languages.
+        """
+        raise NotImplementedError
+
+    def search(self, q, language=None, site=None):
+        """
+        Returns the ids of the public pages matching the query, best matches
+        first.
+        """
+        raise NotImplementedError
+
+    def is_indexed(self):
+        """
+        Tells whether pages were indexed: until then Page.objects.search
+        falls back to looking up the query in the content of the pages. It is
+        called by every search, backends should answer without a query once
+        the pages are indexed.
+        """
+        return True
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Stores the terms of the pages in the PageSearchTerm table. A page matches
+    if, for every term of the query, it has a term starting with it: unlike
+    a substring lookup, "port" matches "portal" but not "support". Pages are
+    ranked by the weights of their matching terms.
+    """
+    # the maximum number of page ids returned by search: they are looked up
+    # with an IN clause, which SQLite (999 parameters) and Oracle (1000
+    # values) limit
+    max_results = 500
+    # set once pages are indexed, so that searches stop checking it
+    _indexed = False
+
+    def update_page(self, page, language):
+        from cms.models import PageSearchTerm
+
+        weights = defaultdict(int)
+        for text, weight in get_page_content(page, language):
+            for term in tokenize(text):
+                weights[term] += weight
+        self.remove_page(page, language)
+        PageSearchTerm.objects.bulk_create([
+            PageSearchTerm(page=page, language=language, term=term, weight=weight)
+            for term, weight in weights.items()
+        ])
+
+    def remove_page(self, page, language=None):
+        from cms.models import PageSearchTerm
+
+        terms = PageSearchTerm.objects.filter(page=page)
+        if language:
+            terms = terms.filter(language=language)
+        terms.delete()
+
+    def search(self, q, language=None, site=None):
+        from cms.models import PageSearchTerm
+
+        scores = None
+        for term in set(tokenize(q)[:MAX_QUERY_TERMS]):
+            terms = PageSearchTerm.objects.filter(term__startswith=term)
+            if language:
+                terms = terms.filter(language=language)
+            if site:
+                terms = terms.filter(page__site=site)
+            term_scores = defaultdict(int)
+            for page_id, weight in terms.values_list('page_id', 'weight'):
+                term_scores[page_id] += weight
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = dict((page_id, score + term_scores[page_id])
+                              for page_id, score in scores.items() if page_id in term_scores)
+            if not scores:
+                break
+        if not scores:
+            return []
+        return sorted(scores, key=lambda page_id: (-scores[page_id], page_id))[:self.max_results]
+
+    def is_indexed(self):
+        from cms.models import PageSearchTerm
+
+        if not DatabaseSearchBackend._indexed:
+            # once built, the index only gets empty when no page is published
+            DatabaseSearchBackend._indexed = PageSearchTerm.objects.exists()
+        return DatabaseSearchBackend._indexed
+
+
+def get_search_backend():
+    return load_object(get_cms_setting('SEARCH_BACKEND'))()
+
+
+def update_page_index(page, language):
+    """
+    Indexes a published page, given its draft or public version.
+    """
+    public = page if not page.publisher_is_draft else page.publisher_public
+    if public is not None:
+        get_search_backend().update_page(public, language)
+
+
+def remove_page_index(page, language=None):
+    public = page if not page.publisher_is_draft else page.publisher_public
+    if public is not None:
+        get_search_backend().remove_page(public, language)
+
+
+def order_by_ids(queryset, ids):
+    """
+    Orders the queryset by the position of the primary keys in ids.
+    """
+    if not ids:
+        return queryset.none()
+    column = '%s.%s' % (connection.ops.quote_name(queryset.model._meta.db_table),
+                        connection.ops.quote_name(queryset.model._meta.pk.column))
+    cases = ' '.join('WHEN %d THEN %d' % (int(pk), position) for position, pk in enumerate(ids))
+    return queryset.filter(pk__in=ids).extra(
+        select={'search_rank': 'CASE %s %s END' % (column, cases)}, order_by=['search_rank'])
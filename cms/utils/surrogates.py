@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Surrogate keys identify the content a response was built from, so cached
+responses can be purged when this content changes.
+"""
+
+
+def get_page_key(page):
+    """
+    Returns the surrogate key of a page, the same for its draft and public
+    version (publisher_public is populated on both ends).
+    """
+    if page.publisher_is_draft or not page.publisher_public_id:
+        return 'page-%s' % page.pk
+    return 'page-%s' % page.publisher_public_id
+
+
+# the key of the responses displaying menus
+MENUS_KEY = 'menus'
+
+
+def get_static_placeholder_key(code):
+    return 'static-%s' % code
+
+
+def add_surrogate_keys(request, *keys):
+    """
+    Records surrogate keys for the response to the given request.
+    """
+    if not hasattr(request, '_cms_surrogate_keys'):
+        request._cms_surrogate_keys = set()
+    request._cms_surrogate_keys.update(keys)
+
+
+def get_surrogate_keys(request):
+    """
+    Returns the sorted surrogate keys recorded for the given request,
+    including the static placeholders rendered.
+    """
+    keys = set(getattr(request, '_cms_surrogate_keys', ()))
+    for static_placeholder in getattr(request, 'static_placeholders', ()):
+        keys.add(get_static_placeholder_key(static_placeholder.code))
+    return sorted(keys)
@@ -3,9 +3,10 @@ from __future__ import with_statement
 from django.contrib.auth.views import redirect_to_login
 from django.template.response import TemplateResponse
 from cms.apphook_pool import apphook_pool
+from cms.cache.page_cache import allow_page_cache
 from cms.appresolver import get_app_urls
-from cms.models import Title
-from cms.utils import get_template_from_request, get_language_from_request
+from cms.models import Page, Title, CMSPlugin
+from cms.utils import get_template_from_request, get_language_from_request, get_cms_setting
 from cms.utils.i18n import get_fallback_languages, force_language, get_public_languages, get_redirect_on_fallback, \
     get_language_list, is_language_prefix_patterns_used
 from cms.utils.page_resolver import get_page_from_request
@@ -13,9 +14,12 @@ from cms.test_utils.util.context_managers import SettingsOverride
 from django.conf import settings
 from django.conf.urls import patterns
 from django.core.urlresolvers import resolve, Resolver404, reverse
-from django.http import Http404, HttpResponseRedirect
+from django.db.models import Count, Max, Q
+from django.http import Http404, HttpResponseRedirect, HttpResponseNotModified
 from django.template.context import RequestContext
-from django.utils.http import urlquote
+from django.utils.http import urlquote, http_date, parse_http_date_safe, parse_etags, quote_etag
+import calendar
+import hashlib
 
 
 def _handle_no_page(request, slug):
@@ -24,6 +28,61 @@ def _handle_no_page(request, slug):
     raise Http404('CMS: Page not found for "%s"' % slug)
 
 
+def _use_conditional_get(request):
+    """
+    Checks the CMS_CONDITIONAL_GET rules for this request.
+    """
+    conf = get_cms_setting('CONDITIONAL_GET')
+    if not conf['enabled'] or request.method not in ('GET', 'HEAD'):
+        return False
+    toolbar = getattr(request, 'toolbar', None)
+    if toolbar and toolbar.edit_mode and not conf['edit_mode']:
+        return False
+    if toolbar and toolbar.show_toolbar and not conf['toolbar']:
+        return False
+    if request.user.is_authenticated() and not conf['authenticated']:
+        return False
+    return True
+
+
+def _get_page_validators(request, page, language):
+    """
+    Returns the ETag and the Last-Modified timestamp of the page without
+    rendering it, using the last changes of the pages of the site (titles and
+    menus), of the page's plugins and of the static placeholders.
+    """
+    pages = Page.objects.filter(site=page.site_id, publisher_is_draft=page.publisher_is_draft).aggregate(
+        changed=Max('changed_date'), count=Count('pk'))
+    if page.publisher_is_draft:
+        static_placeholders = Q(placeholder__static_draft__isnull=False)
+    else:
+        static_placeholders = Q(placeholder__static_public__isnull=False)
+    plugins = CMSPlugin.objects.filter(
+        Q(placeholder__page=page, language=language) | static_placeholders
+    ).aggregate(changed=Max('changed_date'), count=Count('pk', distinct=True))
+    last_modified = max(date for date in (pages['changed'], plugins['changed']) if date)
+    version = [page.pk, language, pages['changed'], pages['count'], plugins['changed'], plugins['count']]
+    if request.user.is_authenticated():
+        version.append(request.user.pk)
+    etag = hashlib.md5(u'|'.join(str(value) for value in version).encode('utf-8')).hexdigest()
+    return etag, calendar.timegm(last_modified.utctimetuple())
+
+
+def _is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return bool(if_modified_since and last_modified <= if_modified_since)
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
 def details(request, slug):
     """
     The main view of the Django-CMS! Takes a request and a slug, renders the
@@ -148,4 +207,12 @@ def details(request, slug):
     if not context['has_view_permissions']:
         return _handle_no_page(request, slug)
 
+    allow_page_cache(request, page)
+
+    if _use_conditional_get(request):
+        etag, last_modified = _get_page_validators(request, page, current_language)
+        if _is_not_modified(request, etag, last_modified):
+            return _set_validators(HttpResponseNotModified(), etag, last_modified)
+        return _set_validators(TemplateResponse(request, template_name, context), etag, last_modified)
+
     return TemplateResponse(request, template_name, context)
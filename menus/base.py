@@ -15,12 +15,96 @@ class Menu(object):
         should return a list of NavigationNode instances
         """ 
         raise NotImplementedError
+
+    def get_breadcrumb_nodes(self, request):
+        """
+        May return the NavigationNode instances of the breadcrumb of the
+        request: the node of the requested URL, its ancestors (as parent_id)
+        and the home node if there is one. Only menus owning the requested
+        URL should answer, returning None makes the breadcrumb use the nodes
+        of all menus.
+        """
+        return None
     
+# the phases of MenuPool.apply_modifiers: on the whole tree (menus and
+# breadcrumbs) and on the cut tree of a menu
+PRE_CUT = 'pre_cut'
+BREADCRUMB = 'breadcrumb'
+POST_CUT = 'post_cut'
+
+
+def get_phase(post_cut, breadcrumb):
+    if post_cut:
+        return POST_CUT
+    if breadcrumb:
+        return BREADCRUMB
+    return PRE_CUT
+
+
+class NodeIndex(object):
+    """
+    Lookups over a list of navigation nodes, built in a single pass and shared
+    by the modifiers of a phase.
+
+    - by_id: (namespace, id) -> node
+    - by_namespace: namespace -> nodes
+    - by_reverse_id: reverse_id attribute -> first node having it
+    - roots: the nodes without parent
+    - selected: the selected node (the last one if several are) or None
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.by_id = {}
+        self.by_namespace = {}
+        self.by_reverse_id = {}
+        self.roots = []
+        self.selected = None
+        for node in nodes:
+            self.by_id[(node.namespace, node.id)] = node
+            self.by_namespace.setdefault(node.namespace, []).append(node)
+            reverse_id = node.attr.get('reverse_id')
+            if reverse_id and reverse_id not in self.by_reverse_id:
+                self.by_reverse_id[reverse_id] = node
+            if not node.parent:
+                self.roots.append(node)
+            if getattr(node, 'selected', False):
+                self.selected = node
+
+    def is_valid_for(self, nodes):
+        return self.nodes is nodes
+
+    def invalidate(self):
+        """
+        Marks the index as outdated, for nodes changed in place.
+        """
+        self.nodes = None
+
+
 class Modifier(object):
-    
+    """
+    Modifiers are instantiated once and reused for every request, they must
+    not keep state on the instance.
+    """
+    # the phases the modifier runs in
+    phases = (PRE_CUT, BREADCRUMB, POST_CUT)
+
     def modify(self, request, nodes, namespace, root_id,  post_cut, breadcrumb):
         pass
-    
+
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
+        """
+        Called by the menu pool with the NodeIndex of the nodes, override it
+        instead of modify to use the index. A modifier changing the nodes or
+        their relations must return a new list, so that the index is rebuilt
+        for the next modifiers (or invalidate the index).
+        """
+        nodes = self.modify(request, nodes, namespace, root_id, post_cut, breadcrumb)
+        # modify does not know about the index and may change nodes in place
+        index.invalidate()
+        return nodes
+
+
 class NavigationNode(object):
     
     def __init__(self, title, url, id, parent_id=None, parent_namespace=None, attr=None, visible=True):
@@ -1,79 +1,165 @@
 # -*- coding: utf-8 -*-
 from logging import getLogger
+from cms.cache.invalidation import MENUS, invalidation_collector
 from cms.utils import get_cms_setting
 from cms.utils.django_load import load
+from cms.utils.surrogates import add_surrogate_keys, MENUS_KEY
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.cache import cache
 from django.core.urlresolvers import NoReverseMatch
 from django.utils.translation import get_language
+from menus.base import NodeIndex, get_phase
 from menus.exceptions import NamespaceAllreadyRegistered
 from menus.models import CacheKey
 from django.utils.translation import ugettext_lazy as _
 from django.contrib import messages
 import copy
+import time
 
 logger = getLogger('menus')
 
 def _build_nodes_inner_for_one_menu(nodes, menu_class_name):
     '''
     This is an easier to test "inner loop" building the menu tree structure
-    for one menu (one language, one site) 
+    for one menu (one language, one site).
+
+    Runs in linear time whatever the order of the nodes: parents come before
+    their children in the result, which keeps the order of the given nodes
+    when they are already sorted this way. Nodes with a missing parent, in a
+    parent cycle or below such nodes are left out and logged.
     '''
-    done_nodes = {} # Dict of node.id:Node
-    final_nodes = []
-    
-    # This is to prevent infinite loops - we need to compare the number of 
-    # times we see a specific node to "something", and for the time being, 
-    # it's the total number of nodes
-    list_total_length = len(nodes)
-    
-    while nodes:
-        # For when the node has a parent_id but we haven't seen it yet. 
-        # We must not append it to the final list in this case!
-        should_add_to_final_list = True 
-        
-        node = nodes.pop(0)
-        
-        # Increment the "seen" counter for this specific node.
-        node._counter = getattr(node,'_counter',0) + 1  
-        
+    done_nodes = {} # Dict of (node.namespace, node.id):Node
+    for node in nodes:
         # Implicit namespacing by menu.__name__
         if not node.namespace:
             node.namespace = menu_class_name
-        if node.namespace not in done_nodes:
-            # We need to create the namespace dict to avoid KeyErrors
-            done_nodes[node.namespace] = {} 
-        
-        # If we have seen the parent_id already...
-        if node.parent_id in done_nodes[node.namespace] :
+        done_nodes[(node.namespace, node.id)] = node
+
+    final_nodes = []
+    added = set() # ids of the nodes in final_nodes
+    # Nodes waiting for their parent to be added, by parent key
+    waiting = {}
+
+    def add(node, parent):
+        final_nodes.append(node)
+        added.add(id(node))
+        if parent is not None:
             # Implicit parent namespace by menu.__name__
             if not node.parent_namespace:
                 node.parent_namespace = menu_class_name
-            parent = done_nodes[node.namespace][node.parent_id]
             parent.children.append(node)
             node.parent = parent
-        # If it has a parent_id but we haven't seen it yet...
-        elif node.parent_id:
-            # We check for infinite loops here, by comparing the number of 
-            # times we "saw" this node to the number of nodes in the list
-            if node._counter < list_total_length:
-                nodes.append(node)
-            # Never add this node to the final list until it has a real 
-            # parent (node.parent)
-            should_add_to_final_list = False
-            
-        if should_add_to_final_list:
-            final_nodes.append(node)
-            # add it to the "seen" list
-            done_nodes[node.namespace][node.id] = node
+
+    for node in nodes:
+        if node.parent_id:
+            parent = done_nodes.get((node.namespace, node.parent_id))
+            if parent is None or id(parent) not in added:
+                waiting.setdefault((node.namespace, node.parent_id), []).append(node)
+                continue
+        else:
+            parent = None
+        add(node, parent)
+        # add the nodes waiting for this one, depth first (without recursion,
+        # menus can be deep)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            children = waiting.pop((current.namespace, current.id), [])
+            for child in children:
+                add(child, current)
+            stack.extend(reversed(children))
+
+    if waiting:
+        _log_left_out_nodes(waiting, done_nodes, menu_class_name)
     return final_nodes
 
+
+def _log_left_out_nodes(waiting, done_nodes, menu_class_name):
+    """
+    Logs the number of nodes left out of a menu: nodes with a missing parent,
+    nodes in parent cycles and the nodes below them.
+    """
+    left_out = {}
+    for parent_key, children in waiting.items():
+        for child in children:
+            left_out[id(child)] = (child, parent_key)
+    missing = sum(1 for child, parent_key in left_out.values() if parent_key not in done_nodes)
+    in_cycles = 0
+    # walk up the parents of every left out node, a walk reaching a node of
+    # the same walk found a cycle
+    walk_ids = {}
+    for walk, node_id in enumerate(list(left_out.keys())):
+        path = []
+        while node_id in left_out and node_id not in walk_ids:
+            walk_ids[node_id] = walk
+            path.append(node_id)
+            parent = done_nodes.get(left_out[node_id][1])
+            node_id = id(parent) if parent is not None else None
+        if node_id in left_out and walk_ids[node_id] == walk:
+            in_cycles += len(path) - path.index(node_id)
+    logger.warning(
+        "Menu %s: %d nodes left out, %d with a missing parent, %d in parent cycles and %d below them",
+        menu_class_name, len(left_out), missing, in_cycles, len(left_out) - missing - in_cycles)
+
+
+def _build_url_index(nodes):
+    """
+    Returns the URL index of the given nodes: a dict of URL to the position of
+    the first node with this URL, and the distinct URL lengths, longest first.
+    Positions (unlike the nodes themselves) stay valid for copies of the list.
+    """
+    urls = {}
+    for position, node in enumerate(nodes):
+        url = node.get_absolute_url()
+        if url is not None and url not in urls:
+            urls[url] = position
+    lengths = sorted(set(len(url) for url in urls), reverse=True)
+    return {'urls': urls, 'lengths': lengths}
+
+
+def _find_selected_position(url_index, path):
+    """
+    Returns the position of the node with the longest URL being a prefix of
+    path, or None.
+    """
+    urls = url_index['urls']
+    for length in url_index['lengths']:
+        if length <= len(path):
+            position = urls.get(path[:length])
+            if position is not None:
+                return position
+    return None
+
+
+def _copy_node(node, copies):
+    if id(node) in copies:
+        return copies[id(node)]
+    new = copy.copy(node)
+    copies[id(node)] = new
+    new.attr = dict(node.attr)
+    if node.parent is not None:
+        new.parent = _copy_node(node.parent, copies)
+    new.children = [_copy_node(child, copies) for child in node.children]
+    return new
+
+
+def _copy_nodes(nodes):
+    """
+    Returns copies of the given nodes, which can be changed independently:
+    the nodes, their attr dicts and their tree relations are copied, the
+    other attributes are shared. Much cheaper than a deepcopy.
+    """
+    copies = {}
+    return [_copy_node(node, copies) for node in nodes]
+
+
 class MenuPool(object):
     def __init__(self):
         self.menus = {}
         self.modifiers = []
+        self._modifier_instances = {}
         self.discovered = False
         
     def discover_menus(self):
@@ -95,6 +181,44 @@ class MenuPool(object):
         to_be_deleted = cache_keys.distinct().values_list('key', flat=True)
         cache.delete_many(to_be_deleted)
         cache_keys.delete()
+        self._increment_generation(None if all else site_id)
+
+    def _get_generation_key(self, site_id=None):
+        prefix = getattr(settings, "CMS_CACHE_PREFIX", "menu_cache_")
+        if site_id is None:
+            return "%smenu_generation" % prefix
+        return "%smenu_generation_%s" % (prefix, site_id)
+
+    def get_generation(self, site_id=None):
+        '''
+        Returns the menu generation, which changes every time the menus are
+        cleared. Caches of content depending on the menus can store it to
+        detect they are outdated. The generation of a site only changes when
+        the menus of this site (or of all sites) are cleared.
+        '''
+        invalidation_collector.flush(MENUS)
+        keys = [self._get_generation_key()]
+        if site_id is not None:
+            keys.append(self._get_generation_key(site_id))
+        generations = cache.get_many(keys)
+        missing = {}
+        for key in keys:
+            if key not in generations:
+                # start from the current time, so that a lost generation never
+                # goes back to a previous value
+                generations[key] = missing[key] = int(time.time() * 1000)
+        if missing:
+            cache.set_many(missing, get_cms_setting('CACHE_DURATIONS')['menus'])
+        if site_id is None:
+            return generations[keys[0]]
+        return tuple(generations[key] for key in keys)
+
+    def _increment_generation(self, site_id=None):
+        try:
+            cache.incr(self._get_generation_key(site_id))
+        except ValueError:
+            # not set yet (or evicted), the next get_generation starts a new one
+            pass
     
     def register_menu(self, menu):
         from menus.base import Menu
@@ -127,15 +251,23 @@ class MenuPool(object):
             else:
                 the node is put at the bottom of the list
         """
+        # apply the menu invalidations deferred so far in this request
+        invalidation_collector.flush(MENUS)
         # Cache key management
         lang = get_language()
         prefix = getattr(settings, "CMS_CACHE_PREFIX", "menu_cache_")
         key = "%smenu_nodes_%s_%s" % (prefix, lang, site_id)
         if request.user.is_authenticated():
             key += "_%s_user" % request.user.pk
-        cached_nodes = cache.get(key, None)
-        if cached_nodes:
-            return cached_nodes
+        # the draft trees of edit and build mode (only for staff, so scoped to
+        # the user) are cached apart from the public ones: switching mode
+        # changes the tree used and never requires clearing the cache
+        if self._use_draft(request):
+            key += "_draft"
+        cached = cache.get(key, None)
+        # entries stored by previous versions are plain lists of nodes
+        if isinstance(cached, dict):
+            return cached['nodes'], cached['url_index']
         
         final_nodes = []
         for menu_class_name in self.menus:
@@ -151,49 +283,108 @@ class MenuPool(object):
                     logger.error("Menu %s could not be loaded." % menu_class_name, exc_info=True)
             # nodes is a list of navigation nodes (page tree in cms + others)
             final_nodes += _build_nodes_inner_for_one_menu(nodes, menu_class_name)
-        cache.set(key, final_nodes, get_cms_setting('CACHE_DURATIONS')['menus'])
+        url_index = _build_url_index(final_nodes)
+        cache.set(key, {'nodes': final_nodes, 'url_index': url_index},
+                  get_cms_setting('CACHE_DURATIONS')['menus'])
         # We need to have a list of the cache keys for languages and sites that
         # span several processes - so we follow the Django way and share through 
         # the database. It's still cheaper than recomputing every time!
         # This way we can selectively invalidate per-site and per-language, 
         # since the cache shared but the keys aren't 
         CacheKey.objects.get_or_create(key=key, language=lang, site=site_id)
-        return final_nodes
+        return final_nodes, url_index
 
-    def apply_modifiers(self, nodes, request, namespace=None, root_id=None, post_cut=False, breadcrumb=False):
-        if not post_cut:
-            nodes = self._mark_selected(request, nodes)
+    def get_modifiers(self, phase):
+        """
+        Returns the (reused) instances of the registered modifiers running in
+        the given phase, in registration order.
+        """
+        modifiers = []
         for cls in self.modifiers:
-            inst = cls()
-            nodes = inst.modify(request, nodes, namespace, root_id, post_cut, breadcrumb)
+            if phase not in cls.phases:
+                continue
+            if cls not in self._modifier_instances:
+                self._modifier_instances[cls] = cls()
+            modifiers.append(self._modifier_instances[cls])
+        return modifiers
+
+    def _use_draft(self, request):
+        from cms.utils.moderator import use_draft
+
+        return use_draft(request)
+
+    def apply_modifiers(self, nodes, request, namespace=None, root_id=None, post_cut=False, breadcrumb=False,
+                        url_index=None):
+        if not post_cut:
+            nodes = self._mark_selected(request, nodes, url_index)
+        index = None
+        for modifier in self.get_modifiers(get_phase(post_cut, breadcrumb)):
+            # the index is only rebuilt when the nodes changed
+            if index is None or not index.is_valid_for(nodes):
+                index = NodeIndex(nodes)
+            nodes = modifier.modify_indexed(request, nodes, index, namespace, root_id, post_cut, breadcrumb)
         return nodes
 
+    def _get_memo_key(self, site_id, namespace, root_id, breadcrumb):
+        return site_id, get_language(), namespace, root_id, breadcrumb, self.get_generation(site_id)
+
     def get_nodes(self, request, namespace=None, root_id=None, site_id=None, breadcrumb=False):
         self.discover_menus()
         if not site_id:
             site_id = Site.objects.get_current().pk
-        nodes = self._build_nodes(request, site_id)
-        nodes = copy.deepcopy(nodes)
-        nodes = self.apply_modifiers(nodes, request, namespace, root_id, post_cut=False, breadcrumb=breadcrumb)
-        return nodes 
+        # responses displaying the menus must be purged when they change
+        add_surrogate_keys(request, MENUS_KEY)
+        # the marked nodes are built once per request (and menu generation),
+        # every call gets its own copy of them
+        key = self._get_memo_key(site_id, namespace, root_id, breadcrumb)
+        if not hasattr(request, '_menu_nodes'):
+            request._menu_nodes = {}
+        if key not in request._menu_nodes:
+            nodes, url_index = self._build_nodes(request, site_id)
+            nodes = _copy_nodes(nodes)
+            request._menu_nodes[key] = self.apply_modifiers(
+                nodes, request, namespace, root_id, post_cut=False, breadcrumb=breadcrumb, url_index=url_index)
+        return _copy_nodes(request._menu_nodes[key])
+
+    def get_breadcrumb_nodes(self, request, site_id=None):
+        """
+        Returns the nodes of the breadcrumb of the request: all the nodes if
+        a menu of the request built them already, from the first menu
+        answering get_breadcrumb_nodes otherwise, or all the nodes.
+        """
+        self.discover_menus()
+        if not site_id:
+            site_id = Site.objects.get_current().pk
+        key = self._get_memo_key(site_id, None, None, True)
+        # reuse the nodes built for the menus (or another breadcrumb) of the
+        # request: marking them again costs no query
+        if any(memo_key[:2] == key[:2] and memo_key[-1] == key[-1]
+               for memo_key in getattr(request, '_menu_nodes', {})):
+            return self.get_nodes(request, site_id=site_id, breadcrumb=True)
+        for menu_class_name, menu in self.menus.items():
+            nodes = menu.get_breadcrumb_nodes(request)
+            if nodes is not None:
+                add_surrogate_keys(request, MENUS_KEY)
+                nodes = _build_nodes_inner_for_one_menu(nodes, menu_class_name)
+                return self.apply_modifiers(nodes, request, breadcrumb=True)
+        return self.get_nodes(request, site_id=site_id, breadcrumb=True)
 
-    def _mark_selected(self, request, nodes):
-        sel = None
+    def _mark_selected(self, request, nodes, url_index=None):
+        """
+        Selects the node with the longest URL matching the start of the
+        request path, using the URL index of the nodes (built here if not
+        given).
+        """
         for node in nodes:
             node.sibling = False
             node.ancestor = False
             node.descendant = False
             node.selected = False
-            if node.get_absolute_url() == request.path[:len(node.get_absolute_url())]:
-                if sel:
-                    if len(node.get_absolute_url()) > len(sel.get_absolute_url()):
-                        sel = node
-                else:
-                    sel = node
-            else:
-                node.selected = False
-        if sel:
-            sel.selected = True
+        if url_index is None:
+            url_index = _build_url_index(nodes)
+        position = _find_selected_position(url_index, request.path)
+        if position is not None:
+            nodes[position].selected = True
         return nodes
 
     def get_menus_by_attribute(self, name, value):
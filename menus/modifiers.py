@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from menus.base import Modifier
+from menus.base import Modifier, NodeIndex, PRE_CUT, POST_CUT
 from menus.menu_pool import menu_pool
 
 class Marker(Modifier):
@@ -10,40 +10,34 @@ class Marker(Modifier):
     descendants: descendant = True
     ancestors: ancestor = True
     """
+    phases = (PRE_CUT,)
+
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         if post_cut or breadcrumb:
             return nodes
-        selected = None
-        root_nodes = []
+        return self.modify_indexed(request, nodes, NodeIndex(nodes), namespace, root_id, post_cut, breadcrumb)
+
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
         for node in nodes:
             if not hasattr(node, "descendant"):
                 node.descendant = False
             if not hasattr(node, "ancestor"):
                 node.ancestor = False
-            if not node.parent:
-                if selected and not selected.parent:
-                    node.sibling = True
-                root_nodes.append(node)
-            if node.selected: 
-                if node.parent:
-                    newnode = node
-                    while newnode.parent:
-                        newnode = newnode.parent
-                        newnode.ancestor = True
-                    for sibling in node.parent.children:
-                        if not sibling.selected:
-                            sibling.sibling = True
-                else:
-                    for root_node in root_nodes:
-                        if not root_node.selected:
-                            root_node.sibling = True
-                if node.children:                    
-                    self.mark_descendants(node.children)
-                selected = node
-            if node.children:
-                node.is_leaf_node = False
+            node.is_leaf_node = not node.children
+        selected = index.selected
+        if selected:
+            if selected.parent:
+                ancestor = selected.parent
+                while ancestor:
+                    ancestor.ancestor = True
+                    ancestor = ancestor.parent
+                siblings = selected.parent.children
             else:
-                node.is_leaf_node = True
+                siblings = index.roots
+            for sibling in siblings:
+                if not getattr(sibling, "selected", False):
+                    sibling.sibling = True
+            self.mark_descendants(selected.children)
         return nodes
                 
     def mark_descendants(self, nodes):
@@ -58,19 +52,20 @@ class Level(Modifier):
     marks all node levels
     """
     post_cut = True
+    phases = (PRE_CUT, POST_CUT)
     
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         if breadcrumb:
             return nodes
-        for node in nodes:
-            
-            if not node.parent:
-                if post_cut:
-                    node.menu_level = 0
-                else:
-                    node.level = 0
-                self.mark_levels(node, post_cut)
-                
+        return self.modify_indexed(request, nodes, NodeIndex(nodes), namespace, root_id, post_cut, breadcrumb)
+
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
+        for node in index.roots:
+            if post_cut:
+                node.menu_level = 0
+            else:
+                node.level = 0
+            self.mark_levels(node, post_cut)
         return nodes
             
                     
@@ -88,19 +83,33 @@ class AuthVisibility(Modifier):
     """
     Remove nodes that are login required or require a group
     """
+    phases = (PRE_CUT,)
+
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         if post_cut or breadcrumb:
             return nodes
+        return self.modify_indexed(request, nodes, NodeIndex(nodes), namespace, root_id, post_cut, breadcrumb)
+
+    def modify_indexed(self, request, nodes, index, namespace, root_id, post_cut, breadcrumb):
+        if request.user.is_authenticated():
+            attribute = 'visible_for_authenticated'
+        else:
+            attribute = 'visible_for_anonymous'
         final = []
+        removed = set()
+        parents = {}
         for node in nodes:
-            if (node.attr.get('visible_for_authenticated', True) and \
-                 request.user.is_authenticated()) or \
-                (node.attr.get('visible_for_anonymous', True) and \
-                 not request.user.is_authenticated()):
+            if node.attr.get(attribute, True):
                 final.append(node)
             else:
-                if node.parent and node in node.parent.children:
-                    node.parent.children.remove(node)
+                removed.add(id(node))
+                if node.parent:
+                    parents[id(node.parent)] = node.parent
+        if not removed:
+            return nodes
+        # detach the removed nodes from their parents, once per parent
+        for parent in parents.values():
+            parent.children = [child for child in parent.children if id(child) not in removed]
         return final
 
 
@@ -108,4 +117,3 @@ def register():
     menu_pool.register_modifier(Marker)
     menu_pool.register_modifier(AuthVisibility)
     menu_pool.register_modifier(Level)
-    
\ No newline at end of file
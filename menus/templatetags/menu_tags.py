@@ -4,14 +4,18 @@ from __future__ import with_statement
 from classytags.arguments import IntegerArgument, Argument, StringArgument
 from classytags.core import Options
 from classytags.helpers import InclusionTag
+from cms.utils import get_cms_setting
 from cms.utils.i18n import force_language, get_language_objects
 from cms.utils.compat.dj import force_unicode
 from cms.utils.compat.urls import unquote
+from cms.utils.surrogates import add_surrogate_keys, MENUS_KEY
 from django import template
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.utils.translation import get_language, ugettext
 from menus.menu_pool import menu_pool
+import hashlib
 from menus.utils import DefaultLanguageChanger
 
 
@@ -84,6 +88,57 @@ def cut_levels(nodes, from_level, to_level, extra_inactive, extra_active):
     return final
 
 
+class FragmentCacheMixin(object):
+    """
+    Caches the rendered output of a menu tag for anonymous users when
+    CMS_MENU_FRAGMENT_CACHE is enabled. The entries are keyed by site,
+    language, request path, tag arguments and menu generation, so clearing
+    the menus invalidates them and a cache hit doesn't load the nodes.
+    """
+
+    def get_fragment_request(self, context):
+        """
+        Returns the request if the output can be cached, or None.
+        """
+        if not get_cms_setting('MENU_FRAGMENT_CACHE'):
+            return None
+        request = context.get('request', None)
+        if request is None or request.user.is_authenticated():
+            return None
+        toolbar = getattr(request, 'toolbar', None)
+        if toolbar and (toolbar.show_toolbar or toolbar.edit_mode or toolbar.build_mode):
+            return None
+        return request
+
+    def get_fragment_variant(self, request, site_id):
+        """
+        Returns what the output depends on besides the tag arguments: the
+        selected node, found from the path.
+        """
+        return request.path
+
+    def get_fragment_cache_key(self, request, kwargs):
+        site_id = Site.objects.get_current().pk
+        parts = [self.name, str(site_id), get_language(), str(menu_pool.get_generation(site_id)),
+                 self.get_fragment_variant(request, site_id), repr(sorted(kwargs.items()))]
+        key = hashlib.md5(u'|'.join(force_unicode(part) for part in parts).encode('utf-8')).hexdigest()
+        return "%s:menu_fragment:%s" % (get_cms_setting('CACHE_PREFIX'), key)
+
+    def render_tag(self, context, **kwargs):
+        request = self.get_fragment_request(context)
+        if request is None or kwargs.get('next_page'):
+            return super(FragmentCacheMixin, self).render_tag(context, **kwargs)
+        key = self.get_fragment_cache_key(request, kwargs)
+        output = cache.get(key)
+        if output is None:
+            output = super(FragmentCacheMixin, self).render_tag(context, **kwargs)
+            cache.set(key, output, get_cms_setting('CACHE_DURATIONS')['menus'])
+        else:
+            # responses displaying the menus must be purged when they change
+            add_surrogate_keys(request, MENUS_KEY)
+        return output
+
+
 def flatten(nodes):
     flat = []
     for node in nodes:
@@ -92,7 +147,7 @@ def flatten(nodes):
     return flat
 
 
-class ShowMenu(InclusionTag):
+class ShowMenu(FragmentCacheMixin, InclusionTag):
     """
     render a nested list of all children of the pages
     - from_level: starting level
@@ -178,7 +233,7 @@ class ShowMenuBelowId(ShowMenu):
 register.tag(ShowMenuBelowId)
 
 
-class ShowSubMenu(InclusionTag):
+class ShowSubMenu(FragmentCacheMixin, InclusionTag):
     """
     show the sub menu of the current nav-node.
     - levels: how many levels deep
@@ -250,7 +305,7 @@ class ShowSubMenu(InclusionTag):
 register.tag(ShowSubMenu)
 
 
-class ShowBreadcrumb(InclusionTag):
+class ShowBreadcrumb(FragmentCacheMixin, InclusionTag):
     """
     Shows the breadcrumb from the node that has the same url as the current request
     
@@ -281,7 +336,7 @@ class ShowBreadcrumb(InclusionTag):
         except:
             only_visible = bool(only_visible)
         ancestors = []
-        nodes = menu_pool.get_nodes(request, breadcrumb=True)
+        nodes = menu_pool.get_breadcrumb_nodes(request)
         selected = None
         home = None
         for node in nodes:
@@ -335,7 +390,7 @@ MARKERS = {
 }
 
 
-class LanguageChooser(InclusionTag):
+class LanguageChooser(FragmentCacheMixin, InclusionTag):
     """
     Displays a language chooser
     - template: template used to render the language chooser
@@ -343,6 +398,13 @@ class LanguageChooser(InclusionTag):
     name = 'language_chooser'
     template = 'menu/dummy.html'
 
+    def get_fragment_request(self, context):
+        request = super(LanguageChooser, self).get_fragment_request(context)
+        # the urls of a custom language changer depend on the view
+        if request is None or hasattr(request, '_language_changer'):
+            return None
+        return request
+
     options = Options(
         Argument('template', default=NOT_PROVIDED, required=False),
         Argument('i18n_mode', default='raw', required=False),